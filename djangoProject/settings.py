@@ -17,6 +17,8 @@ from dotenv import dotenv_values
 # Load secret data from the .env file
 SECRET_KEY = dotenv_values(".env")["SECRET_KEY"]
 TMDB_API_KEY = dotenv_values(".env")["TMDB_API_KEY"]
+# Point at a tmdb_standin server for benchmarks and offline runs
+TMDB_BASE_URL = dotenv_values(".env").get("TMDB_BASE_URL") or "https://api.themoviedb.org/3"
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -79,6 +81,13 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # WAL lets readers run alongside a writer, IMMEDIATE avoids lock-upgrade deadlocks
+            # between gunicorn workers and the page fetch threads
+            'init_command': 'PRAGMA journal_mode=WAL;',
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
@@ -167,6 +176,105 @@ LOGGING = {
 LOGIN_URL = '/login/'
 LOGOUT_REDIRECT_URL = "/"
 
+# TMDB response cache, stored in the database so every gunicorn worker shares it
+TMDB_CACHE_ENABLED = True
+TMDB_CACHE_MAX_ENTRIES = 20000
+TMDB_CACHE_TTLS = { # seconds, keyed by the first segment of the endpoint
+    'movie': 60 * 60 * 24 * 7,
+    'genre': 60 * 60 * 24 * 7,
+    'discover': 60 * 30,
+    'search': 60 * 10,
+}
+TMDB_CACHE_NEGATIVE_TTL = 60 * 60 # how long a 404 is remembered
+
+# Outbound TMDB calls share one token bucket across workers; failed GETs (429/5xx/timeouts)
+# are retried with jittered exponential backoff, and a circuit breaker fails fast after
+# repeated failures
+TMDB_RATE_LIMIT_PER_SECOND = 40
+TMDB_RATE_LIMIT_BURST = 40
+TMDB_RATE_LIMIT_MAX_WAIT = 5 # seconds, longer waits fail instead of tying up a worker
+TMDB_MAX_RETRIES = 3
+TMDB_RETRY_BACKOFF = 0.5 # seconds, doubled per attempt
+TMDB_RETRY_BACKOFF_MAX = 8
+TMDB_CIRCUIT_FAILURE_THRESHOLD = 5
+TMDB_CIRCUIT_COOLDOWN = 30 # seconds
+
+# One pooled keep-alive HTTP session per worker process is shared by every TMDB call.
+# The pool should cover the page fetch pool plus concurrent request threads.
+TMDB_HTTP_POOL_SIZE = 10
+TMDB_CONNECT_TIMEOUT = 3.05 # seconds
+TMDB_READ_TIMEOUT = 10 # seconds
+
+# Identical in-flight TMDB requests are always coalesced within a worker; this also
+# coalesces them across workers (followers wait on the shared response cache)
+TMDB_COALESCE_ACROSS_WORKERS = False
+
+# Seconds a stored movie detail payload is served before it's revalidated with TMDB
+MOVIE_DETAILS_TTL = 60 * 60 * 24 * 3
+
+# Ready-to-serve recommendations kept per user, topped up on background threads
+# once fewer than PREFETCH_LOW_WATER are left
+PREFETCH_BUFFER_SIZE = 5
+PREFETCH_LOW_WATER = 2
+PREFETCH_WORKERS = 2
+
+# Random bonus (0..1 scale, added to cosine similarity) that keeps taste-ranked batches varied
+TASTE_EXPLORATION = 0.15
+
+# Refill page sampling: a page's weight is its last yield times SEEN_DECAY per fetch
+# (unseen pages weigh 1), floored at MIN_WEIGHT
+PAGE_SAMPLER_SEEN_DECAY = 0.02
+PAGE_SAMPLER_MIN_WEIGHT = 0.001
+
+# Seconds between sweeps that release expired 3-day blocks (per worker)
+BLOCK_SWEEP_INTERVAL = 60 * 5
+
+# Shared candidate pools, one per distinct filter set: discover pages per pool, seconds
+# between re-samples, idle seconds before a pool is dropped, details pre-fetched per
+# refresh (the popular pool always gets all of them), and the fewest unseen movies a
+# user needs before falling back to a private batch
+CANDIDATE_POOL_PAGES = 25
+CANDIDATE_POOL_REFRESH_INTERVAL = 60 * 30
+CANDIDATE_POOL_IDLE_TTL = 60 * 60 * 24
+CANDIDATE_POOL_HYDRATE = 100
+CANDIDATE_POOL_MIN_AVAILABLE = 20
+
+# Item-item similarity index (built by `manage.py build_item_similarity`): where its
+# versions are written, how many recent hearts/watchlists seed a user's neighbours, and
+# how many neighbours are blended into each recommendation batch
+ITEM_SIMILARITY_DIR = BASE_DIR / 'var' / 'item_similarity'
+ITEM_SIMILARITY_SEEDS = 20
+ITEM_SIMILARITY_CANDIDATES = 20
+
+# "More like this" on the movie detail page: titles shown and clusters of the embedding
+# index probed per lookup while building. Newly stored movies are embedded by running
+# `manage.py build_movie_embeddings` periodically (from cron, not the web workers)
+MOVIE_SIMILAR_COUNT = 10
+MOVIE_EMBEDDING_PROBES = 4
+
+# Most swipes accepted in one batched interaction request
+INTERACTION_BATCH_MAX_SWIPES = 50
+
+# Write-behind mode for swipes: append them to a local fsync'd log and write them to the
+# database in batches every INTERACTION_FLUSH_INTERVAL seconds, instead of one write
+# transaction per swipe. Logs left by a crashed worker are replayed by the next flush.
+INTERACTION_WRITE_BEHIND = False
+INTERACTION_LOG_DIR = BASE_DIR / 'var' / 'interaction_log'
+INTERACTION_FLUSH_INTERVAL = 1.0
+
+# Interaction events older than this many months are folded down to the last event per
+# user, movie and type by compact_interaction_events
+INTERACTION_EVENT_RETENTION_MONTHS = 3
+
+# Seconds between background refreshes of the genre registry (per worker)
+GENRE_REFRESH_INTERVAL = 60 * 60 * 24
+# Seconds between attempts to seed an empty Genre table from TMDB (lookups serve no genres meanwhile)
+GENRE_SEED_RETRY_INTERVAL = 60
+
+# Where discover/popular batches come from: 'tmdb' (remote API) or 'local' (catalog
+# mirrored into the Movie table by `python manage.py sync_tmdb_catalog`)
+TMDB_DISCOVER_BACKEND = 'tmdb'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -1,8 +1,9 @@
 from django.contrib import admin
-from .models import UserProfile, Movie, UserMovieInteraction, UserFilter
+from .models import UserProfile, Movie, InteractionEvent, UserMovieState, UserFilter
 
 admin.site.register(UserProfile)
 admin.site.register(Movie)
-admin.site.register(UserMovieInteraction)
+admin.site.register(InteractionEvent)
+admin.site.register(UserMovieState)
 admin.site.register(UserFilter)
 # Register your models here.
\ No newline at end of file
@@ -1,6 +1,25 @@
+import os
+import sys
 from django.apps import AppConfig
 
 
+def _serving_requests():
+    """False for management commands (migrate, test, the sync jobs), which shouldn't start background work"""
+    if os.path.basename(sys.argv[0]) not in ('manage.py', 'django-admin'):
+        return True # gunicorn/uwsgi/etc.
+    if sys.argv[1:2] != ['runserver']:
+        return False
+    # runserver's autoreloader only serves from its child process
+    return '--noreload' in sys.argv or os.environ.get('RUN_MAIN') == 'true'
+
+
 class FlickfinderConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'flickFinder'
+
+    def ready(self):
+        # Start refreshing the shared candidate pools at worker boot, so the popular pool
+        # is warm before the first user needs it rather than after
+        if _serving_requests():
+            from .services.candidate_pool import candidate_pools
+            candidate_pools.start()
@@ -30,12 +30,7 @@ class FilterForm(forms.ModelForm):
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        from .services.tmdb_service import TMDBService
+        from .services.genre_registry import genre_registry
         
-        # Get genres from TMDB
-        tmdb_service = TMDBService()
-        genres = tmdb_service.get_genre_list()
-        
-        # Create choices for genre field
-        genre_choices = [(str(genre['id']), genre['name']) for genre in genres]
-        self.fields['genre_ids'].widget.choices = genre_choices
\ No newline at end of file
+        # Genres come from the process-wide registry, no TMDB call per form
+        self.fields['genre_ids'].widget.choices = genre_registry.choices()
\ No newline at end of file
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from flickFinder.services.item_similarity import build_similarity, load_interaction_arrays, save_similarity
+
+
+class Command(BaseCommand):
+    help = ("Builds the item-item similarity index from every user's hearts and watchlists "
+            "and publishes it for the web workers. Run it from cron, e.g. nightly.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=50, help="Neighbours kept per movie")
+        parser.add_argument('--min-users', type=int, default=2, help="Skip movies fewer users interacted with")
+        parser.add_argument('--out', help="Index directory (defaults to settings.ITEM_SIMILARITY_DIR)")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        user_ids, movie_ids, weights = load_interaction_arrays()
+        self.stdout.write(f"Loaded {len(weights)} interactions in {time.monotonic() - started:.1f}s.")
+        if not len(weights):
+            self.stdout.write(self.style.WARNING("No interactions yet, nothing to build."))
+            return
+
+        items, neighbours, scores = build_similarity(user_ids, movie_ids, weights,
+                                                     top_k=options['top_k'], min_users=options['min_users'])
+        version = save_similarity(items, neighbours, scores, options['out'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {len(items)} movies into {version} in {time.monotonic() - started:.1f}s."))
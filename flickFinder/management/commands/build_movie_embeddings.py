@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from flickFinder.services.movie_embeddings import movie_embeddings
+
+
+class Command(BaseCommand):
+    help = ("Builds the \"more like this\" embeddings for stored movies. Only movies without an "
+            "embedding are added unless --full is given (or no full build in the current feature "
+            "layout has run yet); run it periodically (e.g. from cron) to pick up newly stored movies.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help="Refit the overview weights and clusters and re-embed every movie")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        if options['full'] or not movie_embeddings.has_space():
+            count = movie_embeddings.rebuild()
+            mode = "Re-embedded"
+        else:
+            count = movie_embeddings.update()
+            mode = "Added"
+        self.stdout.write(self.style.SUCCESS(f"{mode} {count} movies in {time.monotonic() - started:.1f}s."))
@@ -0,0 +1,33 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from flickFinder.services.interaction_events import compact_events, period_of, rebuild_states
+
+
+class Command(BaseCommand):
+    help = ("Folds interaction events older than the retention window down to the last event "
+            "per user, movie and type. With --rebuild, the interaction states are rebuilt "
+            "from the event log first.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-months', type=int,
+                            default=getattr(settings, 'INTERACTION_EVENT_RETENTION_MONTHS', 3),
+                            help="Months of full history to keep")
+        parser.add_argument('--rebuild', action='store_true',
+                            help="Rebuild every user's interaction states from the log")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        if options['rebuild']:
+            written = rebuild_states()
+            self.stdout.write(f"Rebuilt {written} interaction states.")
+
+        now = timezone.now()
+        months = now.year * 12 + now.month - 1 - options['keep_months']
+        before = period_of(now.replace(year=months // 12, month=months % 12 + 1, day=1))
+        removed = compact_events(before)
+        self.stdout.write(self.style.SUCCESS(
+            f"Removed {removed} superseded events before period {before} in {time.monotonic() - started:.1f}s."))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from flickFinder.services.interaction_writer import interaction_writer
+
+
+class Command(BaseCommand):
+    help = ("Writes every logged interaction no running worker is holding to the database. "
+            "Use it after turning INTERACTION_WRITE_BEHIND off, or to recover logs by hand.")
+
+    def handle(self, *args, **options):
+        applied = interaction_writer.flush()
+        self.stdout.write(self.style.SUCCESS(f"Applied {applied} logged interactions."))
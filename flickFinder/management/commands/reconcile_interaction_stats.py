@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from flickFinder.services.interaction_stats import reconcile_stats
+
+
+class Command(BaseCommand):
+    help = ("Rebuilds every user's interaction counters from their interaction states and "
+            "reports how many were missing or off.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help="Only reconcile this user id (can be repeated)")
+
+    def handle(self, *args, **options):
+        corrected = reconcile_stats(options['user_ids'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {corrected} interaction stats rows."))
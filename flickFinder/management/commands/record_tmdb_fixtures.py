@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from flickFinder.services.tmdb_service import TMDBService, TMDBServiceError
+from flickFinder.services.tmdb_standin import FixtureStore
+
+
+class Command(BaseCommand):
+    help = ("Records real TMDB responses into fixtures for the tmdb_standin server, "
+            "using the same endpoints and params TMDBService sends.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--out', required=True, help="Fixture directory")
+        parser.add_argument('--discover-pages', type=int, default=5, help="Unfiltered discover pages to record")
+        parser.add_argument('--genre-pages', type=int, default=0, help="Discover pages to record per genre")
+        parser.add_argument('--details', type=int, default=50, help="Movie details to record from the discovered results")
+        parser.add_argument('--search', action='append', default=[], help="Search query to record (repeatable)")
+
+    def handle(self, *args, **options):
+        service = TMDBService()
+        if not service.api_key:
+            raise CommandError("TMDB_API_KEY is not configured.")
+        service.BASE_URL = TMDBService.BASE_URL # always record the real API, even if TMDB_BASE_URL points elsewhere
+        self.out = options['out']
+        self.recorded = 0
+
+        genres = self._record(service, "genre/movie/list", {}) or {}
+
+        movie_ids = []
+        base_params = service._discover_params()
+        for page in range(1, options['discover_pages'] + 1):
+            data = self._record(service, "discover/movie", dict(base_params, page=page))
+            movie_ids += [m['id'] for m in (data or {}).get('results', [])]
+        for genre in genres.get('genres', []):
+            for page in range(1, options['genre_pages'] + 1):
+                self._record(service, "discover/movie", dict(base_params, with_genres=str(genre['id']), page=page))
+
+        for movie_id in list(dict.fromkeys(movie_ids))[:options['details']]:
+            self._record(service, f"movie/{movie_id}", {'append_to_response': 'credits'})
+
+        for query in options['search']:
+            self._record(service, "search/movie", {'query': query, 'include_adult': 'false'})
+
+        self.stdout.write(self.style.SUCCESS(f"Recorded {self.recorded} responses into {self.out}."))
+
+    def _record(self, service, endpoint, params):
+        """Fetches one response straight from TMDB (no cache) and saves it, errors included"""
+        try:
+            response = service._send(endpoint, params)
+            status, body = response.status_code, service._decode(response)
+        except TMDBServiceError as e:
+            if e.status_code is None:
+                raise CommandError(f"Recording {endpoint} failed: {e}") from e
+            status, body = e.status_code, None
+        FixtureStore.save(self.out, endpoint, params, status, body)
+        self.recorded += 1
+        return body if status == 200 else None
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from flickFinder.models import CandidatePool
+from flickFinder.services.candidate_pool import candidate_pools
+
+
+class Command(BaseCommand):
+    help = ("Warms the shared popular candidate pool and refreshes every stale pool now. "
+            "Run on deploy so the first users are served without TMDB calls; the web workers "
+            "keep the pools refreshed on their own afterwards.")
+
+    def handle(self, *args, **options):
+        candidate_pools.refresh_due()
+        for pool in CandidatePool.objects.order_by('signature'):
+            self.stdout.write(f"{pool} refreshed at {pool.refreshed_at}")
+        self.stdout.write(self.style.SUCCESS("Candidate pools are up to date."))
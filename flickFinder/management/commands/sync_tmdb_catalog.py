@@ -0,0 +1,71 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from flickFinder.models import CatalogSyncCheckpoint
+from flickFinder.services.genre_registry import genre_registry
+from flickFinder.services.local_catalog import ingest_discover_page, MAX_PAGE
+from flickFinder.services.movie_embeddings import movie_embeddings
+from flickFinder.services.tmdb_service import TMDBService, TMDBServiceError
+
+
+class Command(BaseCommand):
+    help = ("Ingests the TMDB discover/movie result space into the local Movie catalog. "
+            "Work is sliced by release year and checkpointed per page, so an interrupted run resumes.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start-year', type=int, default=1920)
+        parser.add_argument('--end-year', type=int, default=timezone.now().year + 1)
+        parser.add_argument('--max-pages', type=int, default=MAX_PAGE, help="Page limit per year (TMDB caps at 500)")
+        parser.add_argument('--restart', action='store_true', help="Ignore existing checkpoints and re-ingest everything")
+
+    def handle(self, *args, **options):
+        service = TMDBService()
+        if not service.api_key:
+            raise CommandError("TMDB_API_KEY is not configured.")
+
+        if not genre_registry.refresh():
+            raise CommandError("Could not load the TMDB genre list.")
+
+        if options['restart']:
+            CatalogSyncCheckpoint.objects.all().delete()
+
+        total_written = 0
+        for year in range(options['start_year'], options['end_year'] + 1):
+            checkpoint, _ = CatalogSyncCheckpoint.objects.get_or_create(slice_key=f"year:{year}")
+            if checkpoint.completed:
+                continue
+            total_written += self._sync_year(service, year, checkpoint, options['max_pages'])
+
+        # Newly ingested movies get their "more like this" lists right away
+        movie_embeddings.update()
+        self.stdout.write(self.style.SUCCESS(f"Catalog sync finished, {total_written} movies written."))
+
+    def _sync_year(self, service, year, checkpoint, max_pages):
+        """Walks the discover pages of one release year from its checkpoint onwards"""
+        params = service._discover_params()
+        params['primary_release_date.gte'] = f"{year}-01-01"
+        params['primary_release_date.lte'] = f"{year}-12-31"
+
+        written = 0
+        page = checkpoint.next_page
+        while True:
+            try:
+                # Bypass the response cache, a full crawl would just evict everything useful
+                data = service._make_request("discover/movie", dict(params, page=page), use_cache=False)
+            except TMDBServiceError as e:
+                self.stderr.write(f"{year} page {page} failed ({e}), stopping here. Re-run to resume.")
+                raise CommandError("Catalog sync interrupted.") from e
+            if not data:
+                raise CommandError("Empty response from TMDB, check the API key.")
+
+            written += ingest_discover_page(service, data.get('results', []))
+            checkpoint.total_pages = min(data.get('total_pages', 0), max_pages)
+            checkpoint.next_page = page + 1
+            checkpoint.completed = checkpoint.next_page > checkpoint.total_pages
+            checkpoint.save()
+            if checkpoint.completed:
+                break
+            page += 1
+
+        self.stdout.write(f"{year}: {written} movies over {checkpoint.total_pages} pages")
+        return written
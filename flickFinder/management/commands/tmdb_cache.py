@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from flickFinder.services.http_client import get_http_client, pool_stats
+from flickFinder.services.tmdb_service import response_cache
+
+
+class Command(BaseCommand):
+    help = ("Shows TMDB response cache and connection pool counters (summed across workers), "
+            "or prunes/clears the cache")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prune', action='store_true', help="Evict expired and least-recently-used entries")
+        parser.add_argument('--clear', action='store_true', help="Delete every cached response")
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            response_cache.clear()
+            self.stdout.write(self.style.SUCCESS("TMDB response cache cleared."))
+        elif options['prune']:
+            evicted = response_cache.prune()
+            self.stdout.write(self.style.SUCCESS(f"Evicted {evicted} cached responses."))
+
+        for name, value in response_cache.stats().items():
+            self.stdout.write(f"{name}: {value}")
+
+        get_http_client().flush_counters(force=True) # in case this process called TMDB itself
+        for name, value in pool_stats().items():
+            self.stdout.write(f"{name}: {value}")
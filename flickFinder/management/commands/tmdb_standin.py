@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from flickFinder.services.tmdb_standin import FixtureStore, TMDBStandinServer
+
+
+class Command(BaseCommand):
+    help = ("Serves recorded TMDB fixtures (see record_tmdb_fixtures) as a local stand-in for the API, "
+            "with optional latency, jitter and error injection. Point TMDB_BASE_URL at it.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fixtures', required=True, help="Fixture directory")
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency', type=float, default=0.0, help="Milliseconds added to every response")
+        parser.add_argument('--jitter', type=float, default=0.0, help="+/- milliseconds of random variation")
+        parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with a 503")
+        parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="Fraction of requests answered with a 429")
+        parser.add_argument('--retry-after', type=int, default=1, help="Retry-After seconds sent with injected 429s")
+        parser.add_argument('--seed', type=int, default=None, help="Seed for reproducible jitter and errors")
+
+    def handle(self, *args, **options):
+        fixtures = FixtureStore(options['fixtures'])
+        if not len(fixtures):
+            raise CommandError(f"No fixtures found in {options['fixtures']}.")
+
+        server = TMDBStandinServer(
+            fixtures, host=options['host'], port=options['port'],
+            latency=options['latency'] / 1000, jitter=options['jitter'] / 1000,
+            error_rate=options['error_rate'], rate_limit_rate=options['rate_limit_rate'],
+            retry_after=options['retry_after'], seed=options['seed'])
+        self.stdout.write(f"Serving {len(fixtures)} fixtures at {server.url}")
+        self.stdout.write(f"Set TMDB_BASE_URL={server.url} in .env to use it. Ctrl-C to stop.")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            for stat, count in sorted(server.stats.items()):
+                self.stdout.write(f"{stat}: {count}")
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flickFinder', '0007_alter_movie_genres_alter_movie_tmdb_id_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TMDBCacheCounter',
+            fields=[
+                ('name', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TMDBCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(help_text='sha256 of endpoint + canonical params', max_length=64, unique=True)),
+                ('endpoint', models.CharField(max_length=255)),
+                ('status_code', models.PositiveSmallIntegerField(default=200)),
+                ('payload', models.JSONField(blank=True, null=True)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('last_accessed', models.DateTimeField(db_index=True, help_text='Used for LRU eviction')),
+            ],
+        ),
+    ]
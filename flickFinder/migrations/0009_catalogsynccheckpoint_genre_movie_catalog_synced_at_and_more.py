@@ -0,0 +1,56 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flickFinder', '0008_tmdbcachecounter_tmdbcacheentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogSyncCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slice_key', models.CharField(max_length=32, unique=True)),
+                ('next_page', models.IntegerField(default=1)),
+                ('total_pages', models.IntegerField(blank=True, null=True)),
+                ('completed', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Genre',
+            fields=[
+                ('id', models.IntegerField(help_text='TMDB genre identifier', primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=64)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='catalog_synced_at',
+            field=models.DateTimeField(blank=True, db_index=True, help_text='Set when ingested into the local catalog', null=True),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='popularity',
+            field=models.FloatField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='movie',
+            name='release_date',
+            field=models.DateField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='movie',
+            name='vote_average',
+            field=models.FloatField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='genre_links',
+            field=models.ManyToManyField(blank=True, help_text='Indexed copy of genres for local discover', related_name='movies', to='flickFinder.genre'),
+        ),
+    ]
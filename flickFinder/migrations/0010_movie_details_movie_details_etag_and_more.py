@@ -0,0 +1,28 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flickFinder', '0009_catalogsynccheckpoint_genre_movie_catalog_synced_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='details',
+            field=models.JSONField(blank=True, help_text='Full movie/{id} payload with credits, as served to pages', null=True),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='details_etag',
+            field=models.CharField(blank=True, help_text='ETag of details, sent as If-None-Match on revalidation', max_length=128, null=True),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='details_fetched_at',
+            field=models.DateTimeField(blank=True, help_text='When details were last fetched or revalidated', null=True),
+        ),
+    ]
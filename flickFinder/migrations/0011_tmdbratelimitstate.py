@@ -0,0 +1,24 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flickFinder', '0010_movie_details_movie_details_etag_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TMDBRateLimitState',
+            fields=[
+                ('name', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('tokens', models.FloatField(default=0)),
+                ('refilled_at', models.FloatField(default=0)),
+                ('blocked_until', models.FloatField(default=0, help_text='Set from Retry-After, nobody calls TMDB before this')),
+                ('consecutive_failures', models.IntegerField(default=0)),
+                ('open_until', models.FloatField(default=0, help_text='Circuit breaker is open (fail fast) until this time')),
+            ],
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flickFinder', '0011_tmdbratelimitstate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TMDBInflightRequest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('expires_at', models.DateTimeField(help_text='Lease is considered abandoned after this')),
+            ],
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.6 on 2026-10-18 13:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('flickFinder', '0012_tmdbinflightrequest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecommendationBuffer',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='recommendation_buffer', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('candidate_ids', models.JSONField(default=list, help_text='TMDB ids from the last batch, in serve order')),
+                ('ready_ids', models.JSONField(default=list, help_text='TMDB ids with stored details, served first')),
+                ('source', models.CharField(blank=True, default='', help_text="'filtered' or 'popular'", max_length=16)),
+                ('generation', models.PositiveIntegerField(default=0, help_text='Bumped on reset so in-flight prefetches are discarded')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
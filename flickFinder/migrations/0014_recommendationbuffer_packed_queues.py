@@ -0,0 +1,41 @@
+# Generated by Django 5.1.6 on 2026-10-18 13:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flickFinder', '0013_recommendationbuffer'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='recommendationbuffer',
+            name='candidate_ids',
+        ),
+        migrations.RemoveField(
+            model_name='recommendationbuffer',
+            name='ready_ids',
+        ),
+        migrations.AddField(
+            model_name='recommendationbuffer',
+            name='candidate_data',
+            field=models.BinaryField(default=b'', help_text='Packed TMDB ids from the last batch, in serve order'),
+        ),
+        migrations.AddField(
+            model_name='recommendationbuffer',
+            name='candidate_head',
+            field=models.PositiveIntegerField(default=0, help_text='Index of the next unclaimed candidate'),
+        ),
+        migrations.AddField(
+            model_name='recommendationbuffer',
+            name='ready_data',
+            field=models.BinaryField(default=b'', help_text='Packed TMDB ids with stored details, served first'),
+        ),
+        migrations.AddField(
+            model_name='recommendationbuffer',
+            name='ready_head',
+            field=models.PositiveIntegerField(default=0, help_text='Index of the next movie to serve'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.6 on 2026-10-18 13:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('flickFinder', '0014_recommendationbuffer_packed_queues'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserTasteVector',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='taste_vector', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('vector', models.BinaryField(default=b'', help_text='Packed little-endian float32 feature weights')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.6 on 2026-10-18 13:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('flickFinder', '0015_usertastevector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserExclusionSet',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='exclusion_set', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('excluded_data', models.BinaryField(default=b'', help_text='Sorted TMDB ids with a non-block interaction')),
+                ('blocked_data', models.BinaryField(default=b'', help_text='TMDB ids blocked for now')),
+                ('blocked_until_data', models.BinaryField(default=b'', help_text='Epoch second each blocked id expires, same order')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
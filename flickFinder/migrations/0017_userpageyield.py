@@ -0,0 +1,29 @@
+# Generated by Django 5.1.6 on 2026-10-18 13:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flickFinder', '0016_userexclusionset'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserPageYield',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('signature_hash', models.CharField(help_text='sha1 of the filter signature', max_length=40)),
+                ('pages', models.JSONField(default=dict, help_text="{'page': [times fetched, share that survived last time]}")),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='page_yields', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'signature_hash')},
+            },
+        ),
+    ]
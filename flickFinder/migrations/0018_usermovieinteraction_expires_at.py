@@ -0,0 +1,36 @@
+# Generated by Django 5.1.6 on 2026-10-18 13:09
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def set_block_expiry(apps, schema_editor):
+    """Gives blocks from the last 3 days their expiry, older ones are already over"""
+    UserMovieInteraction = apps.get_model('flickFinder', 'UserMovieInteraction')
+    duration = timezone.timedelta(days=3)
+    active = UserMovieInteraction.objects.filter(interaction_type='block', timestamp__gt=timezone.now() - duration)
+    for interaction in active.only('id', 'timestamp'):
+        interaction.expires_at = interaction.timestamp + duration
+        interaction.save(update_fields=['expires_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flickFinder', '0017_userpageyield'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usermovieinteraction',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, help_text='When an active block ends, cleared once the sweeper releases it', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='usermovieinteraction',
+            index=models.Index(condition=models.Q(('expires_at__isnull', False)), fields=['expires_at'], name='interaction_block_expiry'),
+        ),
+        migrations.RunPython(set_block_expiry, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.6 on 2026-10-18 13:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flickFinder', '0018_usermovieinteraction_expires_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CandidatePool',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('signature_hash', models.CharField(help_text='sha1 of the filter signature', max_length=40, unique=True)),
+                ('signature', models.TextField(help_text='Canonical discover params, TMDBService.filter_signature')),
+                ('filters', models.JSONField(blank=True, help_text='Filter snapshot to rebuild discover params, null for popular', null=True)),
+                ('movie_data', models.BinaryField(default=b'', help_text='Packed TMDB ids in the pool')),
+                ('movie_head', models.PositiveIntegerField(default=0)),
+                ('total_pages', models.IntegerField(default=0)),
+                ('refreshed_at', models.DateTimeField(blank=True, null=True)),
+                ('last_used_at', models.DateTimeField(db_index=True, help_text='Pools nobody uses for a while are dropped')),
+                ('lease_until', models.DateTimeField(blank=True, help_text='Set while a worker is refreshing the pool', null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.6 on 2026-10-18 13:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flickFinder', '0019_candidatepool'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmbeddingSpace',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=32, unique=True)),
+                ('idf', models.BinaryField(help_text='Packed float32 IDF per hashed overview term bucket')),
+                ('centroids', models.BinaryField(help_text='Packed float32 (clusters x dims) centroids')),
+                ('dims', models.IntegerField()),
+                ('movie_count', models.IntegerField(default=0)),
+                ('built_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MovieEmbedding',
+            fields=[
+                ('movie', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='embedding', serialize=False, to='flickFinder.movie')),
+                ('vector', models.BinaryField(help_text='Packed little-endian float32, unit length')),
+                ('cluster', models.IntegerField(db_index=True, help_text='Nearest centroid of the embedding space')),
+                ('similar_data', models.BinaryField(default=b'', help_text='Packed TMDB ids of the most similar movies, best first')),
+                ('similar_scores', models.BinaryField(default=b'', help_text='Packed float32 cosine scores matching similar_data')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
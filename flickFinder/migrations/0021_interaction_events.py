@@ -0,0 +1,95 @@
+# Generated by Django 5.1.6 on 2026-10-18 13:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+COLUMNS = {'heart': 'heart_at', 'watchlist': 'watchlist_at', 'skip': 'skip_at', 'block': 'block_at'}
+
+
+def copy_interactions(apps, schema_editor):
+    """Turns every interaction row into an event, oldest first, and folds them into states"""
+    UserMovieInteraction = apps.get_model('flickFinder', 'UserMovieInteraction')
+    InteractionEvent = apps.get_model('flickFinder', 'InteractionEvent')
+    UserMovieState = apps.get_model('flickFinder', 'UserMovieState')
+    events = []
+    states = {}
+    for row in UserMovieInteraction.objects.order_by('timestamp', 'id').iterator():
+        events.append(InteractionEvent(user_id=row.user_id, movie_id=row.movie_id, interaction_type=row.interaction_type,
+                                       timestamp=row.timestamp, expires_at=row.expires_at,
+                                       period=row.timestamp.year * 100 + row.timestamp.month))
+        state = states.setdefault((row.user_id, row.movie_id), UserMovieState(user_id=row.user_id, movie_id=row.movie_id))
+        if row.interaction_type in COLUMNS:
+            setattr(state, COLUMNS[row.interaction_type], row.timestamp)
+        else: # 'unwatch'
+            state.skip_at = row.timestamp
+        if row.interaction_type == 'block':
+            state.expires_at = row.expires_at # already cleared for released blocks
+        state.updated_at = row.timestamp
+    InteractionEvent.objects.bulk_create(events, batch_size=500)
+    UserMovieState.objects.bulk_create(states.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flickFinder', '0020_movie_embeddings'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InteractionEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('interaction_type', models.CharField(choices=[('heart', 'Hearted'), ('block', 'Blocked'), ('watchlist', 'Added to Watchlist'), ('skip', 'Skipped'), ('unwatch', 'Unwatched')], max_length=10)),
+                ('timestamp', models.DateTimeField()),
+                ('expires_at', models.DateTimeField(blank=True, help_text='When the block ends, for block events', null=True)),
+                ('period', models.PositiveIntegerField(help_text='Time partition, year * 100 + month of the timestamp')),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='flickFinder.movie')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserMovieState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('heart_at', models.DateTimeField(blank=True, null=True)),
+                ('watchlist_at', models.DateTimeField(blank=True, null=True)),
+                ('skip_at', models.DateTimeField(blank=True, null=True)),
+                ('block_at', models.DateTimeField(blank=True, null=True)),
+                ('expires_at', models.DateTimeField(blank=True, help_text='When an active block ends, cleared once the sweeper releases it', null=True)),
+                ('updated_at', models.DateTimeField()),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='flickFinder.movie')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movie_states', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='interactionevent',
+            index=models.Index(fields=['period', 'id'], name='flickFinder_period_b2e36e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='interactionevent',
+            index=models.Index(fields=['user', 'movie'], name='flickFinder_user_id_9abe42_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usermoviestate',
+            index=models.Index(condition=models.Q(('watchlist_at__isnull', False)), fields=['user', '-watchlist_at'], name='state_watchlist'),
+        ),
+        migrations.AddIndex(
+            model_name='usermoviestate',
+            index=models.Index(condition=models.Q(('heart_at__isnull', False)), fields=['user', '-heart_at'], name='state_heart'),
+        ),
+        migrations.AddIndex(
+            model_name='usermoviestate',
+            index=models.Index(condition=models.Q(('expires_at__isnull', False)), fields=['expires_at'], name='state_block_expiry'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='usermoviestate',
+            unique_together={('user', 'movie')},
+        ),
+        migrations.RunPython(copy_interactions, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='UserMovieInteraction',
+        ),
+    ]
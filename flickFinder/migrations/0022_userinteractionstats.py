@@ -0,0 +1,28 @@
+# Generated by Django 5.1.6 on 2026-10-18 13:33
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('flickFinder', '0021_interaction_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserInteractionStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='interaction_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('watchlist_count', models.IntegerField(default=0)),
+                ('heart_count', models.IntegerField(default=0)),
+                ('skip_count', models.IntegerField(default=0)),
+                ('block_count', models.IntegerField(default=0)),
+                ('total_interactions', models.IntegerField(default=0, help_text='Movies the user has interacted with')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.6 on 2026-10-18 13:55
+
+from django.db import migrations, models
+
+# services/taste.py's signature of its original 19-genre layout
+BASE_LAYOUT = '61099640'
+
+
+def mark_embedding_space(apps, schema_editor):
+    """
+    Marks the stored embedding space as built in the original layout, so it stays usable
+
+    Taste vectors are left unmarked: they only hold interactions since they were added, so
+    each is rebuilt from the user's full history on its next read.
+    """
+    EmbeddingSpace = apps.get_model('flickFinder', 'EmbeddingSpace')
+    EmbeddingSpace.objects.update(layout=BASE_LAYOUT)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flickFinder', '0022_userinteractionstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='embeddingspace',
+            name='layout',
+            field=models.CharField(blank=True, default='', help_text='Signature of the feature layout the space was built in', max_length=8),
+        ),
+        migrations.AddField(
+            model_name='usertastevector',
+            name='layout',
+            field=models.CharField(blank=True, default='', help_text='Signature of the feature layout the vector was built in', max_length=8),
+        ),
+        migrations.RunPython(mark_embedding_space, migrations.RunPython.noop),
+    ]
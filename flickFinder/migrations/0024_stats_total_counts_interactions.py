@@ -0,0 +1,24 @@
+# Generated by Django 5.1.6 on 2026-10-18 13:57
+
+from django.db import migrations, models
+
+
+def drop_stats(apps, schema_editor):
+    """Drops the stats rows built with the old total (distinct movies), they're rebuilt on first load"""
+    apps.get_model('flickFinder', 'UserInteractionStats').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flickFinder', '0023_feature_layout'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userinteractionstats',
+            name='total_interactions',
+            field=models.IntegerField(default=0, help_text='Interactions in effect, the sum of the per-type counts'),
+        ),
+        migrations.RunPython(drop_stats, migrations.RunPython.noop),
+    ]
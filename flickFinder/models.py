@@ -21,29 +21,65 @@ class UserProfile(models.Model):
         """Returns the username of the associated user"""
         return self.user.username
 
+class Genre(models.Model):
+    """
+    A TMDB movie genre, the primary key is the TMDB genre id
+    """
+    id = models.IntegerField(primary_key=True, help_text="TMDB genre identifier")
+    name = models.CharField(max_length=64)
+
+    def __str__(self):
+        """Returns the genre name"""
+        return self.name
+
 class Movie(models.Model):
     """
     Represents a movie, stores key details fetched from TMDB
+
+    Rows ingested by the sync_tmdb_catalog command also carry popularity
+    and genre links so discover queries can be answered locally.
     """
     tmdb_id = models.IntegerField(unique=True, help_text="TMDB unique identifier")
     title = models.CharField(max_length=255)
     poster_path = models.CharField(max_length=255, null=True, blank=True)
     overview = models.TextField(null=True, blank=True)
-    release_date = models.DateField(null=True, blank=True)
-    vote_average = models.FloatField(null=True, blank=True)
+    release_date = models.DateField(null=True, blank=True, db_index=True)
+    vote_average = models.FloatField(null=True, blank=True, db_index=True)
     vote_count = models.IntegerField(null=True, blank=True, help_text="Should have minimum of 100 votes")
     genres = models.JSONField(null=True, blank=True, help_text="List of genre dicts, e.g., [{'id': 28, 'name': 'Action'}]")
+    popularity = models.FloatField(null=True, blank=True, db_index=True)
+    genre_links = models.ManyToManyField(Genre, blank=True, related_name='movies', help_text="Indexed copy of genres for local discover")
+    catalog_synced_at = models.DateTimeField(null=True, blank=True, db_index=True, help_text="Set when ingested into the local catalog")
+    details = models.JSONField(null=True, blank=True, help_text="Full movie/{id} payload with credits, as served to pages")
+    details_etag = models.CharField(max_length=128, null=True, blank=True, help_text="ETag of details, sent as If-None-Match on revalidation")
+    details_fetched_at = models.DateTimeField(null=True, blank=True, help_text="When details were last fetched or revalidated")
     
     def __str__(self):
         """Returns the title of the movie"""
         return self.title
 
-class UserMovieInteraction(models.Model):
+class CatalogSyncCheckpoint(models.Model):
+    """
+    Progress of one slice (release year) of the local catalog ingest, so the sync can resume
+    """
+    slice_key = models.CharField(max_length=32, unique=True)
+    next_page = models.IntegerField(default=1)
+    total_pages = models.IntegerField(null=True, blank=True)
+    completed = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        """Returns the slice and how far it got"""
+        return f"{self.slice_key}: page {self.next_page}/{self.total_pages or '?'}"
+
+class InteractionEvent(models.Model):
     """
-    Records interactions between a User and a Movie.
+    Append-only log of interactions between a User and a Movie (see services/interaction_events.py)
 
-    Tracks actions 'heart', 'block', 'watchlist', 'skip'
-    Ensures that a specific interaction type for a user/movie combination is unique
+    Tracks actions 'heart', 'block', 'watchlist', 'skip' and 'unwatch' (taken off the
+    watchlist and favorites). Rows are only ever inserted; the current state of each
+    user/movie pair is folded into UserMovieState as events are written, and compaction
+    folds old periods down to the last event per user, movie and type.
     """
     INTERACTION_CHOICES = [
         ('heart', 'Hearted'),
@@ -52,31 +88,117 @@ class UserMovieInteraction(models.Model):
         ('skip', 'Skipped'),
         ('unwatch', 'Unwatched')
     ]
-    
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    BLOCK_DURATION = timezone.timedelta(days=3)
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False) # covered by the (user, movie) index
     movie = models.ForeignKey(Movie, on_delete=models.CASCADE)
     interaction_type = models.CharField(max_length=10, choices=INTERACTION_CHOICES)
-    timestamp = models.DateTimeField(auto_now_add=True)
-    
+    timestamp = models.DateTimeField()
+    expires_at = models.DateTimeField(null=True, blank=True, help_text="When the block ends, for block events")
+    period = models.PositiveIntegerField(help_text="Time partition, year * 100 + month of the timestamp")
+
     class Meta:
-        unique_together = ('user', 'movie', 'interaction_type')
-        # Index should allow faster lookups if we still use the interactions for everything
         indexes = [
-            models.Index(fields=['user', 'interaction_type', 'timestamp']),
+            # Compaction works through whole periods, oldest first
+            models.Index(fields=['period', 'id']),
+            models.Index(fields=['user', 'movie']),
         ]
-    
+
+    def __str__(self):
+        """Returns who did what to which movie"""
+        return f"{self.user_id} {self.interaction_type} {self.movie_id} at {self.timestamp:%Y-%m-%d %H:%M}"
+
+class UserMovieState(models.Model):
+    """
+    Current state of a user's interactions with one movie, folded from InteractionEvent.
+
+    One row per user/movie pair, holding when each interaction type last happened while
+    it's still in effect. The watchlist, favorites, exclusions and block sweeper read
+    this instead of the event log.
+    """
+    # State column each event type sets, 'unwatch' clears heart and watchlist instead
+    TYPE_COLUMNS = {'heart': 'heart_at', 'watchlist': 'watchlist_at', 'skip': 'skip_at', 'block': 'block_at'}
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='movie_states')
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE)
+    heart_at = models.DateTimeField(null=True, blank=True)
+    watchlist_at = models.DateTimeField(null=True, blank=True)
+    skip_at = models.DateTimeField(null=True, blank=True)
+    block_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True, help_text="When an active block ends, cleared once the sweeper releases it")
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('user', 'movie')
+        indexes = [
+            # The watchlist and favorites pages, newest first
+            models.Index(fields=['user', '-watchlist_at'], name='state_watchlist',
+                         condition=models.Q(watchlist_at__isnull=False)),
+            models.Index(fields=['user', '-heart_at'], name='state_heart',
+                         condition=models.Q(heart_at__isnull=False)),
+            # Only active blocks carry an expiry, so the sweeper's index stays tiny
+            models.Index(fields=['expires_at'], name='state_block_expiry',
+                         condition=models.Q(expires_at__isnull=False)),
+        ]
+
+    def apply(self, interaction_type, timestamp, expires_at=None):
+        """Folds one event into this state"""
+        if interaction_type == 'unwatch':
+            self.heart_at = self.watchlist_at = None
+            self.skip_at = timestamp # stays out of recommendations, as a skip
+        else:
+            setattr(self, self.TYPE_COLUMNS[interaction_type], timestamp)
+            if interaction_type == 'block':
+                self.expires_at = expires_at
+        self.updated_at = timestamp
+
+    @property
+    def active_types(self):
+        """Interaction types currently in effect, e.g. {'heart', 'watchlist'}"""
+        return {t for t, column in self.TYPE_COLUMNS.items() if getattr(self, column)}
+
+    @property
+    def interaction_type(self):
+        """The most recent interaction type still in effect, or None"""
+        times = {t: getattr(self, column) for t, column in self.TYPE_COLUMNS.items() if getattr(self, column)}
+        return max(times, key=times.get) if times else None
+
     @property
     def is_block_active(self):
         """
-        Checks if a 'block' interaction is still considered active (within 3 days)
+        Checks if a 'block' is still considered active (not expired yet)
 
         Returns:
-            bool: True if interaction is 'block' and timestamp <= 3 days ago
+            bool: True if the movie is blocked and its expiry hasn't passed
         """
-        if self.interaction_type == 'block':
-            return timezone.now() < self.timestamp + timezone.timedelta(days=3)
+        if self.block_at and self.expires_at:
+            return timezone.now() < self.expires_at
         return False
 
+    def __str__(self):
+        """Returns the username, movie and current interaction"""
+        return f"{self.user.username}: {self.movie.title} ({self.interaction_type or 'none'})"
+
+class UserInteractionStats(models.Model):
+    """
+    Counts of a user's current interactions, for the watchlist and favorites page headers
+    (see services/interaction_stats.py)
+
+    Built once from UserMovieState, then adjusted in the same transaction as every
+    interaction write, so the header is one primary key lookup however long the history is.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='interaction_stats')
+    watchlist_count = models.IntegerField(default=0)
+    heart_count = models.IntegerField(default=0)
+    skip_count = models.IntegerField(default=0)
+    block_count = models.IntegerField(default=0)
+    total_interactions = models.IntegerField(default=0, help_text="Interactions in effect, the sum of the per-type counts")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        """Returns the username and total"""
+        return f"{self.user.username}: {self.total_interactions} interactions"
+
 class UserFilter(models.Model):
     """
     Stores user-specific filtering preferences for movie recommendations
@@ -100,3 +222,192 @@ class UserFilter(models.Model):
         if self.min_release_year and self.max_release_year and self.min_release_year > self.max_release_year:
             logger.warning(f"Validation Error for User {self.user.id}: Min year ({self.min_release_year}) > Max year ({self.max_release_year}).")
             raise ValidationError('Minimum release year cannot be after maximum release year.')
+
+class RecommendationBuffer(models.Model):
+    """
+    A user's recommendation queue, kept in its own table so it survives logout and
+    device changes and the background prefetcher can fill it
+
+    Both queues are packed uint32 TMDB ids plus a head index (see services/id_queue.py),
+    so serving a movie only sets ready_head (the row, blobs included, is still read and
+    rewritten by SQLite). ready ids already have their details stored
+    on the Movie row; candidate ids are the rest of the last batch, not hydrated yet.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='recommendation_buffer')
+    candidate_data = models.BinaryField(default=b'', help_text="Packed TMDB ids from the last batch, in serve order")
+    candidate_head = models.PositiveIntegerField(default=0, help_text="Index of the next unclaimed candidate")
+    ready_data = models.BinaryField(default=b'', help_text="Packed TMDB ids with stored details, served first")
+    ready_head = models.PositiveIntegerField(default=0, help_text="Index of the next movie to serve")
+    source = models.CharField(max_length=16, blank=True, default='', help_text="'filtered' or 'popular'")
+    generation = models.PositiveIntegerField(default=0, help_text="Bumped on reset so in-flight prefetches are discarded")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        """Returns a summary of the buffer"""
+        ready = len(self.ready_data or b'') // 4 - self.ready_head
+        queued = len(self.candidate_data or b'') // 4 - self.candidate_head
+        return f"{self.user.username}: {ready} ready, {queued} queued"
+
+class UserExclusionSet(models.Model):
+    """
+    Compact copy of the TMDB ids a user shouldn't be recommended (see services/exclusions.py)
+
+    Built once from the interaction history, then kept up to date on every interaction
+    write, so refills don't scan the history. All three fields are packed uint32 arrays.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='exclusion_set')
+    excluded_data = models.BinaryField(default=b'', help_text="Sorted TMDB ids with a non-block interaction")
+    blocked_data = models.BinaryField(default=b'', help_text="TMDB ids blocked for now")
+    blocked_until_data = models.BinaryField(default=b'', help_text="Epoch second each blocked id expires, same order")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        """Returns the username of the associated user"""
+        return f"Exclusions of {self.user.username}"
+
+class CandidatePool(models.Model):
+    """
+    Recommendation candidates shared by every user with the same filters
+    (see services/candidate_pool.py)
+    """
+    signature_hash = models.CharField(max_length=40, unique=True, help_text="sha1 of the filter signature")
+    signature = models.TextField(help_text="Canonical discover params, TMDBService.filter_signature")
+    filters = models.JSONField(null=True, blank=True, help_text="Filter snapshot to rebuild discover params, null for popular")
+    movie_data = models.BinaryField(default=b'', help_text="Packed TMDB ids in the pool")
+    movie_head = models.PositiveIntegerField(default=0)
+    total_pages = models.IntegerField(default=0)
+    refreshed_at = models.DateTimeField(null=True, blank=True)
+    last_used_at = models.DateTimeField(db_index=True, help_text="Pools nobody uses for a while are dropped")
+    lease_until = models.DateTimeField(null=True, blank=True, help_text="Set while a worker is refreshing the pool")
+
+    def __str__(self):
+        """Returns the signature and pool size"""
+        return f"{self.signature} ({len(self.movie_data or b'') // 4 - self.movie_head} movies)"
+
+class UserPageYield(models.Model):
+    """
+    Per user and filter signature: which discover pages were fetched and how much of each
+    survived the user's exclusions, used by services/page_sampler.py to pick refill pages
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='page_yields')
+    signature_hash = models.CharField(max_length=40, help_text="sha1 of the filter signature")
+    pages = models.JSONField(default=dict, help_text="{'page': [times fetched, share that survived last time]}")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('user', 'signature_hash')
+
+    def __str__(self):
+        """Returns the username and number of pages seen"""
+        return f"{self.user.username}: {len(self.pages or {})} pages seen"
+
+class UserTasteVector(models.Model):
+    """
+    A user's taste as a float32 feature vector (see services/taste.py for the layout)
+
+    Built from the user's hearts and watchlist on first read, then updated incrementally
+    whenever a movie is hearted, watchlisted or removed, and used to rank each new
+    recommendation batch.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='taste_vector')
+    vector = models.BinaryField(default=b'', help_text="Packed little-endian float32 feature weights")
+    layout = models.CharField(max_length=8, blank=True, default='', help_text="Signature of the feature layout the vector was built in")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        """Returns the username of the associated user"""
+        return f"Taste of {self.user.username}"
+
+class MovieEmbedding(models.Model):
+    """
+    A movie's content embedding and its "more like this" list (see services/movie_embeddings.py)
+
+    Neighbours are found through the clustered index when the movie is embedded and
+    kept here, so the detail page only reads them.
+    """
+    movie = models.OneToOneField(Movie, on_delete=models.CASCADE, primary_key=True, related_name='embedding')
+    vector = models.BinaryField(help_text="Packed little-endian float32, unit length")
+    cluster = models.IntegerField(db_index=True, help_text="Nearest centroid of the embedding space")
+    similar_data = models.BinaryField(default=b'', help_text="Packed TMDB ids of the most similar movies, best first")
+    similar_scores = models.BinaryField(default=b'', help_text="Packed float32 cosine scores matching similar_data")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        """Returns the movie title"""
+        return f"Embedding of {self.movie.title}"
+
+class EmbeddingSpace(models.Model):
+    """
+    What a full embedding build fitted (overview IDF weights and cluster centroids),
+    reused to embed newly ingested movies incrementally
+    """
+    name = models.CharField(max_length=32, unique=True)
+    idf = models.BinaryField(help_text="Packed float32 IDF per hashed overview term bucket")
+    centroids = models.BinaryField(help_text="Packed float32 (clusters x dims) centroids")
+    dims = models.IntegerField()
+    layout = models.CharField(max_length=8, blank=True, default='', help_text="Signature of the feature layout the space was built in")
+    movie_count = models.IntegerField(default=0)
+    built_at = models.DateTimeField()
+
+    def __str__(self):
+        """Returns the space name and size"""
+        return f"{self.name} ({self.movie_count} movies)"
+
+class TMDBCacheEntry(models.Model):
+    """
+    Cached TMDB API response, shared by every worker through the database.
+
+    Keyed on a hash of the endpoint and its canonical params (api_key removed).
+    A status_code of 404 marks a negative entry so dead ids aren't re-fetched.
+    """
+    key = models.CharField(max_length=64, unique=True, help_text="sha256 of endpoint + canonical params")
+    endpoint = models.CharField(max_length=255)
+    status_code = models.PositiveSmallIntegerField(default=200)
+    payload = models.JSONField(null=True, blank=True)
+    expires_at = models.DateTimeField(db_index=True)
+    last_accessed = models.DateTimeField(db_index=True, help_text="Used for LRU eviction")
+
+    def __str__(self):
+        """Returns the endpoint and status of the cached response"""
+        return f"{self.endpoint} ({self.status_code})"
+
+class TMDBCacheCounter(models.Model):
+    """
+    Hit/miss/eviction totals for the TMDB response cache and connection pool counts
+    for the TMDB HTTP client, summed across workers.
+    """
+    name = models.CharField(max_length=32, primary_key=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        """Returns the counter name and value"""
+        return f"{self.name}: {self.value}"
+
+class TMDBRateLimitState(models.Model):
+    """
+    Shared token bucket and circuit breaker state for outbound TMDB calls.
+
+    One row per limiter, updated inside a transaction so every gunicorn worker draws
+    from the same bucket. Times are unix timestamps.
+    """
+    name = models.CharField(max_length=32, primary_key=True)
+    tokens = models.FloatField(default=0)
+    refilled_at = models.FloatField(default=0)
+    blocked_until = models.FloatField(default=0, help_text="Set from Retry-After, nobody calls TMDB before this")
+    consecutive_failures = models.IntegerField(default=0)
+    open_until = models.FloatField(default=0, help_text="Circuit breaker is open (fail fast) until this time")
+
+    def __str__(self):
+        """Returns the limiter name and its current token count"""
+        return f"{self.name}: {self.tokens:.1f} tokens"
+
+class TMDBInflightRequest(models.Model):
+    """
+    Marks a TMDB request one worker is currently making, so other workers wait for its result
+    """
+    key = models.CharField(max_length=64, unique=True)
+    expires_at = models.DateTimeField(help_text="Lease is considered abandoned after this")
+
+    def __str__(self):
+        """Returns the request key"""
+        return self.key
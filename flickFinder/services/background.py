@@ -0,0 +1,67 @@
+import logging
+import os
+import random
+import threading
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicTask:
+    """
+    Runs a function on a daemon thread every `interval` seconds.
+
+    Started lazily (start() is idempotent) so each gunicorn worker gets exactly one thread
+    per task, and restarted if the process has forked since. A little jitter keeps the
+    workers from all firing at the same moment.
+    """
+
+    def __init__(self, name, func, interval, initial_delay=None, jitter=0.1):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.initial_delay = interval if initial_delay is None else initial_delay
+        self.jitter = jitter
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def start(self):
+        """Starts the background thread if it isn't already running in this process"""
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name=f"periodic-{self.name}", daemon=True)
+            self._thread.start()
+            logger.debug(f"Started periodic task '{self.name}' every {self.interval}s in process {self._pid}")
+
+    def stop(self):
+        """Asks the thread to exit after its current run"""
+        self._stop.set()
+
+    def run_now(self):
+        """Runs the task once on the calling thread"""
+        try:
+            self.func()
+        except Exception as e:
+            logger.exception(f"Periodic task '{self.name}' failed: {e}")
+        finally:
+            close_old_connections()
+
+    def _sleep(self, seconds):
+        """Waits, returning True if stop() was called meanwhile"""
+        spread = seconds * self.jitter
+        return self._stop.wait(max(0.0, seconds + random.uniform(-spread, spread)))
+
+    def _run(self):
+        if self._sleep(self.initial_delay):
+            return
+        while True:
+            self.run_now()
+            if self._sleep(self.interval):
+                return
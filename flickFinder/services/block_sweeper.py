@@ -0,0 +1,54 @@
+import logging
+from collections import defaultdict
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from ..models import UserMovieState
+from .background import PeriodicTask
+from .exclusions import release_blocks
+
+logger = logging.getLogger(__name__)
+
+SWEEP_BATCH_SIZE = 500
+
+
+def release_expired_blocks(now=None):
+    """
+    Releases every block whose expiry has passed, oldest first, in batches.
+
+    A released block stays in the user's state (and the event log) but loses its expires_at, which
+    takes it out of the expiry index, and is dropped from the user's exclusion set so the
+    movie can be recommended again.
+
+    Returns:
+        int: Number of blocks released.
+    """
+    now = now or timezone.now()
+    released = 0
+    while True:
+        with transaction.atomic():
+            expired = list(UserMovieState.objects
+                           .filter(expires_at__lte=now) # only blocks carry an expiry
+                           .order_by('expires_at')
+                           .values_list('id', 'user_id', 'movie__tmdb_id')[:SWEEP_BATCH_SIZE])
+            if not expired:
+                break
+            UserMovieState.objects.filter(id__in=[row[0] for row in expired]).update(expires_at=None)
+
+        by_user = defaultdict(list)
+        for _, user_id, tmdb_id in expired:
+            by_user[user_id].append(tmdb_id)
+        for user_id, tmdb_ids in by_user.items():
+            release_blocks(user_id, tmdb_ids)
+        released += len(expired)
+        if len(expired) < SWEEP_BATCH_SIZE:
+            break
+
+    if released:
+        logger.info(f"Released {released} expired blocks.")
+    return released
+
+
+# Started lazily from the recommendation path, like the genre refresher
+block_sweeper = PeriodicTask('block-sweeper', release_expired_blocks,
+                             getattr(settings, 'BLOCK_SWEEP_INTERVAL', 60 * 5), initial_delay=5)
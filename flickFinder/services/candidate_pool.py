@@ -0,0 +1,214 @@
+import logging
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F, Q
+from django.utils import timezone
+from ..models import CandidatePool, Movie
+from .background import PeriodicTask
+from .id_queue import PackedIdQueue
+from .local_catalog import discover_service
+from .page_fetch import fetch_pages
+from .page_sampler import signature_hash
+
+logger = logging.getLogger(__name__)
+
+MAX_PAGE = 500
+LEASE_SECONDS = 60 * 10 # a pool refresh that takes longer than this is assumed dead
+
+
+def filter_snapshot(user_filters):
+    """The parts of a UserFilter that shape discover params, as JSON (None for popular)"""
+    if user_filters is None:
+        return None
+    return {
+        'genre_ids': sorted({str(gid) for gid in (user_filters.genre_ids or []) if gid}),
+        'min_release_year': user_filters.min_release_year,
+        'max_release_year': user_filters.max_release_year,
+        'min_rating': user_filters.min_rating,
+    }
+
+
+def pool_movies(movie_ids):
+    """Discover-shaped dicts (id, genre_ids, release_date, vote_average) for pooled ids, from Movie rows"""
+    rows = Movie.objects.filter(tmdb_id__in=movie_ids).values('tmdb_id', 'genres', 'release_date', 'vote_average')
+    return [{'id': row['tmdb_id'],
+             'genre_ids': [g.get('id') for g in (row['genres'] or []) if isinstance(g, dict)],
+             'release_date': row['release_date'],
+             'vote_average': row['vote_average']} for row in rows]
+
+
+class CandidatePoolStore:
+    """
+    Shared candidate pools, one per filter signature (see TMDBService.filter_signature).
+
+    A pool holds several hundred discover results for its filters, stored as Movie rows
+    with their details pre-fetched, so users with equal filters sample from the same set
+    instead of each paying for their own TMDB pages. Pools are built in the background
+    the first time a signature is asked for, and re-sampled from fresh pages every
+    `refresh_interval` while they keep being used.
+
+    The popular pool (no filters) is the cold-start path for every new user, so it is
+    pre-warmed rather than built on first use, never idled out, and has details for all of
+    its movies fetched before a refresh is published. Once it's warm, serving users without
+    filters needs no TMDB calls at all.
+    """
+
+    def __init__(self, tmdb_service, fetch_pages, pages=None, refresh_interval=None, idle_ttl=None, hydrate=None):
+        """
+        Args:
+            tmdb_service (TMDBService): Used for discover pages and movie details.
+            fetch_pages (callable): Takes (fetch_page, pages, potential_movies), fetches the
+                                    pages concurrently into potential_movies, returns total_pages.
+        """
+        self.tmdb_service = tmdb_service
+        self.fetch_pages = fetch_pages
+        self.pages = pages or getattr(settings, 'CANDIDATE_POOL_PAGES', 25)
+        self.refresh_interval = refresh_interval or getattr(settings, 'CANDIDATE_POOL_REFRESH_INTERVAL', 60 * 30)
+        self.idle_ttl = idle_ttl or getattr(settings, 'CANDIDATE_POOL_IDLE_TTL', 60 * 60 * 24)
+        self.hydrate = hydrate if hydrate is not None else getattr(settings, 'CANDIDATE_POOL_HYDRATE', 100)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='candidate-pool')
+        self._lock = threading.Lock()
+        self._scheduled = set()
+        # First run soon after a worker starts, so the popular pool is warmed before it's needed
+        self._refresher = PeriodicTask('candidate-pools', self.refresh_due, self.refresh_interval, initial_delay=5)
+
+    @property
+    def popular_key(self):
+        return signature_hash(self.tmdb_service.filter_signature(None))
+
+    def start(self):
+        """
+        Starts the periodic refresher (which also warms the popular pool) in this process.
+
+        Called from FlickfinderConfig.ready() so web workers start refreshing at boot,
+        and again on each lookup in case the app was loaded some other way.
+        """
+        self._refresher.start()
+
+    def candidates(self, signature, user_filters=None):
+        """
+        Pooled TMDB ids for a signature, or None while the pool is still being built.
+
+        Marks the pool as used and queues a background refresh when it's missing or stale.
+        """
+        self.start()
+        key = signature_hash(signature)
+        now = timezone.now()
+        pool = CandidatePool.objects.filter(signature_hash=key).first()
+        if pool is None:
+            CandidatePool.objects.get_or_create(signature_hash=key, defaults={
+                'signature': signature, 'filters': filter_snapshot(user_filters), 'last_used_at': now})
+            self.schedule_refresh(key)
+            return None
+
+        if pool.last_used_at < now - timezone.timedelta(minutes=5):
+            CandidatePool.objects.filter(pk=pool.pk).update(last_used_at=now) # throttled, it's only for idling out
+        if pool.refreshed_at is None or pool.refreshed_at < now - timezone.timedelta(seconds=self.refresh_interval):
+            self.schedule_refresh(key)
+        movie_ids = list(PackedIdQueue(pool, 'movie'))
+        return movie_ids or None
+
+    def schedule_refresh(self, key):
+        """Queues a pool refresh on the pool thread unless one is already pending in this process"""
+        with self._lock:
+            if key in self._scheduled:
+                return
+            self._scheduled.add(key)
+        self.executor.submit(self._run_refresh, key)
+
+    def _run_refresh(self, key):
+        try:
+            self.refresh(key)
+        except Exception as e:
+            logger.exception(f"Candidate pool refresh failed for {key[:12]}: {e}")
+        finally:
+            with self._lock:
+                self._scheduled.discard(key)
+            close_old_connections()
+
+    def _claim(self, key):
+        """Takes the refresh lease so only one worker refreshes a pool at a time"""
+        now = timezone.now()
+        return CandidatePool.objects.filter(signature_hash=key).filter(
+            Q(lease_until__isnull=True) | Q(lease_until__lt=now)
+        ).update(lease_until=now + timezone.timedelta(seconds=LEASE_SECONDS)) == 1
+
+    def refresh(self, key):
+        """Re-samples a pool from fresh discover pages and pre-fetches details for its movies"""
+        if not self._claim(key):
+            return
+        try:
+            pool = CandidatePool.objects.get(signature_hash=key)
+            if pool.filters is None:
+                fetch_page = lambda page: self.tmdb_service.get_popular_movies(page=page)
+            else:
+                filters = SimpleNamespace(**pool.filters)
+                fetch_page = lambda page: self.tmdb_service.discover_movies(filters, page=page)
+
+            movies = {}
+            total_pages = pool.total_pages
+            if not total_pages:
+                total_pages = self.fetch_pages(fetch_page, [1], movies)
+            max_page = min(total_pages or 0, MAX_PAGE)
+            if max_page:
+                pages = random.sample(range(1, max_page + 1), min(self.pages, max_page))
+                total_pages = max(total_pages, self.fetch_pages(fetch_page, pages, movies))
+            if not movies:
+                logger.warning(f"Candidate pool '{pool.signature}' came back empty, keeping the old one.")
+                return
+
+            self.tmdb_service.upsert_movies(list(movies.values()))
+            # Details first, so nothing served from the new pool has to fetch them on a request
+            self._hydrate(list(movies), None if key == self.popular_key else self.hydrate)
+            queue = PackedIdQueue(pool, 'movie')
+            queue.clear()
+            queue.extend(movies)
+            pool.total_pages = total_pages
+            pool.refreshed_at = timezone.now()
+            pool.save(update_fields=queue.dirty + ['total_pages', 'refreshed_at'])
+            logger.info(f"Candidate pool '{pool.signature}' refreshed with {len(movies)} movies.")
+        finally:
+            CandidatePool.objects.filter(signature_hash=key).update(lease_until=None)
+
+    def _hydrate(self, movie_ids, limit):
+        """
+        Pre-fetches details for up to limit (None for all) pooled movies that don't have them
+        stored yet, or whose stored details go stale before the next refresh, missing ones first.
+
+        Stale details are revalidated (usually a bodyless 304), so a request never has to.
+        """
+        max_age = max(0, self.tmdb_service.details_ttl - self.refresh_interval)
+        stale_before = timezone.now() - timezone.timedelta(seconds=max_age)
+        due = list(Movie.objects.filter(tmdb_id__in=movie_ids).filter(
+            Q(details__isnull=True) | Q(details_fetched_at__isnull=True) | Q(details_fetched_at__lt=stale_before)
+        ).order_by(F('details_fetched_at').asc(nulls_first=True)).values_list('tmdb_id', flat=True)[:limit])
+        for movie_id in due:
+            try:
+                self.tmdb_service.get_movie_details(movie_id, max_age=max_age)
+            except Exception as e:
+                logger.warning(f"Could not pre-fetch details for pooled movie {movie_id}: {e}")
+
+    def warm(self):
+        """Makes sure the popular pool exists, so the first user without filters finds it built"""
+        CandidatePool.objects.get_or_create(signature_hash=self.popular_key, defaults={
+            'signature': self.tmdb_service.filter_signature(None), 'filters': None, 'last_used_at': timezone.now()})
+
+    def refresh_due(self):
+        """Warms the popular pool, refreshes stale pools still in use and drops idle ones, run periodically"""
+        now = timezone.now()
+        self.warm()
+        CandidatePool.objects.filter(last_used_at__lt=now - timezone.timedelta(seconds=self.idle_ttl)).exclude(
+            signature_hash=self.popular_key).delete() # the popular pool stays warm even when nobody's around
+        stale = CandidatePool.objects.filter(
+            Q(refreshed_at__isnull=True) | Q(refreshed_at__lt=now - timezone.timedelta(seconds=self.refresh_interval))
+        ).values_list('signature_hash', flat=True)
+        for key in stale:
+            self.refresh(key)
+
+
+# Candidates shared by users with equal filters, built and refreshed in the background
+candidate_pools = CandidatePoolStore(discover_service(), fetch_pages)
@@ -0,0 +1,154 @@
+import copy
+import logging
+import time
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+from ..models import InteractionEvent, UserExclusionSet, UserMovieState
+
+logger = logging.getLogger(__name__)
+
+EMPTY = np.zeros(0, dtype='<u4')
+
+
+def _unpack(data):
+    return np.frombuffer(bytes(data), dtype='<u4') if data else EMPTY
+
+
+class ExclusionSet:
+    """
+    TMDB ids a user shouldn't be recommended: a sorted array of ids with permanent
+    interactions (heart, watchlist, skip, ...) plus blocked ids with their expiry times.
+
+    Supports `movie_id in exclusions` and a vectorized filter() over a whole batch.
+    """
+
+    def __init__(self, excluded, blocked, blocked_until, now=None):
+        self.excluded = excluded
+        now = time.time() if now is None else now
+        self.blocked = np.sort(blocked[blocked_until > now]) # only blocks still active
+
+    def __contains__(self, movie_id):
+        for ids in (self.excluded, self.blocked):
+            index = np.searchsorted(ids, movie_id)
+            if index < len(ids) and ids[index] == movie_id:
+                return True
+        return False
+
+    def __len__(self):
+        return len(self.excluded) + len(self.blocked)
+
+    def union(self, movie_ids):
+        """A copy with movie_ids excluded too (e.g. swipes not written to the database yet)"""
+        if not movie_ids:
+            return self
+        merged = copy.copy(self)
+        merged.excluded = np.union1d(self.excluded, np.fromiter(movie_ids, dtype='<u4')).astype('<u4')
+        return merged
+
+    def filter(self, movie_ids):
+        """Returns movie_ids minus the excluded ones, order kept"""
+        if not movie_ids:
+            return []
+        candidates = np.asarray(movie_ids, dtype=np.int64)
+        keep = ~(np.isin(candidates, self.excluded) | np.isin(candidates, self.blocked))
+        return candidates[keep].tolist()
+
+
+def _rebuild(user_id):
+    """Builds a user's exclusion row from their interaction states (only when it's missing)"""
+    now = time.time()
+    excluded = set()
+    blocks = {}
+    # Read and write in one transaction so no record_exclusion() can slip in between
+    with transaction.atomic():
+        rows = UserMovieState.objects.filter(user_id=user_id).values_list(
+            'movie__tmdb_id', 'heart_at', 'watchlist_at', 'skip_at', 'expires_at')
+        for tmdb_id, heart_at, watchlist_at, skip_at, expires_at in rows.iterator():
+            if heart_at or watchlist_at or skip_at:
+                excluded.add(tmdb_id)
+            # Released blocks have no expiry any more
+            if expires_at and expires_at.timestamp() > now:
+                blocks[tmdb_id] = expires_at.timestamp()
+        blocked = np.array(list(blocks.keys()), dtype='<u4')
+        blocked_until = np.array(list(blocks.values()), dtype='<u4')
+        exclusion_set, _ = UserExclusionSet.objects.update_or_create(user_id=user_id, defaults={
+            'excluded_data': np.array(sorted(excluded), dtype='<u4').tobytes(),
+            'blocked_data': blocked.tobytes(),
+            'blocked_until_data': blocked_until.tobytes(),
+        })
+    logger.info(f"Built exclusion set for user {user_id}: {len(excluded)} excluded, {len(blocks)} blocked.")
+    return exclusion_set
+
+
+def load_exclusions(user_id):
+    """
+    The user's current exclusions, one primary key lookup instead of a history scan.
+
+    Returns:
+        ExclusionSet
+    """
+    row = UserExclusionSet.objects.filter(user_id=user_id).first() or _rebuild(user_id)
+    return ExclusionSet(_unpack(row.excluded_data), _unpack(row.blocked_data), _unpack(row.blocked_until_data))
+
+
+def record_exclusion(user_id, tmdb_id, interaction_type, expires_at=None):
+    """
+    Adds one interaction to the user's exclusion row, called on every interaction write.
+
+    Blocks are stored with their expiry (the interaction's expires_at) until the block
+    sweeper releases them; every other type excludes the movie permanently. Users without
+    a row yet are skipped, their row is built from history (including this write) on first load.
+    """
+    record_exclusions(user_id, [(tmdb_id, interaction_type, expires_at)])
+
+
+def record_exclusions(user_id, interactions):
+    """
+    record_exclusion for several interactions at once, one row update in total.
+
+    Args:
+        interactions (list): (tmdb_id, interaction_type, expires_at) tuples, in write order.
+    """
+    now = time.time()
+    # Part of the caller's transaction when there is one, so an interaction and its exclusion commit together
+    with transaction.atomic(savepoint=False):
+        row = UserExclusionSet.objects.select_for_update().filter(user_id=user_id).first()
+        if row is None:
+            return
+        blocked, blocked_until = _unpack(row.blocked_data), _unpack(row.blocked_until_data)
+        active = blocked_until > now
+        blocked, blocked_until = blocked[active], blocked_until[active] # prune expired blocks while here
+        excluded = _unpack(row.excluded_data)
+        update_fields = ['blocked_data', 'blocked_until_data', 'updated_at']
+
+        for tmdb_id, interaction_type, expires_at in interactions:
+            if interaction_type == 'block':
+                until = (expires_at or timezone.now() + InteractionEvent.BLOCK_DURATION).timestamp()
+                keep = blocked != tmdb_id
+                blocked = np.append(blocked[keep], np.uint32(tmdb_id)).astype('<u4')
+                blocked_until = np.append(blocked_until[keep], np.uint32(until)).astype('<u4')
+            else:
+                index = np.searchsorted(excluded, tmdb_id)
+                if index == len(excluded) or excluded[index] != tmdb_id:
+                    excluded = np.insert(excluded, index, tmdb_id).astype('<u4')
+                    if 'excluded_data' not in update_fields:
+                        update_fields.append('excluded_data')
+
+        row.excluded_data = excluded.tobytes()
+        row.blocked_data = blocked.tobytes()
+        row.blocked_until_data = blocked_until.tobytes()
+        row.save(update_fields=update_fields)
+
+
+def release_blocks(user_id, tmdb_ids):
+    """Drops released blocks from the user's exclusion row, called by the block sweeper"""
+    with transaction.atomic():
+        row = UserExclusionSet.objects.select_for_update().filter(user_id=user_id).first()
+        if row is None:
+            return
+        blocked, blocked_until = _unpack(row.blocked_data), _unpack(row.blocked_until_data)
+        keep = ~np.isin(blocked, np.asarray(list(tmdb_ids), dtype='<u4'))
+        row.blocked_data = blocked[keep].tobytes()
+        row.blocked_until_data = blocked_until[keep].tobytes()
+        row.save(update_fields=['blocked_data', 'blocked_until_data', 'updated_at'])
@@ -0,0 +1,116 @@
+import logging
+import threading
+import time
+from django.conf import settings
+from ..models import Genre
+from .background import PeriodicTask
+
+logger = logging.getLogger(__name__)
+
+
+class GenreRegistry:
+    """
+    Process-wide TMDB genre lookup.
+
+    Loaded once per process from the Genre table, then refreshed from TMDB on a background
+    thread every GENRE_REFRESH_INTERVAL seconds. While the table is still empty (a fresh
+    install, or TMDB unreachable so far) lookups serve no genres and a background seeder
+    retries TMDB every GENRE_SEED_RETRY_INTERVAL seconds until it gets them, so a lookup
+    only ever reads the database, at most once per retry interval.
+    """
+
+    def __init__(self, refresh_interval=None, retry_interval=None):
+        self.refresh_interval = refresh_interval or getattr(settings, 'GENRE_REFRESH_INTERVAL', 60 * 60 * 24)
+        self.retry_interval = retry_interval or getattr(settings, 'GENRE_SEED_RETRY_INTERVAL', 60)
+        self._lock = threading.Lock()
+        self._names = None # genre id -> name
+        self._retry_at = 0.0 # monotonic time the empty table is looked at again
+        self._refresher = PeriodicTask('genre-refresh', self.refresh, self.refresh_interval)
+        self._seeder = PeriodicTask('genre-seed', self._seed, self.retry_interval, initial_delay=0)
+
+    @property
+    def names(self):
+        """Genre id -> name, loaded on first use (empty until the Genre table has been seeded)"""
+        names = self._names
+        if names is None:
+            with self._lock:
+                names = self._names
+                if names is None and time.monotonic() >= self._retry_at:
+                    names = dict(Genre.objects.values_list('id', 'name'))
+                    if names:
+                        self._names = names
+                    else:
+                        # Nothing stored yet, don't look again before the seeder has had a go
+                        self._retry_at = time.monotonic() + self.retry_interval
+                        self._seeder.start()
+            self._refresher.start()
+        return names or {}
+
+    def _seed(self):
+        """Fills an empty Genre table from TMDB, run by the seeder until it succeeds"""
+        if self._names is None:
+            logger.info("Genre table is empty, loading genres from TMDB.")
+            names = self._fetch_and_store() or dict(Genre.objects.values_list('id', 'name'))
+            if not names:
+                return # TMDB still unreachable, the seeder tries again later
+            self._names = names
+        self._seeder.stop()
+
+    def _fetch_and_store(self):
+        """Fetches the genre list from TMDB and upserts it, returning id -> name or None on failure"""
+        from .tmdb_service import TMDBService, TMDBServiceError
+
+        try:
+            data = TMDBService()._make_request("genre/movie/list", use_cache=False)
+        except TMDBServiceError as e:
+            logger.error(f"Could not refresh genres from TMDB: {e}")
+            return None
+        genres = [g for g in (data or {}).get('genres', []) if g.get('id') and g.get('name')]
+        if not genres:
+            return None
+        Genre.objects.bulk_create([Genre(id=g['id'], name=g['name']) for g in genres],
+                                  update_conflicts=True, unique_fields=['id'], update_fields=['name'])
+        return {g['id']: g['name'] for g in genres}
+
+    def refresh(self):
+        """Re-fetches genres from TMDB, falling back to whatever another worker stored"""
+        names = self._fetch_and_store() or dict(Genre.objects.values_list('id', 'name'))
+        if names:
+            self._names = names
+            logger.debug(f"Genre registry refreshed with {len(names)} genres.")
+        return self._names or {}
+
+    def choices(self):
+        """(str id, name) pairs sorted by name, for form widgets"""
+        return [(str(genre_id), name) for genre_id, name in sorted(self.names.items(), key=lambda item: item[1])]
+
+    def genre_list(self):
+        """Genres in the TMDB genre/movie/list shape, [{'id': 28, 'name': 'Action'}, ...]"""
+        return [{'id': genre_id, 'name': name} for genre_id, name in sorted(self.names.items(), key=lambda item: item[1])]
+
+    def name_for(self, genre_id, default=None):
+        """Name of one genre id (int or str)"""
+        try:
+            return self.names.get(int(genre_id), default)
+        except (TypeError, ValueError):
+            return default
+
+    def resolve(self, genre_ids):
+        """
+        Turns a discover payload's genre_ids into the genre dicts stored on Movie.genres.
+
+        Unknown ids are dropped, order is preserved.
+        """
+        names = self.names
+        resolved = []
+        for genre_id in genre_ids or []:
+            try:
+                genre_id = int(genre_id)
+            except (TypeError, ValueError):
+                continue
+            if genre_id in names:
+                resolved.append({'id': genre_id, 'name': names[genre_id]})
+        return resolved
+
+
+genre_registry = GenreRegistry()
@@ -0,0 +1,121 @@
+import logging
+import os
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from ..models import TMDBCacheCounter
+from .response_cache import add_counters
+
+logger = logging.getLogger(__name__)
+
+# Shared counters (in TMDBCacheCounter) the per-host pool counts are folded into
+POOL_COUNTERS = {'connections_opened': 'http_connections_opened', 'requests': 'http_requests'}
+COUNTER_FLUSH_INTERVAL = 30 # seconds
+
+
+class TMDBHttpClient:
+    """
+    One keep-alive requests.Session per process with a sized connection pool.
+
+    Every TMDBService shares it, so TLS handshakes happen once per pooled connection
+    instead of once per service instance. Retries are handled by TMDBService, so the
+    adapter itself never retries.
+    """
+
+    def __init__(self, pool_size=None, connect_timeout=None, read_timeout=None):
+        self.pool_size = pool_size or getattr(settings, 'TMDB_HTTP_POOL_SIZE', 10)
+        self.connect_timeout = connect_timeout or getattr(settings, 'TMDB_CONNECT_TIMEOUT', 3.05)
+        self.read_timeout = read_timeout or getattr(settings, 'TMDB_READ_TIMEOUT', 10)
+
+        self.session = requests.Session()
+        self.adapter = HTTPAdapter(pool_connections=2, pool_maxsize=self.pool_size, max_retries=0)
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter) # local stand-in servers
+        self.session.headers.update({'Accept': 'application/json', 'Connection': 'keep-alive'})
+
+        self._flush_lock = threading.Lock()
+        self._flushed = {} # host -> pool counts already added to the shared counters
+        self._last_flush = time.monotonic()
+
+    @property
+    def timeout(self):
+        """(connect, read) tuple for requests"""
+        return (self.connect_timeout, self.read_timeout)
+
+    def stats(self):
+        """
+        Connection pool statistics for this process.
+
+        Returns:
+            list: One dict per host pool with connections opened, requests sent, idle
+                  connections and the pool size. requests - connections is the number of
+                  requests that reused a kept-alive connection.
+        """
+        stats = []
+        for key in list(self.adapter.poolmanager.pools.keys()):
+            pool = self.adapter.poolmanager.pools.get(key)
+            if pool is None:
+                continue
+            stats.append({
+                'host': f"{pool.scheme}://{pool.host}:{pool.port}",
+                'connections_opened': pool.num_connections,
+                'requests': pool.num_requests,
+                # the queue is pre-filled with None placeholders, only real connections are idle sockets
+                'idle': sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool is not None else 0,
+                'maxsize': self.pool_size,
+            })
+        return stats
+
+    def flush_counters(self, force=False):
+        """
+        Adds connections opened and requests sent since the last flush into the shared
+        TMDBCacheCounter rows, at most every COUNTER_FLUSH_INTERVAL unless forced.
+
+        The pools only exist in this process, this is how `manage.py tmdb_cache` sees them.
+        """
+        with self._flush_lock:
+            if not force and time.monotonic() - self._last_flush < COUNTER_FLUSH_INTERVAL:
+                return
+            self._last_flush = time.monotonic()
+            amounts = dict.fromkeys(POOL_COUNTERS.values(), 0)
+            for pool in self.stats():
+                flushed = self._flushed.get(pool['host'], {})
+                for field, name in POOL_COUNTERS.items():
+                    # A host whose pool was dropped and recreated starts counting from 0 again
+                    previous = flushed.get(field, 0)
+                    amounts[name] += pool[field] - previous if pool[field] >= previous else pool[field]
+                self._flushed[pool['host']] = {field: pool[field] for field in POOL_COUNTERS}
+        add_counters(amounts)
+
+
+def pool_stats():
+    """
+    Connection pool counts summed across workers, as last flushed by each.
+
+    Returns:
+        dict: http_connections_opened, http_requests, http_reused (requests sent on a
+              kept-alive connection) and http_reuse_rate.
+    """
+    totals = dict.fromkeys(POOL_COUNTERS.values(), 0)
+    totals.update(TMDBCacheCounter.objects.filter(name__in=POOL_COUNTERS.values()).values_list('name', 'value'))
+    totals['http_reused'] = max(0, totals['http_requests'] - totals['http_connections_opened'])
+    totals['http_reuse_rate'] = round(totals['http_reused'] / totals['http_requests'], 4) if totals['http_requests'] else 0.0
+    return totals
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+def get_http_client():
+    """The process-wide TMDBHttpClient, rebuilt after a fork so workers never share sockets"""
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        with _client_lock:
+            if _client is None or _client_pid != os.getpid():
+                _client = TMDBHttpClient()
+                _client_pid = os.getpid()
+                logger.debug(f"Created TMDB HTTP client (pool size {_client.pool_size}) for process {_client_pid}")
+    return _client
@@ -0,0 +1,105 @@
+import sys
+from array import array
+
+ID_SIZE = 4 # bytes per packed id, TMDB ids fit in a uint32
+
+
+def pack_ids(ids):
+    """Packs TMDB ids into little-endian uint32 bytes"""
+    packed = array('I', ids)
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def unpack_ids(data, start=0, stop=None):
+    """Unpacks ids start..stop (by position) from pack_ids bytes"""
+    packed = array('I')
+    packed.frombytes(bytes(data[start * ID_SIZE: None if stop is None else stop * ID_SIZE]))
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return packed.tolist()
+
+
+class PackedIdQueue:
+    """
+    FIFO of TMDB ids kept on a model as a packed BinaryField `<name>_data` plus an integer
+    `<name>_head` marking the first unconsumed id.
+
+    Popping only moves the head, so the ids aren't re-encoded in Python and the UPDATE only
+    names the head column; appending writes the tail and drops the consumed prefix at the
+    same time. Save with `update_fields=queue.dirty`. The blob still travels with the row
+    though: loading the instance to pop reads it, and SQLite rewrites the whole row
+    (blob included) on any UPDATE, so a pop's storage cost still grows with the queue.
+    """
+
+    def __init__(self, instance, name):
+        self.instance = instance
+        self.data_field = f'{name}_data'
+        self.head_field = f'{name}_head'
+        self.dirty = []
+
+    @property
+    def _data(self):
+        return getattr(self.instance, self.data_field) or b''
+
+    @property
+    def _head(self):
+        return getattr(self.instance, self.head_field)
+
+    def _mark(self, *fields):
+        self.dirty = sorted(set(self.dirty) | set(fields))
+
+    def __len__(self):
+        return max(0, len(self._data) // ID_SIZE - self._head)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __iter__(self):
+        return iter(unpack_ids(self._data, self._head))
+
+    def __contains__(self, movie_id):
+        return movie_id in set(self)
+
+    def pop_front(self):
+        """Removes and returns the first id, or None if empty"""
+        head = self._head
+        if not len(self):
+            return None
+        movie_id = unpack_ids(self._data, head, head + 1)[0]
+        setattr(self.instance, self.head_field, head + 1)
+        self._mark(self.head_field)
+        return movie_id
+
+    def take(self, count):
+        """Removes and returns up to count ids from the front"""
+        head = self._head
+        taken = unpack_ids(self._data, head, head + count)
+        if taken:
+            setattr(self.instance, self.head_field, head + len(taken))
+            self._mark(self.head_field)
+        return taken
+
+    def extend(self, ids):
+        """Appends ids to the back, compacting away consumed ids"""
+        ids = list(ids)
+        if not ids and not self._head:
+            return
+        setattr(self.instance, self.data_field, bytes(self._data[self._head * ID_SIZE:]) + pack_ids(ids))
+        setattr(self.instance, self.head_field, 0)
+        self._mark(self.data_field, self.head_field)
+
+    def remove(self, movie_id):
+        """Removes every occurrence of movie_id, True if there was one"""
+        ids = list(self)
+        if movie_id not in ids:
+            return False
+        self.clear()
+        self.extend(i for i in ids if i != movie_id)
+        return True
+
+    def clear(self):
+        setattr(self.instance, self.data_field, b'')
+        setattr(self.instance, self.head_field, 0)
+        self._mark(self.data_field, self.head_field)
@@ -0,0 +1,109 @@
+import logging
+from django.db import connection, transaction
+from django.db.models import Count, Max, Min
+from django.utils import timezone
+from ..models import InteractionEvent, UserMovieState
+from .interaction_stats import reconcile_stats
+
+logger = logging.getLogger(__name__)
+
+COMPACT_BATCH_SIZE = 500
+COMPACT_ID_RANGE = 10000 # event ids per compaction DELETE
+
+
+def period_of(when):
+    """Time partition of an event, year * 100 + month (e.g. 202610)"""
+    return when.year * 100 + when.month
+
+
+def fold_events(events, states=None):
+    """
+    Folds events into UserMovieState instances, in event order.
+
+    Only the last event of each type matters for the result (an 'unwatch' clears heart and
+    watchlist, so those depend on whichever of the two came last), which is what lets
+    compaction drop every earlier one.
+
+    Args:
+        events (iterable): InteractionEvent-like objects with user_id, movie_id,
+                           interaction_type, timestamp and expires_at, oldest first.
+        states (dict): Existing states by (user_id, movie_id), updated in place.
+
+    Returns:
+        dict: States by (user_id, movie_id), new ones not saved yet.
+    """
+    states = {} if states is None else states
+    for event in events:
+        key = (event.user_id, event.movie_id)
+        if key not in states:
+            states[key] = UserMovieState(user_id=event.user_id, movie_id=event.movie_id)
+        states[key].apply(event.interaction_type, event.timestamp, event.expires_at)
+    return states
+
+
+def rebuild_states(user_ids=None, now=None):
+    """
+    Rebuilds UserMovieState from the event log, for repairs and after changing the fold.
+
+    Blocks whose expiry has passed come back released (no expiry), like the sweeper leaves them.
+    The users' stats are reconciled with the rebuilt states afterwards.
+
+    Args:
+        user_ids (list): Users to rebuild, every user with events if None.
+
+    Returns:
+        int: Number of states written.
+    """
+    now = now or timezone.now()
+    if user_ids is None:
+        user_ids = list(InteractionEvent.objects.values_list('user_id', flat=True).distinct())
+    written = 0
+    for user_id in user_ids:
+        with transaction.atomic():
+            events = InteractionEvent.objects.filter(user_id=user_id).order_by('id')
+            states = fold_events(events.only('user_id', 'movie_id', 'interaction_type', 'timestamp', 'expires_at').iterator())
+            for state in states.values():
+                if state.expires_at and state.expires_at <= now:
+                    state.expires_at = None
+            UserMovieState.objects.filter(user_id=user_id).delete()
+            UserMovieState.objects.bulk_create(states.values(), batch_size=COMPACT_BATCH_SIZE)
+        written += len(states)
+    reconcile_stats(user_ids)
+    logger.info(f"Rebuilt {written} interaction states for {len(user_ids)} users from the event log.")
+    return written
+
+
+def compact_events(before_period):
+    """
+    Folds every period before before_period down to the last event per (user, movie, type).
+
+    Earlier events of the same type can't change the folded state any more, so dropping
+    them keeps rebuild_states() giving the same result while old periods stop growing
+    with repeated swipes. An event is also dropped when a newer period has a later one
+    of the same type. Runs a period at a time, in batches, so writers are never held up for long.
+
+    Returns:
+        int: Number of events removed.
+    """
+    table = connection.ops.quote_name(InteractionEvent._meta.db_table)
+    periods = list(InteractionEvent.objects.filter(period__lt=before_period)
+                   .values_list('period', flat=True).distinct().order_by('period'))
+    removed = 0
+    for period in periods:
+        bounds = InteractionEvent.objects.filter(period=period).aggregate(low=Min('id'), high=Max('id'), count=Count('id'))
+        low = bounds['low']
+        while low is not None and low <= bounds['high']:
+            high = low + COMPACT_ID_RANGE
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(
+                    f"DELETE FROM {table} WHERE period = %s AND id >= %s AND id < %s AND EXISTS ("
+                    f"SELECT 1 FROM {table} later WHERE later.user_id = {table}.user_id "
+                    f"AND later.movie_id = {table}.movie_id AND later.interaction_type = {table}.interaction_type "
+                    f"AND later.id > {table}.id)",
+                    [period, low, high])
+                removed += cursor.rowcount
+            low = high
+        logger.info(f"Compacted interaction events of period {period} ({bounds['count']} events before).")
+    if removed:
+        logger.info(f"Compaction removed {removed} superseded interaction events.")
+    return removed
@@ -0,0 +1,108 @@
+import logging
+from collections import Counter
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+from ..models import UserInteractionStats, UserMovieState
+
+logger = logging.getLogger(__name__)
+
+# Counter for each interaction type in effect on a UserMovieState
+COUNT_FIELDS = {'heart': 'heart_count', 'watchlist': 'watchlist_count', 'skip': 'skip_count', 'block': 'block_count'}
+STAT_FIELDS = ['watchlist_count', 'heart_count', 'skip_count', 'block_count', 'total_interactions']
+
+
+def _counts(user_ids):
+    """Counters per user, aggregated from their interaction states"""
+    aggregates = {field: Count('id', filter=Q(**{f"{UserMovieState.TYPE_COLUMNS[t]}__isnull": False}))
+                  for t, field in COUNT_FIELDS.items()}
+    rows = UserMovieState.objects.filter(user_id__in=user_ids).values('user_id').annotate(**aggregates)
+    counts = {}
+    for row in rows:
+        # Every interaction in effect counts, so a hearted and watchlisted movie counts twice
+        row['total_interactions'] = sum(row[field] for field in COUNT_FIELDS.values())
+        counts[row.pop('user_id')] = row
+    return counts
+
+
+def _rebuild(user_id):
+    """Builds a user's stats row from their interaction states (only when it's missing)"""
+    # Read and write in one transaction so no record_stats() can slip in between
+    with transaction.atomic():
+        counts = _counts([user_id]).get(user_id, {})
+        stats, _ = UserInteractionStats.objects.update_or_create(user_id=user_id, defaults=counts)
+    logger.info(f"Built interaction stats for user {user_id}: {counts}")
+    return stats
+
+
+def load_stats(user_id):
+    """
+    The user's interaction counters, one primary key lookup.
+
+    Returns:
+        UserInteractionStats
+    """
+    return UserInteractionStats.objects.filter(user_id=user_id).first() or _rebuild(user_id)
+
+
+def state_changes(before, after):
+    """
+    Counter changes for one UserMovieState going from before to after.
+
+    Args:
+        before (set): Types in effect before, None if the state is new.
+        after (set): Types in effect after.
+
+    Returns:
+        Counter: Field -> change.
+    """
+    added, removed = after - (before or set()), (before or set()) - after
+    changes = Counter({COUNT_FIELDS[t]: 1 for t in added})
+    changes.subtract({COUNT_FIELDS[t]: 1 for t in removed})
+    changes['total_interactions'] += len(added) - len(removed)
+    return changes
+
+
+def record_stats(user_id, changes):
+    """
+    Applies counter changes to the user's stats row, called on every interaction write.
+
+    One UPDATE with F() expressions. Users without a row yet are skipped, their row is
+    built from their states (including this write) on first load.
+    """
+    changes = {field: change for field, change in changes.items() if change}
+    if not changes:
+        return
+    UserInteractionStats.objects.filter(user_id=user_id).update(
+        updated_at=timezone.now(), **{field: F(field) + change for field, change in changes.items()})
+
+
+def reconcile_stats(user_ids=None):
+    """
+    Rebuilds stats rows from the interaction states, for every user if user_ids is None.
+
+    Returns:
+        int: Number of rows that were missing or off and got rebuilt.
+    """
+    if user_ids is None:
+        user_ids = sorted(set(UserInteractionStats.objects.values_list('user_id', flat=True))
+                          | set(UserMovieState.objects.values_list('user_id', flat=True).distinct()))
+    corrected = 0
+    for start in range(0, len(user_ids), 500):
+        chunk = user_ids[start:start + 500]
+        with transaction.atomic():
+            counts = _counts(chunk)
+            current = {row['user_id']: row for row in UserInteractionStats.objects.select_for_update()
+                       .filter(user_id__in=chunk).values('user_id', *STAT_FIELDS)}
+            for user_id in chunk:
+                expected = {field: counts.get(user_id, {}).get(field, 0) for field in STAT_FIELDS}
+                found = current.get(user_id)
+                if found is not None and all(found[field] == expected[field] for field in STAT_FIELDS):
+                    continue
+                if found is not None:
+                    was = {field: found[field] for field in STAT_FIELDS}
+                    logger.warning(f"Interaction stats of user {user_id} were off, correcting: {was} -> {expected}")
+                UserInteractionStats.objects.update_or_create(user_id=user_id, defaults=expected)
+                corrected += 1
+    logger.info(f"Reconciled interaction stats for {len(user_ids)} users, {corrected} rebuilt.")
+    return corrected
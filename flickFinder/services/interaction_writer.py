@@ -0,0 +1,326 @@
+import fcntl
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter, defaultdict, namedtuple
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.db import connection, transaction
+from ..models import InteractionEvent, Movie, UserMovieState
+from .background import PeriodicTask
+from .exclusions import record_exclusions
+from .interaction_events import fold_events, period_of
+from .interaction_stats import record_stats, state_changes
+from .taste import update_taste
+
+logger = logging.getLogger(__name__)
+
+STALE_OPENING_SECONDS = 60 # a segment still not renamed into place after this was left by a crash
+
+# One swipe to write; movie_id is the Movie pk, tmdb_id is kept for the exclusion data
+PendingInteraction = namedtuple('PendingInteraction',
+                                'user_id movie_id tmdb_id interaction_type timestamp expires_at')
+STATE_FIELDS = ['heart_at', 'watchlist_at', 'skip_at', 'block_at', 'expires_at', 'updated_at']
+TASTE_TYPES = {'heart', 'watchlist'} # the types that shape a user's taste vector
+
+
+def write_interactions(interactions):
+    """
+    Writes interactions in one transaction: their events are appended to the log in one
+    bulk insert and folded into the user/movie states, then one exclusion row and one
+    stats row update per user and taste updates for hearts/watchlists that came into
+    (or went out of) effect.
+
+    Replaying the same interactions is harmless, they only append events with the same
+    outcome again.
+
+    Args:
+        interactions (list): PendingInteraction tuples in the order they happened; for a
+                             repeated (user, movie, type) the last one wins.
+
+    Returns:
+        int: Number of interactions that weren't in effect before.
+    """
+    latest = {}
+    for interaction in interactions:
+        latest[(interaction.user_id, interaction.movie_id, interaction.interaction_type)] = interaction
+    if not latest:
+        return 0
+    interactions = sorted(latest.values(), key=lambda i: i.timestamp)
+    pairs = {(i.user_id, i.movie_id) for i in interactions}
+
+    with transaction.atomic():
+        states = {(state.user_id, state.movie_id): state for state in UserMovieState.objects.select_for_update().filter(
+            user_id__in={user_id for user_id, _ in pairs}, movie_id__in={movie_id for _, movie_id in pairs})
+            if (state.user_id, state.movie_id) in pairs}
+        before = {key: state.active_types for key, state in states.items()}
+        created = sum(1 for i in interactions if i.interaction_type not in before.get((i.user_id, i.movie_id), ()))
+
+        InteractionEvent.objects.bulk_create([InteractionEvent(
+            user_id=i.user_id, movie_id=i.movie_id, interaction_type=i.interaction_type,
+            timestamp=i.timestamp, expires_at=i.expires_at, period=period_of(i.timestamp)) for i in interactions])
+        states = fold_events(interactions, states)
+        UserMovieState.objects.bulk_update([state for state in states.values() if state.pk], STATE_FIELDS)
+        UserMovieState.objects.bulk_create([state for state in states.values() if not state.pk])
+
+        by_user = defaultdict(list)
+        for i in interactions:
+            by_user[i.user_id].append((i.tmdb_id, i.interaction_type, i.expires_at))
+        for user_id, user_interactions in by_user.items():
+            record_exclusions(user_id, user_interactions)
+
+        changes = defaultdict(Counter)
+        for (user_id, movie_id), state in states.items():
+            changes[user_id].update(state_changes(before.get((user_id, movie_id)), state.active_types))
+        for user_id, user_changes in changes.items():
+            record_stats(user_id, user_changes)
+
+        tasted = {}
+        for key, state in states.items():
+            added = (state.active_types - before.get(key, set())) & TASTE_TYPES
+            removed = (before.get(key, set()) - state.active_types) & TASTE_TYPES
+            if added or removed:
+                tasted[key] = (added, removed)
+        if tasted:
+            movies = Movie.objects.in_bulk({movie_id for _, movie_id in tasted})
+            for (user_id, movie_id), (added, removed) in tasted.items():
+                update_taste(user_id, movies[movie_id], sorted(added))
+                update_taste(user_id, movies[movie_id], sorted(removed), sign=-1)
+    return created
+
+
+def record_interaction(user_id, tmdb_id, interaction_type, timestamp, expires_at=None):
+    """
+    Records one swipe in one transaction: its event, its state, the exclusion and stats rows and taste.
+
+    The event INSERT resolves the Movie by tmdb_id itself, and the state upsert only sets
+    the type's column when it isn't set yet, so a first-time swipe of a stored movie is two
+    statements. Only a repeat (the type is already in effect) needs an UPDATE for its
+    timestamp as well.
+
+    Returns:
+        bool: Whether the interaction wasn't in effect before, or None if no Movie with
+              tmdb_id is stored.
+    """
+    column = UserMovieState.TYPE_COLUMNS.get(interaction_type)
+    if column is None: # 'unwatch' clears columns rather than setting one
+        movie_id = Movie.objects.filter(tmdb_id=tmdb_id).values_list('id', flat=True).first()
+        if movie_id is None:
+            return None
+        return write_interactions([PendingInteraction(user_id, movie_id, tmdb_id, interaction_type, timestamp, expires_at)]) > 0
+
+    ops = connection.ops
+    events, states, movies = (ops.quote_name(model._meta.db_table) for model in (InteractionEvent, UserMovieState, Movie))
+    period = period_of(timestamp)
+    timestamp = ops.adapt_datetimefield_value(timestamp)
+    expiry = ops.adapt_datetimefield_value(expires_at)
+    set_expiry = ", expires_at = excluded.expires_at" if interaction_type == 'block' else '' # only blocks carry one
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {events} (user_id, movie_id, interaction_type, {ops.quote_name('timestamp')}, expires_at, period) "
+            f"SELECT %s, id, %s, %s, %s, %s FROM {movies} WHERE tmdb_id = %s RETURNING movie_id",
+            [user_id, interaction_type, timestamp, expiry, period, tmdb_id])
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        movie_id = row[0]
+        cursor.execute(
+            f"INSERT INTO {states} (user_id, movie_id, {column}, expires_at, updated_at) VALUES (%s, %s, %s, %s, %s) "
+            f"ON CONFLICT (user_id, movie_id) DO UPDATE SET {column} = excluded.{column}, "
+            f"updated_at = excluded.updated_at{set_expiry} WHERE {states}.{column} IS NULL "
+            f"RETURNING {', '.join(UserMovieState.TYPE_COLUMNS.values())}",
+            [user_id, movie_id, timestamp, expiry, timestamp])
+        row = cursor.fetchone()
+        created = row is not None
+        if not created:
+            cursor.execute(
+                f"UPDATE {states} SET {column} = %s, updated_at = %s{', expires_at = %s' if set_expiry else ''} "
+                f"WHERE user_id = %s AND movie_id = %s",
+                [timestamp, timestamp] + ([expiry] if set_expiry else []) + [user_id, movie_id])
+
+        record_exclusions(user_id, [(tmdb_id, interaction_type, expires_at)])
+        if created:
+            # Every existing state has some type in effect, so nothing else set means the state is new
+            others = {t for t, value in zip(UserMovieState.TYPE_COLUMNS, row) if value and t != interaction_type}
+            record_stats(user_id, state_changes(others or None, others | {interaction_type}))
+        if created and interaction_type in TASTE_TYPES:
+            update_taste(user_id, Movie.objects.get(pk=movie_id), [interaction_type])
+    return created
+
+
+def _encode(interaction):
+    return json.dumps({
+        'u': interaction.user_id, 'm': interaction.movie_id, 't': interaction.tmdb_id, 'i': interaction.interaction_type,
+        'ts': interaction.timestamp.timestamp(),
+        'x': interaction.expires_at.timestamp() if interaction.expires_at else None,
+    }, separators=(',', ':'))
+
+
+def _decode(line):
+    data = json.loads(line)
+    return PendingInteraction(
+        data['u'], data['m'], data['t'], data['i'],
+        datetime.fromtimestamp(data['ts'], dt_timezone.utc),
+        datetime.fromtimestamp(data['x'], dt_timezone.utc) if data['x'] else None)
+
+
+class InteractionLog:
+    """
+    Write-behind mode for swipes (INTERACTION_WRITE_BEHIND): interactions are appended to
+    a local log and written to the database in batches, instead of one write transaction
+    per swipe.
+
+    Each process appends to its own segment file (fsync'd before the swipe is
+    acknowledged) and holds an flock on it while it's open. Every `interval` the
+    flusher closes the segment and applies every segment nobody holds a lock on with
+    write_interactions(), then deletes it. That includes segments left behind by a
+    crashed worker, so a crash loses nothing: the next flush anywhere replays its log.
+
+    Until a swipe is flushed, its movie is kept in memory as a pending exclusion for
+    the user (see pending_exclusions), so this process never recommends it again.
+    """
+
+    def __init__(self, directory=None, interval=None):
+        self.directory = str(directory or getattr(settings, 'INTERACTION_LOG_DIR',
+                                                  os.path.join(settings.BASE_DIR, 'var', 'interaction_log')))
+        self.interval = interval or getattr(settings, 'INTERACTION_FLUSH_INTERVAL', 1.0)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._file = None
+        self._path = None
+        self._pid = None
+        self._sequence = 0
+        self._pending = {} # segment path -> {user_id: {tmdb ids}}
+        self.flusher = PeriodicTask('interaction-flush', self.flush, self.interval, initial_delay=0)
+
+    @property
+    def enabled(self):
+        return getattr(settings, 'INTERACTION_WRITE_BEHIND', False)
+
+    def _open_segment(self):
+        """
+        Starts a new segment file for this process and locks it.
+
+        The file is created and locked under a name flushes don't look at, and only then
+        renamed into place, so no flush can claim (and delete) it before it's locked.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        if self._pid != os.getpid():
+            self._pid, self._pending = os.getpid(), {} # forked, the parent's segment isn't ours
+        self._sequence += 1
+        name = f"{self._pid}-{self._sequence:08d}"
+        opening = os.path.join(self.directory, f"open-{name}.tmp")
+        self._file = open(opening, 'a', encoding='utf-8')
+        fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._path = os.path.join(self.directory, f"seg-{name}.jsonl")
+        os.rename(opening, self._path)
+        self._pending[self._path] = defaultdict(set)
+
+    def append(self, interactions):
+        """Durably logs interactions for a later flush and marks them as pending exclusions"""
+        self.flusher.start()
+        with self._lock:
+            if self._file is None or self._pid != os.getpid():
+                self._open_segment()
+            self._file.write(''.join(_encode(i) + '\n' for i in interactions))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            for i in interactions:
+                self._pending[self._path][i.user_id].add(i.tmdb_id)
+
+    def pending_exclusions(self, user_id):
+        """TMDB ids this process logged for the user that aren't in the database yet"""
+        with self._lock:
+            return set().union(*(users.get(user_id, ()) for users in self._pending.values()))
+
+    def _rotate(self):
+        """Closes the current segment (releasing its lock) so the flush can claim it"""
+        with self._lock:
+            if self._file is None or self._pid != os.getpid():
+                return
+            if self._file.tell() == 0:
+                return # nothing logged since the last flush, keep using it
+            self._file.close()
+            self._file = None
+
+    def _claim(self, path):
+        """Locks a segment no live process is writing, or returns None"""
+        try:
+            segment = open(path, 'r', encoding='utf-8')
+        except FileNotFoundError:
+            return None # another worker just applied it
+        try:
+            fcntl.flock(segment, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            segment.close()
+            return None # its writer is alive, or another worker is applying it
+        if os.fstat(segment.fileno()).st_nlink == 0:
+            segment.close()
+            return None # applied and deleted while we waited
+        return segment
+
+    def _forget_applied(self):
+        """Drops pending exclusions of closed segments that are gone, whoever applied them"""
+        with self._lock:
+            for path in list(self._pending):
+                if (path != self._path or self._file is None) and not os.path.exists(path):
+                    del self._pending[path]
+
+    def _remove_stale_openings(self):
+        """Removes segments a crashed worker created but never renamed into place (always empty)"""
+        for path in glob.glob(os.path.join(self.directory, 'open-*.tmp')):
+            try:
+                if time.time() - os.path.getmtime(path) < STALE_OPENING_SECONDS:
+                    continue
+            except FileNotFoundError:
+                continue
+            segment = self._claim(path)
+            if segment is not None:
+                os.remove(path)
+                segment.close()
+
+    def flush(self):
+        """
+        Applies every closed or orphaned segment to the database, oldest first.
+
+        Returns:
+            int: Number of interactions applied.
+        """
+        applied = 0
+        with self._flush_lock:
+            self._rotate()
+            for path in sorted(glob.glob(os.path.join(self.directory, 'seg-*.jsonl')), key=os.path.getmtime):
+                if path == self._path and self._file is not None:
+                    continue
+                segment = self._claim(path)
+                if segment is None:
+                    continue
+                try:
+                    interactions = []
+                    for line in segment:
+                        try:
+                            interactions.append(_decode(line))
+                        except (ValueError, KeyError):
+                            if line.strip():
+                                logger.warning(f"Skipping a torn line in {os.path.basename(path)}: {line[:80]!r}")
+                    write_interactions(interactions)
+                    os.remove(path)
+                    applied += len(interactions)
+                    if not path.startswith(os.path.join(self.directory, f"seg-{os.getpid()}-")):
+                        logger.warning(f"Replayed {len(interactions)} interactions from orphaned log {os.path.basename(path)}.")
+                except Exception as e:
+                    logger.exception(f"Failed to apply interaction log {os.path.basename(path)}, will retry: {e}")
+                    continue
+                finally:
+                    segment.close()
+            self._forget_applied()
+            self._remove_stale_openings()
+        if applied:
+            logger.info(f"Flushed {applied} logged interactions to the database.")
+        return applied
+
+
+interaction_writer = InteractionLog()
@@ -0,0 +1,238 @@
+import logging
+import os
+import threading
+import time
+import numpy as np
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+# Implicit feedback strength per interaction type; skips and blocks say nothing about similarity
+INTERACTION_WEIGHTS = {'heart': 1.0, 'watchlist': 0.8}
+RELOAD_CHECK_SECONDS = 60
+
+
+def similarity_dir():
+    return str(getattr(settings, 'ITEM_SIMILARITY_DIR', os.path.join(settings.BASE_DIR, 'var', 'item_similarity')))
+
+
+def load_interaction_arrays(chunk_size=100000):
+    """
+    Reads every positive interaction as parallel numpy arrays, straight from a cursor in
+    chunks so millions of rows never become model instances.
+
+    Returns:
+        tuple: (user ids, TMDB ids, weights) as int64, int64, float32 arrays.
+    """
+    from ..models import UserMovieState, Movie
+    # A movie both hearted and watchlisted counts with both weights, like before the state table
+    columns = {t: UserMovieState.TYPE_COLUMNS[t] for t in INTERACTION_WEIGHTS}
+    weight = ' + '.join(f"CASE WHEN s.{columns[t]} IS NOT NULL THEN {w} ELSE 0 END" for t, w in INTERACTION_WEIGHTS.items())
+    active = ' OR '.join(f"s.{column} IS NOT NULL" for column in columns.values())
+    sql = (f"SELECT s.user_id, m.tmdb_id, {weight} "
+           f"FROM {UserMovieState._meta.db_table} s JOIN {Movie._meta.db_table} m ON m.id = s.movie_id "
+           f"WHERE {active}")
+    chunks = []
+    with connection.cursor() as cursor:
+        cursor.execute(sql)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            chunks.append(np.array(rows, dtype=np.float64))
+    if not chunks:
+        return np.zeros(0, np.int64), np.zeros(0, np.int64), np.zeros(0, np.float32)
+    data = np.concatenate(chunks)
+    return data[:, 0].astype(np.int64), data[:, 1].astype(np.int64), data[:, 2].astype(np.float32)
+
+
+def build_similarity(user_ids, movie_ids, weights, top_k=50, min_users=2):
+    """
+    Item-item cosine similarity over a sparse user x movie matrix, keeping the top_k
+    neighbours of every movie.
+
+    Args:
+        min_users (int): Movies with fewer interacting users are left out, their
+                         similarities are mostly noise.
+
+    Returns:
+        tuple: (sorted TMDB ids, neighbour TMDB ids (n, top_k), scores (n, top_k)).
+               Unused neighbour slots hold id 0 and score 0.
+    """
+    from scipy import sparse
+
+    items, item_index = np.unique(movie_ids, return_inverse=True)
+    users, user_index = np.unique(user_ids, return_inverse=True)
+    matrix = sparse.csr_matrix((weights, (user_index, item_index)), shape=(len(users), len(items)))
+    matrix.sum_duplicates()
+
+    support = np.diff(matrix.tocsc().indptr)
+    keep = np.flatnonzero(support >= min_users)
+    matrix = matrix[:, keep].tocsc()
+    items = items[keep]
+
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+    norms[norms == 0] = 1.0
+    matrix = matrix @ sparse.diags(1.0 / norms)
+    similarity = (matrix.T @ matrix).tocsr()
+    similarity.setdiag(0)
+    similarity.eliminate_zeros()
+
+    neighbours = np.zeros((len(items), top_k), dtype='<u4')
+    scores = np.zeros((len(items), top_k), dtype='<f4')
+    for row in range(len(items)):
+        start, end = similarity.indptr[row], similarity.indptr[row + 1]
+        if start == end:
+            continue
+        row_scores = similarity.data[start:end]
+        row_items = similarity.indices[start:end]
+        if len(row_scores) > top_k:
+            best = np.argpartition(-row_scores, top_k)[:top_k]
+            row_scores, row_items = row_scores[best], row_items[best]
+        order = np.argsort(-row_scores)
+        neighbours[row, :len(order)] = items[row_items[order]]
+        scores[row, :len(order)] = row_scores[order]
+    return items.astype('<u4'), neighbours, scores
+
+
+def save_similarity(items, neighbours, scores, directory=None):
+    """
+    Writes a new index version as .npy files and atomically points `current` at it.
+
+    Returns:
+        str: The version directory written.
+    """
+    directory = directory or similarity_dir()
+    version = os.path.join(directory, f"v{int(time.time() * 1000)}")
+    os.makedirs(version)
+    np.save(os.path.join(version, 'items.npy'), items)
+    np.save(os.path.join(version, 'neighbours.npy'), neighbours)
+    np.save(os.path.join(version, 'scores.npy'), scores)
+
+    pointer = os.path.join(directory, 'current')
+    tmp_pointer = pointer + '.tmp'
+    with open(tmp_pointer, 'w') as f:
+        f.write(os.path.basename(version))
+    os.replace(tmp_pointer, pointer) # readers switch over in one step
+
+    # Keep the previous version for readers that still have it mapped
+    versions = sorted(name for name in os.listdir(directory) if name.startswith('v'))
+    for old in versions[:-2]:
+        old_dir = os.path.join(directory, old)
+        for name in os.listdir(old_dir):
+            os.remove(os.path.join(old_dir, name))
+        os.rmdir(old_dir)
+    return version
+
+
+class ItemSimilarityIndex:
+    """
+    Read side of the item-item index: memory-mapped top-k neighbour arrays, shared by
+    every worker through the page cache and picked up again when a rebuild lands.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._version = None
+        self._arrays = None
+        self._checked_at = 0.0
+
+    def _load(self):
+        """Maps the current version, re-checking the pointer at most once a minute"""
+        now = time.monotonic()
+        if self._arrays is not None and now - self._checked_at < RELOAD_CHECK_SECONDS:
+            return self._arrays
+        with self._lock:
+            self._checked_at = now
+            directory = self.directory or similarity_dir()
+            try:
+                with open(os.path.join(directory, 'current')) as f:
+                    version = f.read().strip()
+            except FileNotFoundError:
+                return None # not built yet
+            if version != self._version:
+                path = os.path.join(directory, version)
+                self._arrays = tuple(np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+                                     for name in ('items', 'neighbours', 'scores'))
+                self._version = version
+                logger.info(f"Loaded item similarity index {version} ({len(self._arrays[0])} movies).")
+        return self._arrays
+
+    def neighbours(self, movie_id, limit=None):
+        """
+        Returns:
+            list: (TMDB id, score) pairs, most similar first.
+        """
+        arrays = self._load()
+        if arrays is None:
+            return []
+        items, neighbours, scores = arrays
+        row = np.searchsorted(items, movie_id)
+        if row >= len(items) or items[row] != movie_id:
+            return []
+        found = scores[row] > 0
+        pairs = list(zip(neighbours[row][found].tolist(), scores[row][found].tolist()))
+        return pairs[:limit] if limit else pairs
+
+    def recommend(self, seed_ids, exclusions=None, limit=20):
+        """
+        Movies most similar to a set of seeds (e.g. a user's recent hearts), scores summed
+        over seeds.
+
+        Args:
+            exclusions (ExclusionSet): Ids to leave out, seeds are always left out.
+
+        Returns:
+            list: Up to limit TMDB ids, best first.
+        """
+        arrays = self._load()
+        if arrays is None or not seed_ids:
+            return []
+        items, neighbours, scores = arrays
+        seeds = np.asarray(sorted(set(seed_ids)), dtype=np.int64)
+        rows = np.searchsorted(items, seeds)
+        found = rows < len(items)
+        found[found] = items[rows[found]] == seeds[found] # seeds nobody else interacted with aren't indexed
+        rows = rows[found]
+        if not len(rows):
+            return []
+
+        candidate_ids = np.asarray(neighbours[rows]).ravel()
+        candidate_scores = np.asarray(scores[rows]).ravel()
+        used = candidate_scores > 0
+        unique_ids, inverse = np.unique(candidate_ids[used], return_inverse=True)
+        totals = np.bincount(inverse, weights=candidate_scores[used])
+
+        keep = ~np.isin(unique_ids, seeds)
+        if exclusions is not None:
+            keep &= np.isin(unique_ids, exclusions.filter(unique_ids.tolist()))
+        unique_ids, totals = unique_ids[keep], totals[keep]
+        best = np.argsort(-totals)[:limit]
+        return unique_ids[best].tolist()
+
+
+item_similarity = ItemSimilarityIndex()
+
+
+def matches_filters(movie, user_filters):
+    """
+    Whether a discover-shaped movie dict passes a UserFilter the way discover would
+    (genres AND-ed, year range, minimum rating). Used on neighbours, which come from
+    the index rather than a filtered discover query.
+    """
+    if user_filters is None:
+        return True
+    genre_ids = {int(gid) for gid in (user_filters.genre_ids or []) if str(gid).isdigit()}
+    if not genre_ids <= set(movie.get('genre_ids') or []):
+        return False
+    release_date = movie.get('release_date')
+    year = getattr(release_date, 'year', None) or (int(str(release_date)[:4]) if release_date else None)
+    if user_filters.min_release_year and (year is None or year < user_filters.min_release_year):
+        return False
+    if user_filters.max_release_year and (year is None or year > user_filters.max_release_year):
+        return False
+    if user_filters.min_rating and (movie.get('vote_average') or 0) < user_filters.min_rating:
+        return False
+    return True
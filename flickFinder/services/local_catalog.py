@@ -0,0 +1,136 @@
+import logging
+import math
+from datetime import date
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from ..models import Movie
+from .tmdb_service import TMDBService
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 20 # same as TMDB discover pages
+MAX_PAGE = 500
+MIN_VOTE_COUNT = 200 # matches the vote_count.gte used for remote discover
+
+
+def ingest_discover_page(service, results):
+    """
+    Upserts one page of discover results into the catalog, including genre links.
+
+    Args:
+        service (TMDBService): Used for its bulk upsert.
+        results (list): The 'results' of one discover/movie page.
+
+    Returns:
+        int: Number of movies written.
+    """
+    with transaction.atomic():
+        movies = service.upsert_movies(results, catalog_synced_at=timezone.now())
+        if not movies:
+            return 0
+        # bulk_create doesn't hand back ids for conflicting rows on sqlite, so look them up
+        id_by_tmdb = dict(Movie.objects.filter(tmdb_id__in=[m.tmdb_id for m in movies]).values_list('tmdb_id', 'id'))
+        GenreLink = Movie.genre_links.through
+        GenreLink.objects.filter(movie_id__in=id_by_tmdb.values()).delete()
+        GenreLink.objects.bulk_create([
+            GenreLink(movie_id=id_by_tmdb[m.tmdb_id], genre_id=genre['id'])
+            for m in movies for genre in m.genres or []
+        ], ignore_conflicts=True)
+    return len(movies)
+
+
+class LocalCatalogService(TMDBService):
+    """
+    TMDBService that answers discover_movies/get_popular_movies from the local Movie catalog.
+
+    Filters mirror the remote discover params (genres are AND-ed, year range on release_date,
+    minimum rating, vote_count >= 200; the catalog only holds English titles) and results keep
+    the TMDB discover shape, so callers can't tell the backends apart. Everything else (details, search, genres) still
+    goes to TMDB. Falls back to the remote API while the catalog is empty.
+    """
+
+    def _catalog_queryset(self, filters=None):
+        """Catalog movies matching a UserFilter (or None), most popular first"""
+        queryset = Movie.objects.filter(
+            catalog_synced_at__isnull=False, # only ever ingested with with_original_language=en
+            vote_count__gte=MIN_VOTE_COUNT,
+        )
+        if filters:
+            genre_ids_list = getattr(filters, 'genre_ids', None)
+            if isinstance(genre_ids_list, list):
+                for genre_id in {str(gid) for gid in genre_ids_list if gid}:
+                    if genre_id.isdigit():
+                        queryset = queryset.filter(genre_links=int(genre_id))
+
+            min_year = getattr(filters, 'min_release_year', None)
+            if min_year: queryset = queryset.filter(release_date__gte=date(min_year, 1, 1))
+
+            max_year = getattr(filters, 'max_release_year', None)
+            if max_year: queryset = queryset.filter(release_date__lte=date(max_year, 12, 31))
+
+            min_rating = getattr(filters, 'min_rating', None)
+            if min_rating: queryset = queryset.filter(vote_average__gte=min_rating)
+        return queryset.order_by('-popularity', '-vote_count', 'tmdb_id')
+
+    def _catalog_page(self, queryset, page):
+        """Slices one 20-movie page out of a catalog queryset, returning (results, total_pages)"""
+        total_pages = min(math.ceil(queryset.count() / PAGE_SIZE), MAX_PAGE)
+        if page < 1 or page > total_pages:
+            return [], total_pages
+
+        offset = (page - 1) * PAGE_SIZE
+        rows = queryset.values('id', 'tmdb_id', 'title', 'poster_path', 'overview', 'release_date',
+                               'vote_average', 'vote_count', 'popularity')[offset:offset + PAGE_SIZE]
+        rows = list(rows)
+        genre_ids = {}
+        for movie_id, genre_id in Movie.genre_links.through.objects.filter(
+                movie_id__in=[row['id'] for row in rows]).values_list('movie_id', 'genre_id'):
+            genre_ids.setdefault(movie_id, []).append(genre_id)
+
+        results = [{
+            'id': row['tmdb_id'],
+            'title': row['title'],
+            'poster_path': row['poster_path'],
+            'overview': row['overview'],
+            'release_date': row['release_date'].isoformat() if row['release_date'] else '',
+            'vote_average': row['vote_average'],
+            'vote_count': row['vote_count'],
+            'popularity': row['popularity'],
+            'original_language': 'en',
+            'genre_ids': sorted(genre_ids.get(row['id'], [])),
+        } for row in rows]
+        return results, total_pages
+
+    def catalog_is_empty(self):
+        """True until sync_tmdb_catalog has ingested at least one movie"""
+        return not Movie.objects.filter(catalog_synced_at__isnull=False).exists()
+
+    def discover_movies(self, filters=None, page=1):
+        """Gets list of movies based on filters, from the local catalog"""
+        if self.catalog_is_empty():
+            logger.warning("Local catalog is empty, falling back to TMDB discover. Run sync_tmdb_catalog.")
+            return super().discover_movies(filters, page=page)
+        try:
+            return self._catalog_page(self._catalog_queryset(filters), page)
+        except Exception as e:
+            logger.exception(f"Local catalog discover failed for page {page}: {e}")
+            return [], 0
+
+    def get_popular_movies(self, page=1):
+        """Get popular movies without any filters, from the local catalog"""
+        if self.catalog_is_empty():
+            logger.warning("Local catalog is empty, falling back to TMDB popular. Run sync_tmdb_catalog.")
+            return super().get_popular_movies(page=page)
+        try:
+            return self._catalog_page(self._catalog_queryset(), page)
+        except Exception as e:
+            logger.exception(f"Local catalog popular failed for page {page}: {e}")
+            return [], 0
+
+
+def discover_service():
+    """The service discover/popular batches come from, per TMDB_DISCOVER_BACKEND"""
+    if getattr(settings, 'TMDB_DISCOVER_BACKEND', 'tmdb') == 'local':
+        return LocalCatalogService()
+    return TMDBService()
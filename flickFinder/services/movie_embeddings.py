@@ -0,0 +1,311 @@
+import logging
+import math
+import re
+import zlib
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from ..models import EmbeddingSpace, Movie, MovieEmbedding
+from .id_queue import pack_ids, unpack_ids
+from .taste import feature_layout, movie_features
+
+logger = logging.getLogger(__name__)
+
+SPACE_NAME = 'movies'
+# Overview terms are hashed into a fixed number of buckets, so new movies never change the layout.
+# They follow the taste features (see services/taste.py), whose genre axis can grow
+TEXT_BUCKETS = 256
+# Share of the cosine that comes from genres/decade/rating vs. the overview text
+METADATA_WEIGHT = 0.6
+MAX_CLUSTERS = 512
+KMEANS_ITERATIONS = 8
+KMEANS_SAMPLE = 20000
+WRITE_BATCH_SIZE = 500
+ADD_CHUNK_SIZE = 200 # new movies embedded per transaction
+MOVIE_FIELDS = ('id', 'tmdb_id', 'genres', 'release_date', 'vote_average', 'overview')
+
+STOPWORDS = frozenset("""
+    the and for with his her their they them this that from into when who what where which while
+    but are was were has have had not its after before about over than then out one two new own
+    him she he you your our all can will must been being also only more most some such very
+""".split())
+
+
+def _term_buckets(text):
+    """Hashed term counts of an overview, as {bucket: count}"""
+    counts = {}
+    for token in re.findall(r"[a-z]{3,}", (text or '').lower()):
+        if token in STOPWORDS:
+            continue
+        bucket = zlib.crc32(token.encode('utf-8')) % TEXT_BUCKETS # stable across processes, unlike hash()
+        counts[bucket] = counts.get(bucket, 0) + 1
+    return counts
+
+
+def fit_idf(rows):
+    """Smoothed IDF per term bucket over the overviews of rows"""
+    document_frequency = np.zeros(TEXT_BUCKETS, dtype=np.float64)
+    for row in rows:
+        for bucket in _term_buckets(row['overview']):
+            document_frequency[bucket] += 1
+    return (np.log((1 + len(rows)) / (1 + document_frequency)) + 1).astype(np.float32)
+
+
+def embed(rows, idf, layout):
+    """
+    Embeds Movie value rows (MOVIE_FIELDS), the taste features in `layout` followed by the overview terms.
+
+    Returns:
+        np.ndarray: (n, layout.count + TEXT_BUCKETS) float32, unit length rows, so cosine
+                    similarity is a dot product.
+    """
+    features = layout.count
+    vectors = np.zeros((len(rows), features + TEXT_BUCKETS), dtype=np.float32)
+    for i, row in enumerate(rows):
+        genre_ids = [genre.get('id') for genre in (row['genres'] or []) if isinstance(genre, dict)]
+        movie_features(genre_ids, row['release_date'], row['vote_average'], out=vectors[i, :features], layout=layout)
+        for bucket, count in _term_buckets(row['overview']).items():
+            vectors[i, features + bucket] = (1 + math.log(count)) * idf[bucket]
+
+    for part, weight in ((slice(0, features), METADATA_WEIGHT), (slice(features, None), 1 - METADATA_WEIGHT)):
+        norms = np.linalg.norm(vectors[:, part], axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        vectors[:, part] *= math.sqrt(weight) / norms
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def fit_centroids(vectors, clusters, seed=0):
+    """Spherical k-means on a sample of the vectors"""
+    rng = np.random.default_rng(seed)
+    sample = vectors[rng.choice(len(vectors), min(len(vectors), KMEANS_SAMPLE), replace=False)]
+    centroids = sample[rng.choice(len(sample), clusters, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        for c in range(clusters):
+            members = sample[assignment == c]
+            if len(members):
+                centroid = members.sum(axis=0)
+                centroids[c] = centroid / (np.linalg.norm(centroid) or 1.0)
+    return centroids
+
+
+def _top_similar(query_vectors, query_ids, candidate_vectors, candidate_ids, count):
+    """
+    Best `count` candidates for each query row, a query never matching itself.
+
+    Returns:
+        tuple: (ids (n, count) uint32, scores (n, count) float32), zero padded.
+    """
+    ids = np.zeros((len(query_ids), count), dtype='<u4')
+    scores = np.zeros((len(query_ids), count), dtype='<f4')
+    if not len(candidate_ids):
+        return ids, scores
+    similarity = query_vectors @ candidate_vectors.T
+    similarity[np.asarray(query_ids)[:, None] == np.asarray(candidate_ids)[None, :]] = -np.inf
+    take = min(count, len(candidate_ids))
+    best = np.argpartition(-similarity, take - 1, axis=1)[:, :take]
+    best_scores = np.take_along_axis(similarity, best, axis=1)
+    order = np.argsort(-best_scores, axis=1)
+    best = np.take_along_axis(best, order, axis=1)
+    best_scores = np.take_along_axis(best_scores, order, axis=1)
+    valid = np.isfinite(best_scores) & (best_scores > 0)
+    ids[:, :take] = np.where(valid, np.asarray(candidate_ids)[best], 0)
+    scores[:, :take] = np.where(valid, best_scores, 0)
+    return ids, scores
+
+
+def _probes(centroids, vectors, probes):
+    """Indexes of the `probes` nearest centroids for each vector"""
+    probes = min(probes, len(centroids))
+    return np.argsort(-(vectors @ centroids.T), axis=1)[:, :probes]
+
+
+def _packed_similar(ids, scores):
+    used = scores > 0
+    return pack_ids(ids[used].tolist()), scores[used].astype('<f4').tobytes()
+
+
+class MovieEmbeddingIndex:
+    """
+    "More like this" for movie_detail: a content embedding per Movie (genres, decade and
+    rating band from services/taste.py plus a hashed TF-IDF of the overview) and an
+    inverted-file ANN index over it.
+
+    A full build fits the IDF weights and k-means centroids, then finds each movie's
+    neighbours by probing only the clusters nearest it. Movies ingested later are embedded
+    with the stored weights, assigned to their nearest centroid and probed the same way,
+    and are pushed into existing movies' lists where they beat the weakest entry. The
+    resulting lists are stored on MovieEmbedding, so a lookup is one row read.
+    """
+
+    def __init__(self, similar_count=None, probes=None):
+        self.similar_count = similar_count or getattr(settings, 'MOVIE_SIMILAR_COUNT', 10)
+        self.probes = probes or getattr(settings, 'MOVIE_EMBEDDING_PROBES', 4)
+
+    def rebuild(self):
+        """
+        Re-embeds every movie from scratch (refitting the IDF weights and centroids).
+
+        Returns:
+            int: Number of movies embedded.
+        """
+        rows = list(Movie.objects.values(*MOVIE_FIELDS).order_by('id'))
+        if not rows:
+            return 0
+        idf = fit_idf(rows)
+        layout = feature_layout()
+        vectors = embed(rows, idf, layout)
+        clusters = max(1, min(MAX_CLUSTERS, int(math.sqrt(len(rows)))))
+        centroids = fit_centroids(vectors, clusters)
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        tmdb_ids = np.array([row['tmdb_id'] for row in rows], dtype=np.int64)
+
+        similar_ids = np.zeros((len(rows), self.similar_count), dtype='<u4')
+        similar_scores = np.zeros((len(rows), self.similar_count), dtype='<f4')
+        members = [np.flatnonzero(assignment == c) for c in range(clusters)]
+        # Movies of one cluster share the probe set of their centroid, one matrix product per cluster
+        for c, probe in enumerate(_probes(centroids, centroids, self.probes)):
+            if not len(members[c]):
+                continue
+            candidates = np.concatenate([members[p] for p in probe])
+            ids, scores = _top_similar(vectors[members[c]], tmdb_ids[members[c]],
+                                       vectors[candidates], tmdb_ids[candidates], self.similar_count)
+            similar_ids[members[c]] = ids
+            similar_scores[members[c]] = scores
+
+        embeddings = []
+        for i, row in enumerate(rows):
+            similar_data, scores_data = _packed_similar(similar_ids[i], similar_scores[i])
+            embeddings.append(MovieEmbedding(movie_id=row['id'], vector=vectors[i].astype('<f4').tobytes(),
+                                             cluster=int(assignment[i]), similar_data=similar_data,
+                                             similar_scores=scores_data, updated_at=timezone.now()))
+        with transaction.atomic():
+            MovieEmbedding.objects.bulk_create(embeddings, batch_size=WRITE_BATCH_SIZE, update_conflicts=True,
+                                               unique_fields=['movie'],
+                                               update_fields=['vector', 'cluster', 'similar_data', 'similar_scores', 'updated_at'])
+            EmbeddingSpace.objects.update_or_create(name=SPACE_NAME, defaults={
+                'idf': idf.astype('<f4').tobytes(), 'centroids': centroids.astype('<f4').tobytes(),
+                'dims': vectors.shape[1], 'layout': layout.signature, 'movie_count': len(rows),
+                'built_at': timezone.now()})
+        logger.info(f"Embedded {len(rows)} movies into {clusters} clusters.")
+        return len(rows)
+
+    def _load_space(self):
+        """The stored (idf, centroids, layout), or None if there's none built in the current layout"""
+        layout = feature_layout()
+        space = EmbeddingSpace.objects.filter(name=SPACE_NAME).first()
+        if space is None or space.layout != layout.signature or space.dims != layout.count + TEXT_BUCKETS:
+            return None
+        idf = np.frombuffer(bytes(space.idf), dtype='<f4')
+        centroids = np.frombuffer(bytes(space.centroids), dtype='<f4').reshape(-1, space.dims)
+        return idf, centroids, layout
+
+    def has_space(self):
+        """Whether a full build in the current feature layout exists, so new movies can be added to it"""
+        return self._load_space() is not None
+
+    def add_new(self, limit=ADD_CHUNK_SIZE):
+        """
+        Embeds up to limit movies that don't have an embedding yet, against the stored space.
+
+        Like rebuild(), the new movies are grouped by cluster and each group is compared only
+        with the movies in its centroid's probed clusters, so memory stays bounded by a few
+        clusters rather than growing with the chunk.
+
+        Returns:
+            int: Number of movies embedded, 0 also when no full build in the current
+                 feature layout has run yet.
+        """
+        space = self._load_space()
+        if space is None:
+            return 0
+        idf, centroids, layout = space
+        rows = list(Movie.objects.filter(embedding__isnull=True).values(*MOVIE_FIELDS).order_by('id')[:limit])
+        if not rows:
+            return 0
+        vectors = embed(rows, idf, layout)
+        new_ids = np.array([row['tmdb_id'] for row in rows], dtype=np.int64)
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+
+        embeddings = []
+        changed = {} # movie_id -> (ids, scores) of existing lists pushed into so far
+        for c in np.unique(assignment).tolist():
+            group = np.flatnonzero(assignment == c)
+            probe = _probes(centroids, centroids[c:c + 1], self.probes)[0]
+            # Existing movies in the group's probed clusters, with their current lists
+            existing = list(MovieEmbedding.objects.filter(cluster__in=probe.tolist())
+                            .values_list('movie_id', 'movie__tmdb_id', 'vector', 'similar_data', 'similar_scores'))
+            existing_ids = np.array([row[1] for row in existing], dtype=np.int64)
+            existing_vectors = (np.vstack([np.frombuffer(bytes(row[2]), dtype='<f4') for row in existing])
+                                if existing else np.zeros((0, vectors.shape[1]), dtype=np.float32))
+
+            # New movies search the existing ones plus the other new movies in the same clusters
+            peers = np.flatnonzero(np.isin(assignment, probe))
+            ids, scores = _top_similar(vectors[group], new_ids[group],
+                                       np.vstack([existing_vectors, vectors[peers]]),
+                                       np.concatenate([existing_ids, new_ids[peers]]), self.similar_count)
+            for k, i in enumerate(group):
+                similar_data, scores_data = _packed_similar(ids[k], scores[k])
+                embeddings.append(MovieEmbedding(movie_id=rows[i]['id'], vector=vectors[i].astype('<f4').tobytes(),
+                                                 cluster=c, similar_data=similar_data, similar_scores=scores_data))
+
+            # Push the group into the lists of existing movies it's closer to than their weakest entry
+            similarity = vectors[group] @ existing_vectors.T
+            for j, (movie_id, _, _, similar_data, scores_data) in enumerate(existing):
+                if movie_id in changed:
+                    current_ids, current_scores = changed[movie_id]
+                else:
+                    current_ids = unpack_ids(similar_data)
+                    current_scores = np.frombuffer(bytes(scores_data), dtype='<f4').tolist()
+                weakest = current_scores[-1] if len(current_scores) >= self.similar_count else 0.0
+                better = np.flatnonzero(similarity[:, j] > weakest)
+                if not len(better):
+                    continue
+                merged = sorted(zip(current_scores + similarity[better, j].tolist(),
+                                    current_ids + new_ids[group[better]].tolist()), reverse=True)[:self.similar_count]
+                changed[movie_id] = ([m for _, m in merged], [s for s, _ in merged])
+
+        updated = [MovieEmbedding(movie_id=movie_id, similar_data=pack_ids(ids),
+                                  similar_scores=np.array(scores, dtype='<f4').tobytes(), updated_at=timezone.now())
+                   for movie_id, (ids, scores) in changed.items()]
+        with transaction.atomic():
+            MovieEmbedding.objects.bulk_create(embeddings, batch_size=WRITE_BATCH_SIZE, ignore_conflicts=True)
+            MovieEmbedding.objects.bulk_update(updated, ['similar_data', 'similar_scores', 'updated_at'],
+                                               batch_size=WRITE_BATCH_SIZE)
+        logger.info(f"Embedded {len(rows)} new movies, updated {len(updated)} existing lists.")
+        return len(rows)
+
+    def update(self):
+        """
+        Embeds every movie still missing an embedding, a chunk at a time.
+
+        Run from `manage.py build_movie_embeddings` (e.g. on a cron), not from the web workers.
+
+        Returns:
+            int: Number of movies embedded.
+        """
+        count = 0
+        while added := self.add_new():
+            count += added
+        return count
+
+    def similar(self, tmdb_id, limit=None):
+        """
+        The most similar movies to a TMDB id, from the stored list.
+
+        Returns:
+            list: Movie instances, most similar first. Empty if the movie isn't embedded yet.
+        """
+        similar_data = MovieEmbedding.objects.filter(movie__tmdb_id=tmdb_id).values_list('similar_data', flat=True).first()
+        if not similar_data:
+            return []
+        similar_ids = unpack_ids(similar_data)[:limit or self.similar_count]
+        movies = Movie.objects.only('tmdb_id', 'title', 'poster_path', 'release_date', 'vote_average').in_bulk(
+            similar_ids, field_name='tmdb_id')
+        return [movies[movie_id] for movie_id in similar_ids if movie_id in movies]
+
+
+movie_embeddings = MovieEmbeddingIndex()
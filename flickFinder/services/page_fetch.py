@@ -0,0 +1,50 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+PAGE_FETCH_WORKERS = 5 # one refill's worth of pages at once
+
+# Bounded pool so a refill fetches its pages in parallel without spawning threads per request
+page_fetch_pool = ThreadPoolExecutor(max_workers=PAGE_FETCH_WORKERS, thread_name_prefix='tmdb-page')
+
+
+def _run_pooled(fetch_page, page_num):
+    """Runs one page fetch on a pool thread, releasing that thread's db connection afterwards"""
+    try:
+        return fetch_page(page_num)
+    finally:
+        close_old_connections()
+
+
+def fetch_pages(fetch_page, pages, potential_movies, page_ids=None):
+    """
+    Fetches several TMDB result pages concurrently on the shared page pool.
+
+    Args:
+        fetch_page (callable): Takes a page number, returns (results, total_pages).
+        pages (list): Page numbers to fetch.
+        potential_movies (dict): Movie data keyed by TMDB ID, updated in place.
+        page_ids (dict): Optional, filled with page number -> TMDB IDs on that page.
+
+    Returns:
+        int: The largest total_pages reported by the fetched pages (0 if all failed).
+    """
+    total_pages = 0
+    futures = {page_fetch_pool.submit(_run_pooled, fetch_page, page_num): page_num for page_num in pages}
+    for future in as_completed(futures):
+        page_num = futures[future]
+        try:
+            movies_page, page_total = future.result()
+        except Exception as e:
+            logger.exception(f"Error fetching page {page_num}")
+            continue
+        total_pages = max(total_pages, page_total)
+        if movies_page:
+            logger.debug(f"Fetched {len(movies_page)} movies from page {page_num}")
+            for movie_data in movies_page:
+                if movie_data and movie_data.get('id'): potential_movies[movie_data['id']] = movie_data
+        if page_ids is not None:
+            page_ids[page_num] = [movie_data['id'] for movie_data in movies_page or [] if movie_data and movie_data.get('id')]
+    return total_pages
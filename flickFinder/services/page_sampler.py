@@ -0,0 +1,91 @@
+import hashlib
+import logging
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from ..models import UserPageYield
+
+logger = logging.getLogger(__name__)
+
+
+def signature_hash(signature):
+    """Fixed-length key for a filter signature string"""
+    return hashlib.sha1(signature.encode('utf-8')).hexdigest()
+
+
+class PageSampler:
+    """
+    Picks which discover pages a refill fetches, per user and filter signature.
+
+    Every fetched page's yield (the share of its movies that survived the user's
+    exclusions) is recorded in UserPageYield. Unseen pages get full weight; a seen page
+    is weighted by its last yield, cut by `seen_decay` for every time it was fetched,
+    since the survivors of each fetch were queued and are mostly swiped by now. Pages
+    are drawn without replacement in proportion to their weights, so refills steer
+    towards unseen pages first and then towards the seen pages that still yielded.
+    """
+
+    def __init__(self, seen_decay=None, min_weight=None, seed=None):
+        self.seen_decay = seen_decay or getattr(settings, 'PAGE_SAMPLER_SEEN_DECAY', 0.02)
+        # Never rule a page out completely, yields change as TMDB's ordering drifts
+        self.min_weight = min_weight or getattr(settings, 'PAGE_SAMPLER_MIN_WEIGHT', 0.001)
+        self.seed = seed # fixes the draws, for tests
+
+    def _stats(self, user_id, signature):
+        pages = UserPageYield.objects.filter(
+            user_id=user_id, signature_hash=signature_hash(signature)).values_list('pages', flat=True).first()
+        return pages or {}
+
+    def sample(self, user_id, signature, max_page, count, skip=()):
+        """
+        Args:
+            max_page (int): Highest page available for the signature.
+            count (int): Number of pages wanted.
+            skip (iterable): Pages not to pick (e.g. already probed).
+
+        Returns:
+            list: Up to count distinct page numbers.
+        """
+        pages = np.array([page for page in range(1, max_page + 1) if page not in set(skip)])
+        if not len(pages) or count <= 0:
+            return []
+        count = min(count, len(pages))
+
+        stats = self._stats(user_id, signature)
+        weights = self.weights(pages, stats)
+        chosen = np.random.default_rng(self.seed).choice(pages, size=count, replace=False, p=weights / weights.sum())
+        logger.debug(f"Sampled pages {chosen.tolist()} for user {user_id} ({len(stats)} of {max_page} pages seen)")
+        return chosen.tolist()
+
+    def weights(self, pages, stats):
+        """Draw weight of each page: 1 if unseen, else its last yield decayed per fetch (at least min_weight)"""
+        weights = np.ones(len(pages))
+        for i, page in enumerate(pages):
+            seen = stats.get(str(page))
+            if seen:
+                fetches, last_yield = seen
+                weights[i] = max(self.min_weight, last_yield * self.seen_decay ** fetches)
+        return weights
+
+    def record(self, user_id, signature, page_yields):
+        """
+        Stores the yield of each fetched page.
+
+        Args:
+            page_yields (dict): page -> (movies fetched, movies that survived exclusion)
+        """
+        page_yields = {page: counts for page, counts in page_yields.items() if counts[0]}
+        if not page_yields:
+            return
+        with transaction.atomic():
+            row, _ = UserPageYield.objects.select_for_update().get_or_create(
+                user_id=user_id, signature_hash=signature_hash(signature))
+            pages = row.pages or {}
+            for page, (fetched, survived) in page_yields.items():
+                fetches = pages.get(str(page), [0, 1.0])[0]
+                pages[str(page)] = [fetches + 1, round(survived / fetched, 3)]
+            row.pages = pages
+            row.save(update_fields=['pages', 'updated_at'])
+
+
+page_sampler = PageSampler()
@@ -0,0 +1,174 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import transaction, close_old_connections
+from ..models import Movie, RecommendationBuffer
+from .id_queue import PackedIdQueue
+
+logger = logging.getLogger(__name__)
+
+
+class RecommendationPrefetcher:
+    """
+    Keeps a per-user buffer of recommendations that can be served without calling TMDB.
+
+    Each user's RecommendationBuffer holds candidate ids from the last batch fetch and
+    ready ids, candidates whose full details are already stored on their Movie row.
+    Serving pops a ready id and reads the stored details. When fewer than `low_water`
+    are ready, a background thread hydrates more candidates (fetching a new batch when
+    they run out) until `size` are ready again.
+    """
+
+    def __init__(self, tmdb_service, fetch_batch, size=None, low_water=None, workers=None):
+        """
+        Args:
+            tmdb_service (TMDBService): Used to fetch and store movie details.
+            fetch_batch (callable): Takes (user, tmdb_service, apply_filters), returns
+                                    (list of shuffled candidate TMDB ids, source name).
+        """
+        self.tmdb_service = tmdb_service
+        self.fetch_batch = fetch_batch
+        self.size = size or getattr(settings, 'PREFETCH_BUFFER_SIZE', 5)
+        self.low_water = low_water or getattr(settings, 'PREFETCH_LOW_WATER', 2)
+        self.executor = ThreadPoolExecutor(max_workers=workers or getattr(settings, 'PREFETCH_WORKERS', 2),
+                                           thread_name_prefix='prefetch')
+        self._lock = threading.Lock()
+        self._scheduled = set() # user ids with a top-up queued or running in this process
+
+    def _locked_buffer(self, user_id):
+        """Locks and returns the user's buffer row (inside a transaction), creating it if missing"""
+        buffer, _ = RecommendationBuffer.objects.select_for_update().get_or_create(user_id=user_id)
+        return buffer
+
+    def pop(self, user_id):
+        """
+        Serves the next ready movie from stored details, never calling TMDB.
+
+        Returns:
+            tuple: (movie data dict or None, number of movies still ready)
+        """
+        while True:
+            with transaction.atomic():
+                buffer = self._locked_buffer(user_id)
+                ready = PackedIdQueue(buffer, 'ready')
+                movie_id = ready.pop_front()
+                if movie_id is None:
+                    return None, 0
+                buffer.save(update_fields=ready.dirty + ['updated_at']) # names only the head, SQLite still rewrites the (small) row
+            details = Movie.objects.filter(tmdb_id=movie_id).values_list('details', flat=True).first()
+            if details:
+                return details, len(ready)
+            logger.warning(f"Prefetched movie {movie_id} has no stored details, skipping it.")
+
+    def needs_top_up(self, ready_count):
+        return ready_count < self.low_water
+
+    def schedule_top_up(self, user, apply_filters=True):
+        """Queues a background top-up for the user unless one is already pending in this process"""
+        with self._lock:
+            if user.id in self._scheduled:
+                return
+            self._scheduled.add(user.id)
+        self.executor.submit(self._run_top_up, user, apply_filters)
+
+    def _run_top_up(self, user, apply_filters):
+        try:
+            self.top_up(user, apply_filters)
+        except Exception as e:
+            logger.exception(f"Background prefetch failed for user {user.id}: {e}")
+        finally:
+            with self._lock:
+                self._scheduled.discard(user.id)
+            close_old_connections()
+
+    def top_up(self, user, apply_filters=True, target=None):
+        """
+        Hydrates candidates until `target` (default: the buffer size) movies are ready.
+
+        Candidates are claimed under the row lock and hydrated outside it, so the request
+        thread can keep popping meanwhile. If the buffer is cleared mid-way (new filters),
+        the stale work is dropped.
+
+        Returns:
+            int: Number of ready movies afterwards.
+        """
+        target = target or self.size
+        refilled = False
+        while True:
+            with transaction.atomic():
+                buffer = self._locked_buffer(user.id)
+                generation = buffer.generation
+                ready_count = len(PackedIdQueue(buffer, 'ready'))
+                needed = target - ready_count
+                if needed <= 0:
+                    return ready_count
+                candidates = PackedIdQueue(buffer, 'candidate')
+                claimed = candidates.take(needed)
+                if claimed:
+                    buffer.save(update_fields=candidates.dirty + ['updated_at'])
+
+            if not claimed:
+                if refilled:
+                    return ready_count # fresh batch had nothing left to serve
+                self._refill(user, apply_filters, generation)
+                refilled = True
+                continue
+
+            hydrated = [movie_id for movie_id in claimed if self._hydrate(movie_id)]
+            with transaction.atomic():
+                buffer = self._locked_buffer(user.id)
+                ready = PackedIdQueue(buffer, 'ready')
+                if buffer.generation != generation:
+                    logger.debug(f"Recommendation buffer for user {user.id} was reset, dropping prefetched movies.")
+                    return len(ready)
+                already_ready = set(ready)
+                ready.extend(movie_id for movie_id in hydrated if movie_id not in already_ready)
+                buffer.save(update_fields=ready.dirty + ['updated_at'])
+            logger.debug(f"Prefetched {len(hydrated)} movies for user {user.id}, {len(ready)} ready.")
+
+    def _refill(self, user, apply_filters, generation):
+        """Fetches a new candidate batch into the buffer"""
+        logger.info(f"Recommendation candidates exhausted for user {user.id}. Fetching new batch...")
+        candidate_ids, source = self.fetch_batch(user, self.tmdb_service, apply_filters)
+        with transaction.atomic():
+            buffer = self._locked_buffer(user.id)
+            if buffer.generation != generation:
+                return
+            candidates = PackedIdQueue(buffer, 'candidate')
+            queued = set(candidates) | set(PackedIdQueue(buffer, 'ready')) # another worker may have refilled too
+            candidates.extend(movie_id for movie_id in candidate_ids if movie_id not in queued)
+            buffer.source = source
+            buffer.save(update_fields=candidates.dirty + ['source', 'updated_at'])
+
+    def _hydrate(self, movie_id):
+        """Makes sure the movie's details are stored locally, True if it can be served"""
+        try:
+            movie_data = self.tmdb_service.get_movie_details(movie_id)
+            if movie_data and self.tmdb_service.get_or_create_movie(movie_data):
+                return True
+            logger.warning(f"Could not hydrate candidate {movie_id}, dropping it.")
+        except Exception as e:
+            logger.exception(f"Unexpected error hydrating candidate {movie_id}: {e}")
+        return False
+
+    def discard(self, user_id, *movie_ids):
+        """Drops movies from the user's queues, e.g. after one was blocked from its detail page"""
+        buffer = RecommendationBuffer.objects.filter(user_id=user_id).first()
+        if buffer is None or not {i for name in ('ready', 'candidate') for i in PackedIdQueue(buffer, name)} & set(movie_ids):
+            return # the common case, checked without taking the write lock
+        with transaction.atomic():
+            buffer = self._locked_buffer(user_id)
+            queues = [PackedIdQueue(buffer, name) for name in ('ready', 'candidate')]
+            if any([queue.remove(movie_id) for queue in queues for movie_id in movie_ids]):
+                buffer.save(update_fields=sorted({f for queue in queues for f in queue.dirty}) + ['updated_at'])
+
+    def clear(self, user_id):
+        """Empties the user's buffer (e.g. after a filter change), cancelling in-flight top-ups"""
+        with transaction.atomic():
+            buffer = self._locked_buffer(user_id)
+            PackedIdQueue(buffer, 'candidate').clear()
+            PackedIdQueue(buffer, 'ready').clear()
+            buffer.source = ''
+            buffer.generation += 1
+            buffer.save()
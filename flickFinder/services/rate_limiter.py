@@ -0,0 +1,140 @@
+import logging
+import random
+import time
+from email.utils import parsedate_to_datetime
+from django.conf import settings
+from django.db import transaction
+from ..models import TMDBRateLimitState
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiterError(Exception):
+    """Raised instead of calling TMDB when the circuit is open or the wait would be too long"""
+    pass
+
+
+def parse_retry_after(value):
+    """
+    Turns a Retry-After header (seconds or an HTTP date) into seconds to wait.
+
+    Returns:
+        float: Seconds, or None if the header is missing or unreadable.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TMDBRateLimiter:
+    """
+    Token bucket plus circuit breaker shared by every worker through TMDBRateLimitState.
+
+    reserve() takes a token (waiting for one if the bucket is dry), honouring any
+    Retry-After window another worker has recorded, and fails fast while the circuit
+    is open. record_failure() trips the circuit after `failure_threshold` consecutive
+    429/5xx/timeout failures; it stays open for `cooldown` seconds, after which calls
+    are let through again and the first failure re-opens it.
+    """
+
+    def __init__(self, name='tmdb', rate=None, burst=None, max_wait=None,
+                 failure_threshold=None, cooldown=None):
+        self.name = name
+        self.rate = rate or getattr(settings, 'TMDB_RATE_LIMIT_PER_SECOND', 40)
+        self.burst = burst or getattr(settings, 'TMDB_RATE_LIMIT_BURST', 40)
+        self.max_wait = max_wait if max_wait is not None else getattr(settings, 'TMDB_RATE_LIMIT_MAX_WAIT', 5)
+        self.failure_threshold = failure_threshold or getattr(settings, 'TMDB_CIRCUIT_FAILURE_THRESHOLD', 5)
+        self.cooldown = cooldown or getattr(settings, 'TMDB_CIRCUIT_COOLDOWN', 30)
+        self._saw_failures = False # skips the success write when nothing needs resetting
+
+    def _state(self, now):
+        """Locks and returns the shared row (inside a transaction), creating a full bucket if missing"""
+        state, _ = TMDBRateLimitState.objects.select_for_update().get_or_create(
+            name=self.name, defaults={'tokens': self.burst, 'refilled_at': now})
+        return state
+
+    def reserve(self):
+        """
+        Takes one token, sleeping until it's available.
+
+        Raises:
+            RateLimiterError: If the circuit is open or the wait would exceed max_wait.
+        """
+        now = time.time()
+        try:
+            with transaction.atomic():
+                state = self._state(now)
+                if state.open_until > now:
+                    raise RateLimiterError(f"TMDB circuit open for another {state.open_until - now:.1f}s")
+                self._saw_failures = state.consecutive_failures > 0
+
+                tokens = min(self.burst, state.tokens + (now - state.refilled_at) * self.rate)
+                wait = max(0.0, (1 - tokens) / self.rate, state.blocked_until - now)
+                if wait > self.max_wait:
+                    raise RateLimiterError(f"TMDB rate limit wait of {wait:.1f}s exceeds {self.max_wait}s")
+                # Going negative reserves a future token, so concurrent callers queue up fairly
+                state.tokens = tokens - 1
+                state.refilled_at = now
+                state.save(update_fields=['tokens', 'refilled_at'])
+        except RateLimiterError:
+            raise
+        except Exception as e:
+            # Never let limiter bookkeeping take the site down, just go ahead without it
+            logger.exception(f"TMDB rate limiter unavailable, proceeding without it: {e}")
+            return 0.0
+
+        if wait:
+            logger.debug(f"TMDB rate limiter waiting {wait:.2f}s")
+            time.sleep(wait)
+        return wait
+
+    def block_for(self, seconds):
+        """Records a Retry-After window so every worker holds off until it passes"""
+        until = time.time() + seconds
+        try:
+            with transaction.atomic():
+                state = self._state(time.time())
+                if until > state.blocked_until:
+                    state.blocked_until = until
+                    state.save(update_fields=['blocked_until'])
+        except Exception as e:
+            logger.exception(f"Failed to record TMDB Retry-After window: {e}")
+
+    def record_success(self):
+        """Closes the circuit and resets the failure count"""
+        if not self._saw_failures:
+            return
+        TMDBRateLimitState.objects.filter(name=self.name).update(consecutive_failures=0, open_until=0)
+        self._saw_failures = False
+
+    def record_failure(self):
+        """Counts a retryable failure, opening the circuit once the threshold is reached"""
+        self._saw_failures = True
+        try:
+            with transaction.atomic():
+                state = self._state(time.time())
+                state.consecutive_failures += 1
+                if state.consecutive_failures >= self.failure_threshold:
+                    state.open_until = time.time() + self.cooldown
+                    logger.warning(f"TMDB circuit opened for {self.cooldown}s after "
+                                   f"{state.consecutive_failures} consecutive failures.")
+                state.save(update_fields=['consecutive_failures', 'open_until'])
+        except Exception as e:
+            logger.exception(f"Failed to record TMDB failure: {e}")
+
+    def reset(self):
+        """Refills the bucket and closes the circuit"""
+        TMDBRateLimitState.objects.filter(name=self.name).delete()
+        self._saw_failures = False
+
+
+def backoff_delay(attempt, base, cap):
+    """Full-jitter exponential backoff: uniform(0, min(cap, base * 2**attempt))"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
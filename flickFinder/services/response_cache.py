@@ -0,0 +1,184 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from ..models import TMDBCacheEntry, TMDBCacheCounter
+
+logger = logging.getLogger(__name__)
+
+# Seconds per endpoint class, overridable through settings.TMDB_CACHE_TTLS
+DEFAULT_TTLS = {
+    'movie': 60 * 60 * 24 * 7,  # movie/{id} details barely change
+    'genre': 60 * 60 * 24 * 7,  # genre list basically never changes
+    'discover': 60 * 30,        # popularity ordering drifts during the day
+    'search': 60 * 10,
+}
+DEFAULT_TTL = 60 * 10 # anything not listed above
+COUNTER_NAMES = ('hits', 'misses', 'evictions')
+
+
+def add_counters(amounts):
+    """Adds counts into the shared TMDBCacheCounter rows, creating missing ones"""
+    try:
+        for name, amount in amounts.items():
+            if not amount:
+                continue
+            updated = TMDBCacheCounter.objects.filter(name=name).update(value=F('value') + amount)
+            if not updated:
+                counter, created = TMDBCacheCounter.objects.get_or_create(name=name, defaults={'value': amount})
+                if not created:
+                    TMDBCacheCounter.objects.filter(name=name).update(value=F('value') + amount)
+    except Exception as e:
+        logger.exception(f"Failed to flush TMDB counters: {e}")
+
+
+class TMDBResponseCache:
+    """
+    TTL-aware, size-bounded response cache for TMDBService._make_request.
+
+    Entries live in the TMDBCacheEntry table so all gunicorn workers share them.
+    Eviction is least-recently-used once the table grows past max_entries, and
+    404 responses are stored as negative entries with their own TTL.
+    Counters are kept in memory and folded into TMDBCacheCounter periodically,
+    so a cache hit doesn't cost an extra write.
+    """
+    TOUCH_INTERVAL = 60 # seconds, last_accessed is only refreshed this often
+    PRUNE_EVERY = 50 # writes between size checks
+    COUNTER_FLUSH_INTERVAL = 30 # seconds
+
+    def __init__(self, max_entries=None, ttls=None, negative_ttl=None):
+        self.max_entries = max_entries or getattr(settings, 'TMDB_CACHE_MAX_ENTRIES', 20000)
+        self.ttls = dict(DEFAULT_TTLS)
+        self.ttls.update(ttls or getattr(settings, 'TMDB_CACHE_TTLS', {}))
+        self.negative_ttl = negative_ttl or getattr(settings, 'TMDB_CACHE_NEGATIVE_TTL', 60 * 60)
+
+        self._lock = threading.Lock()
+        self._pending = dict.fromkeys(COUNTER_NAMES, 0) # not yet flushed to the db
+        self._writes_since_prune = 0
+        self._last_flush = time.monotonic()
+
+    @staticmethod
+    def make_key(endpoint, params=None):
+        """Hash of endpoint + params sorted by name, ignoring api_key"""
+        canonical = sorted((str(k), str(v)) for k, v in (params or {}).items() if k != 'api_key')
+        raw = json.dumps([endpoint.strip('/'), canonical], separators=(',', ':'))
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def ttl_for(self, endpoint):
+        """TTL in seconds for an endpoint, based on its first path segment"""
+        endpoint_class = endpoint.strip('/').split('/', 1)[0]
+        return self.ttls.get(endpoint_class, DEFAULT_TTL)
+
+    def get(self, endpoint, params=None, record=True):
+        """
+        Looks up a cached response. record=False leaves the hit/miss counters alone (used when polling).
+
+        Returns:
+            tuple: (hit, status_code, payload). hit is False on a miss or expired entry.
+        """
+        key = self.make_key(endpoint, params)
+        now = timezone.now()
+        try:
+            entry = TMDBCacheEntry.objects.filter(key=key, expires_at__gt=now).only(
+                'id', 'status_code', 'payload', 'last_accessed').first()
+        except Exception as e:
+            logger.exception(f"TMDB cache lookup failed for {endpoint}: {e}")
+            return False, None, None
+
+        if entry is None:
+            if record:
+                self._count('misses')
+            return False, None, None
+
+        if record:
+            self._count('hits')
+        if (now - entry.last_accessed).total_seconds() > self.TOUCH_INTERVAL:
+            TMDBCacheEntry.objects.filter(id=entry.id).update(last_accessed=now)
+        return True, entry.status_code, entry.payload
+
+    def set(self, endpoint, params, payload, status_code=200):
+        """Stores a response. 404s use the negative TTL and carry no payload."""
+        key = self.make_key(endpoint, params)
+        now = timezone.now()
+        ttl = self.negative_ttl if status_code == 404 else self.ttl_for(endpoint)
+        values = {
+            'endpoint': endpoint[:255],
+            'status_code': status_code,
+            'payload': payload if status_code != 404 else None,
+            'expires_at': now + timezone.timedelta(seconds=ttl),
+            'last_accessed': now,
+        }
+        try:
+            # Single INSERT ... ON CONFLICT so concurrent workers never read-then-write
+            TMDBCacheEntry.objects.bulk_create(
+                [TMDBCacheEntry(key=key, **values)],
+                update_conflicts=True,
+                unique_fields=['key'],
+                update_fields=list(values),
+            )
+        except Exception as e:
+            logger.exception(f"TMDB cache write failed for {endpoint}: {e}")
+            return
+
+        with self._lock:
+            self._writes_since_prune += 1
+            should_prune = self._writes_since_prune >= self.PRUNE_EVERY
+            if should_prune:
+                self._writes_since_prune = 0
+        if should_prune:
+            self.prune()
+
+    def prune(self):
+        """Drops expired entries, then least-recently-used ones above max_entries"""
+        try:
+            evicted, _ = TMDBCacheEntry.objects.filter(expires_at__lte=timezone.now()).delete()
+            overflow = TMDBCacheEntry.objects.count() - self.max_entries
+            if overflow > 0:
+                lru_ids = list(TMDBCacheEntry.objects.order_by('last_accessed')
+                               .values_list('id', flat=True)[:overflow])
+                lru_evicted, _ = TMDBCacheEntry.objects.filter(id__in=lru_ids).delete()
+                evicted += lru_evicted
+        except Exception as e:
+            logger.exception(f"TMDB cache prune failed: {e}")
+            return 0
+        if evicted:
+            logger.debug(f"TMDB cache evicted {evicted} entries.")
+            self._count('evictions', evicted)
+        return evicted
+
+    def clear(self):
+        """Removes every cached response"""
+        TMDBCacheEntry.objects.all().delete()
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._pending[name] += amount
+            due = time.monotonic() - self._last_flush > self.COUNTER_FLUSH_INTERVAL
+        if due:
+            self.flush_counters()
+
+    def flush_counters(self):
+        """Adds this process's pending counts into the shared TMDBCacheCounter rows"""
+        with self._lock:
+            pending, self._pending = self._pending, dict.fromkeys(COUNTER_NAMES, 0)
+            self._last_flush = time.monotonic()
+        add_counters(pending)
+
+    def stats(self):
+        """
+        Returns cache counters summed across all workers.
+
+        Returns:
+            dict: hits, misses, evictions, entries and hit_rate.
+        """
+        self.flush_counters()
+        totals = dict.fromkeys(COUNTER_NAMES, 0)
+        totals.update(TMDBCacheCounter.objects.filter(name__in=COUNTER_NAMES).values_list('name', 'value'))
+        totals['entries'] = TMDBCacheEntry.objects.count()
+        lookups = totals['hits'] + totals['misses']
+        totals['hit_rate'] = round(totals['hits'] / lookups, 4) if lookups else 0.0
+        return totals
@@ -0,0 +1,101 @@
+import logging
+import threading
+import time
+from django.db import IntegrityError
+from django.utils import timezone
+from ..models import TMDBInflightRequest
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    """One in-flight call that other threads can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls within a process.
+
+    The first caller for a key (the leader) runs the function; everyone who asks for the
+    same key while it's running waits and gets the leader's result (or exception).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """Runs fn() once per key at a time, sharing the outcome with concurrent callers"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if not leader:
+            call.done.wait()
+            logger.debug(f"Coalesced request {key[:80]}")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class WorkerLease:
+    """
+    Cross-worker half of request coalescing, backed by TMDBInflightRequest rows.
+
+    A worker that claims a key fetches from TMDB; other workers that fail to claim it
+    poll `lookup` (normally the shared response cache) until the leader has written the
+    result, falling back to their own request once `wait` seconds pass.
+    """
+    POLL_INTERVAL = 0.05
+
+    def __init__(self, wait=5.0):
+        self.wait = wait
+
+    def claim(self, key):
+        """True if this worker now owns the key"""
+        now = timezone.now()
+        TMDBInflightRequest.objects.filter(key=key, expires_at__lte=now).delete() # abandoned by a dead worker
+        try:
+            TMDBInflightRequest.objects.create(key=key, expires_at=now + timezone.timedelta(seconds=self.wait))
+            return True
+        except IntegrityError:
+            return False
+
+    def release(self, key):
+        TMDBInflightRequest.objects.filter(key=key).delete()
+
+    def wait_for(self, lookup):
+        """
+        Polls lookup() until it returns something other than None or the wait runs out.
+
+        Returns:
+            The looked up value, or None on timeout.
+        """
+        deadline = time.monotonic() + self.wait
+        while time.monotonic() < deadline:
+            time.sleep(self.POLL_INTERVAL)
+            value = lookup()
+            if value is not None:
+                return value
+        return None
@@ -0,0 +1,186 @@
+import logging
+import random
+import zlib
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from ..models import UserMovieState, UserTasteVector
+from .genre_registry import genre_registry
+
+logger = logging.getLogger(__name__)
+
+# TMDB's movie genres when the layout was first fixed. Genres the registry learns about
+# later are appended after these, so existing positions never move
+BASE_GENRE_IDS = [28, 12, 16, 35, 80, 99, 18, 10751, 14, 36, 27, 10402, 9648, 10749, 878, 10770, 53, 10752, 37]
+DECADES = list(range(1920, 2040, 10)) # clamped at both ends
+RATING_EDGES = [5.0, 6.0, 7.0, 8.0] # bands: <5, 5-6, 6-7, 7-8, 8+
+
+# How much each interaction pulls the taste vector towards a movie
+INTERACTION_WEIGHTS = {'heart': 1.0, 'watchlist': 0.6}
+
+
+class FeatureLayout:
+    """
+    Positions of the movie features: genre one-hots, a release decade one-hot and a
+    vote_average band one-hot.
+
+    The signature is stored next to anything built with the layout (taste vectors, the
+    embedding space), so a stored vector is only ever compared with one of the same layout.
+    """
+
+    def __init__(self, genre_ids):
+        self.genre_ids = list(genre_ids)
+        self.genre_index = {genre_id: i for i, genre_id in enumerate(self.genre_ids)}
+        self.decade_offset = len(self.genre_ids)
+        self.rating_offset = self.decade_offset + len(DECADES)
+        self.count = self.rating_offset + len(RATING_EDGES) + 1
+        self.signature = f"{zlib.crc32(','.join(map(str, self.genre_ids)).encode()):08x}"
+
+
+_layout = FeatureLayout(BASE_GENRE_IDS)
+
+
+def feature_layout():
+    """The current layout, with every genre the registry knows on the genre axis"""
+    global _layout
+    genre_ids = BASE_GENRE_IDS + sorted(set(genre_registry.names) - set(BASE_GENRE_IDS))
+    if genre_ids != _layout.genre_ids:
+        _layout = FeatureLayout(genre_ids)
+        logger.info(f"Feature layout now has {len(_layout.genre_ids)} genres ({_layout.signature}).")
+    return _layout
+
+
+def _year(release_date):
+    """Year from a date, 'YYYY-MM-DD' string or None"""
+    if not release_date:
+        return None
+    if hasattr(release_date, 'year'):
+        return release_date.year
+    try:
+        return int(str(release_date)[:4])
+    except ValueError:
+        return None
+
+
+def movie_features(genre_ids, release_date, vote_average, out=None, layout=None):
+    """
+    One movie's feature row in the given layout (the current one by default).
+
+    Args:
+        genre_ids (list): TMDB genre ids (discover's genre_ids, or ids from Movie.genres).
+        release_date: date, 'YYYY-MM-DD' string or None.
+        vote_average (float): TMDB rating or None.
+        out (np.ndarray): Optional zeroed row to fill in place.
+    """
+    layout = layout or feature_layout()
+    row = np.zeros(layout.count, dtype=np.float32) if out is None else out
+    for genre_id in genre_ids or []:
+        index = layout.genre_index.get(genre_id)
+        if index is not None:
+            row[index] = 1.0
+    year = _year(release_date)
+    if year:
+        decade = min(max(year // 10 * 10, DECADES[0]), DECADES[-1])
+        row[layout.decade_offset + DECADES.index(decade)] = 1.0
+    if vote_average:
+        row[layout.rating_offset + int(np.searchsorted(RATING_EDGES, vote_average, side='right'))] = 1.0
+    return row
+
+
+def feature_matrix(movies, layout=None):
+    """Stacks discover result dicts into an (n, layout.count) matrix"""
+    layout = layout or feature_layout()
+    matrix = np.zeros((len(movies), layout.count), dtype=np.float32)
+    for i, movie in enumerate(movies):
+        movie_features(movie.get('genre_ids'), movie.get('release_date'), movie.get('vote_average'), out=matrix[i], layout=layout)
+    return matrix
+
+
+def _movie_row(genres, release_date, vote_average, layout):
+    """Feature row for a movie's stored genres (Movie.genres dicts), release date and rating"""
+    genre_ids = [genre.get('id') for genre in (genres or []) if isinstance(genre, dict)]
+    return movie_features(genre_ids, release_date, vote_average, layout=layout)
+
+
+def _rebuild(user_id, layout):
+    """
+    Builds a user's taste vector from their hearts and watchlist (only when it's missing
+    or was built with another layout).
+    """
+    # Read and write in one transaction so no update_taste() can slip in between
+    with transaction.atomic():
+        vector = np.zeros(layout.count, dtype='<f4')
+        states = (UserMovieState.objects.filter(user_id=user_id)
+                  .filter(Q(heart_at__isnull=False) | Q(watchlist_at__isnull=False))
+                  .values_list('heart_at', 'watchlist_at', 'movie__genres', 'movie__release_date', 'movie__vote_average'))
+        for heart_at, watchlist_at, genres, release_date, vote_average in states.iterator():
+            weight = (INTERACTION_WEIGHTS['heart'] if heart_at else 0.0) + (INTERACTION_WEIGHTS['watchlist'] if watchlist_at else 0.0)
+            vector += weight * _movie_row(genres, release_date, vote_average, layout)
+        UserTasteVector.objects.update_or_create(user_id=user_id, defaults={
+            'vector': vector.astype('<f4').tobytes(), 'layout': layout.signature})
+    logger.info(f"Built taste vector for user {user_id} from their interactions.")
+    return vector
+
+
+def get_taste_vector(user_id, layout=None):
+    """The user's taste vector, or None if they haven't hearted or watchlisted anything yet"""
+    layout = layout or feature_layout()
+    row = UserTasteVector.objects.filter(user_id=user_id).values_list('vector', 'layout').first()
+    if row is None or row[1] != layout.signature:
+        vector = _rebuild(user_id, layout)
+    else:
+        vector = np.frombuffer(bytes(row[0]), dtype='<f4')
+    return vector if vector.shape == (layout.count,) and vector.any() else None
+
+
+def update_taste(user_id, movie, interaction_types, sign=1):
+    """
+    Adds (sign=1) or removes (sign=-1) a movie's features for the given interaction types.
+
+    Called on every heart/watchlist write and removal, so the vector never has to be
+    rebuilt from the interaction history. Users without a vector in the current layout
+    are skipped, theirs is built from their states (including this write) on first read.
+    """
+    weight = sign * sum(INTERACTION_WEIGHTS.get(t, 0.0) for t in interaction_types)
+    if not weight:
+        return
+    layout = feature_layout()
+    with transaction.atomic():
+        taste = UserTasteVector.objects.select_for_update().filter(user_id=user_id).first()
+        if taste is None or taste.layout != layout.signature:
+            return
+        current = np.frombuffer(bytes(taste.vector), dtype='<f4')
+        row = _movie_row(movie.genres, movie.release_date, movie.vote_average, layout)
+        updated = np.maximum(current + weight * row, 0).astype('<f4') # removals can't push below zero
+        taste.vector = updated.tobytes()
+        taste.save(update_fields=['vector', 'updated_at'])
+
+
+def rank_candidates(user_id, movies, exploration=None):
+    """
+    Orders discover results by cosine similarity to the user's taste vector.
+
+    A random bonus of up to `exploration` keeps some variety in the order. Without a
+    taste vector yet, the order is just shuffled.
+
+    Args:
+        movies (list): Discover result dicts.
+
+    Returns:
+        list: TMDB ids, best match first.
+    """
+    ids = [movie['id'] for movie in movies]
+    layout = feature_layout()
+    taste = get_taste_vector(user_id, layout)
+    if taste is None or not ids:
+        random.shuffle(ids)
+        return ids
+
+    exploration = getattr(settings, 'TASTE_EXPLORATION', 0.15) if exploration is None else exploration
+    matrix = feature_matrix(movies, layout)
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(taste)
+    scores = np.divide(matrix @ taste, norms, out=np.zeros(len(ids), dtype=np.float32), where=norms > 0)
+    scores += np.random.default_rng().uniform(0, exploration, len(ids)).astype(np.float32)
+    order = np.argsort(-scores, kind='stable')
+    return [ids[i] for i in order]
@@ -1,15 +1,31 @@
 import requests
 import logging
+import time
 from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
 from ..models import Movie
+from .response_cache import TMDBResponseCache
+from .single_flight import SingleFlight, WorkerLease
+from .rate_limiter import TMDBRateLimiter, RateLimiterError, parse_retry_after, backoff_delay
+from .genre_registry import genre_registry
+from .http_client import get_http_client
 
 logger = logging.getLogger(__name__) # Print bad for AWS, logger instead :D
 
 class TMDBServiceError(Exception): # Trying funky exception handling
-    pass
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code # HTTP status when TMDB answered with an error
+
+# One cache and limiter per process, their state is shared through the db
+response_cache = TMDBResponseCache()
+rate_limiter = TMDBRateLimiter()
+single_flight = SingleFlight() # coalesces identical in-flight requests across every TMDBService in the process
 
 class TMDBService:
     BASE_URL = "https://api.themoviedb.org/3"
+    RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
     
     def __init__(self):
         # We will need to switch this to that environment variable thing too I think
@@ -18,45 +34,142 @@ class TMDBService:
             logger.error("TMDB_API_KEY not found in settings.")
             self.api_key = None
 
-        self.session = requests.Session()
+        # Every service in the process shares one pooled keep-alive session
+        self.http_client = get_http_client()
+        self.session = self.http_client.session
+        self.BASE_URL = getattr(settings, 'TMDB_BASE_URL', self.BASE_URL).rstrip('/')
+        self.connect_timeout = self.http_client.connect_timeout
+        self.read_timeout = self.http_client.read_timeout
+        self.cache = response_cache if getattr(settings, 'TMDB_CACHE_ENABLED', True) else None
+        self.details_ttl = getattr(settings, 'MOVIE_DETAILS_TTL', 60 * 60 * 24 * 3)
+        self.limiter = rate_limiter
+        self.single_flight = single_flight
+        self.worker_lease = WorkerLease(wait=self.read_timeout) if getattr(settings, 'TMDB_COALESCE_ACROSS_WORKERS', False) else None
+        self.max_retries = getattr(settings, 'TMDB_MAX_RETRIES', 3)
+        self.retry_backoff = getattr(settings, 'TMDB_RETRY_BACKOFF', 0.5)
+        self.retry_backoff_max = getattr(settings, 'TMDB_RETRY_BACKOFF_MAX', 8)
+
+    def _send(self, endpoint, params=None, headers=None):
+        """
+        Sends a GET to the TMDB API and returns the raw response (2xx or 304).
+
+        Every attempt takes a token from the shared rate limiter. 429s, 5xx, timeouts and
+        connection errors are retried with jittered exponential backoff (a Retry-After
+        header makes every worker hold off) and count towards the circuit breaker.
+
+        Raises:
+            TMDBServiceError: When retries run out, on other HTTP errors, or while the circuit is open.
+        """
+        url = f"{self.BASE_URL}/{endpoint}"
+        request_params = dict(params or {}, api_key=self.api_key)
+        attempt = 0
+        while True:
+            try:
+                self.limiter.reserve()
+            except RateLimiterError as e:
+                logger.warning(f"Not calling TMDB for {url}: {e}")
+                raise TMDBServiceError(f"API request skipped: {e}") from e
+
+            try:
+                response = self.session.get(url, params=request_params, headers=headers,
+                                            timeout=(self.connect_timeout, self.read_timeout))
+                self.http_client.flush_counters()
+                response.raise_for_status() # raises errors, handled below
+                self.limiter.record_success()
+                return response
+            except requests.exceptions.Timeout as e:
+                logger.error(f"TMDB API request timed out for {url} (connect {self.connect_timeout}s, read {self.read_timeout}s).")
+                error, cause = TMDBServiceError(f"API request timed out: {url}"), e
+            except requests.exceptions.HTTPError as e:
+                 # Log specific HTTP errors
+                 status_code = e.response.status_code
+                 logger.error(f"TMDB API HTTP error for {url}: Status={status_code}, Response={e.response.text[:200]}...")
+                 error, cause = TMDBServiceError(f"API HTTP error {status_code} for {url}", status_code=status_code), e
+                 if status_code not in self.RETRYABLE_STATUSES:
+                     raise error from e
+                 retry_after = parse_retry_after(e.response.headers.get('Retry-After'))
+                 if retry_after is not None:
+                     self.limiter.block_for(retry_after) # reserve() makes everyone wait this out
+            except requests.exceptions.RequestException as e:
+                # Catch other potential request errors
+                logger.error(f"TMDB API request failed for {url}: {e}")
+                error, cause = TMDBServiceError(f"API request failed: {e}"), e
+
+            self.limiter.record_failure()
+            if attempt >= self.max_retries:
+                raise error from cause
+            delay = backoff_delay(attempt, self.retry_backoff, self.retry_backoff_max)
+            attempt += 1
+            logger.info(f"Retrying {url} in {delay:.2f}s (attempt {attempt + 1} of {self.max_retries + 1}).")
+            time.sleep(delay)
+
+    def _decode(self, response):
+        """Parses a TMDB response body as JSON"""
+        try:
+            return response.json()
+        except ValueError as e:
+             logger.error(f"Failed to decode JSON response for {response.url}: {e}")
+             raise TMDBServiceError(f"Invalid JSON response from {response.url}") from e
     
-    def _make_request(self, endpoint, params=None):
-        """Make a request to the TMDB API"""
+    def _make_request(self, endpoint, params=None, use_cache=True):
+        """Make a request to the TMDB API, answering from the response cache when possible"""
         if not self.api_key:
             # If API key wasn't loaded, log error and return None
             logger.error("TMDB API key is missing. Cannot make request.")
             return None
 
-        if params is None:
-            params = {}
-        
-        params['api_key'] = self.api_key
-        
-        url = f"{self.BASE_URL}/{endpoint}"
+        params = dict(params) if params else {}
+        cache = self.cache if use_cache else None
+
+        if cache:
+            hit, status_code, payload = cache.get(endpoint, params)
+            if hit:
+                if status_code == 404:
+                    logger.debug(f"TMDB cache negative hit for {endpoint}")
+                    raise TMDBServiceError(f"API HTTP error 404 for {endpoint} (cached)", status_code=404)
+                logger.debug(f"TMDB cache hit for {endpoint}")
+                return payload
+
+        # Identical concurrent misses share one upstream call
+        key = TMDBResponseCache.make_key(endpoint, params)
+        return self.single_flight.do(key, lambda: self._fetch(endpoint, params, cache, key))
+
+    def _cached_payload(self, cache, endpoint, params):
+        """Response cache lookup for coalescing followers, None until the leader has stored it"""
+        hit, status_code, payload = cache.get(endpoint, params, record=False)
+        if hit and status_code == 404:
+            raise TMDBServiceError(f"API HTTP error 404 for {endpoint} (cached)", status_code=404)
+        return payload if hit else None
+
+    def _fetch(self, endpoint, params, cache, key):
+        """Fetches from TMDB and fills the response cache, run once per key at a time"""
+        leased = False
+        if cache and self.worker_lease:
+            leased = self.worker_lease.claim(key)
+            if not leased:
+                # Another worker is already fetching this, wait for it to land in the cache
+                payload = self.worker_lease.wait_for(lambda: self._cached_payload(cache, endpoint, params))
+                if payload is not None:
+                    return payload
         try:
-            response = self.session.get(url, params=params, timeout=10) # temp timeout of 10
-            response.raise_for_status() # raises errors, handled below
-            return response.json()
-        except requests.exceptions.Timeout:
-            logger.error(f"TMDB API request timed out for {url} after {self.REQUEST_TIMEOUT} seconds.")
-            raise TMDBServiceError(f"API request timed out: {url}") from None
-        except requests.exceptions.HTTPError as e:
-             # Log specific HTTP errors
-             logger.error(f"TMDB API HTTP error for {url}: Status={e.response.status_code}, Response={e.response.text[:200]}...")
-             raise TMDBServiceError(f"API HTTP error {e.response.status_code} for {url}") from e
-        except requests.exceptions.RequestException as e:
-            # Catch other potential request errors
-            logger.error(f"TMDB API request failed for {url}: {e}")
-            raise TMDBServiceError(f"API request failed: {e}") from e
-        except ValueError as e:
-             logger.error(f"Failed to decode JSON response for {url}: {e}")
-             raise TMDBServiceError(f"Invalid JSON response from {url}") from e
+            try:
+                response = self._send(endpoint, params)
+            except TMDBServiceError as e:
+                if cache and e.status_code == 404:
+                    cache.set(endpoint, params, None, status_code=404) # negative cache, id is gone
+                raise
+            data = self._decode(response)
+            if cache:
+                cache.set(endpoint, params, data)
+            return data
+        finally:
+            if leased:
+                self.worker_lease.release(key)
 
     
-    def discover_movies(self, filters=None, page=1):
-        """Gets list of movies based on filters"""
-        params = {'page': page,
-                  'sort_by': 'popularity.desc',
+    def _discover_params(self, filters=None):
+        """Builds discover/movie params (minus the page) for a UserFilter or None"""
+        params = {'sort_by': 'popularity.desc',
                   'include_adult': 'false',
                   'include_video': 'false',
                   'with_original_language': 'en',
@@ -66,8 +179,8 @@ class TMDBService:
         if filters:
             genre_ids_list = getattr(filters, 'genre_ids', None)
             if isinstance(genre_ids_list, list) and genre_ids_list:
-                # Filter out empty strings if any
-                valid_genre_ids = [gid for gid in genre_ids_list if gid]
+                # Filter out empty strings if any, sorted so equal filter sets build equal params
+                valid_genre_ids = sorted({str(gid) for gid in genre_ids_list if gid})
                 if valid_genre_ids:
                     params['with_genres'] = ','.join(valid_genre_ids)
             
@@ -79,6 +192,21 @@ class TMDBService:
 
             min_rating = getattr(filters, 'min_rating', None)
             if min_rating: params['vote_average.gte'] = min_rating
+        return params
+
+    def filter_signature(self, filters=None):
+        """
+        Canonical string for a filter set, equal for users with equivalent filters.
+
+        Genre ids are sorted in _discover_params, so ['28', '12'] and ['12', '28'] match.
+        """
+        params = self._discover_params(filters)
+        return '&'.join(f"{k}={v}" for k, v in sorted(params.items()))
+
+    def discover_movies(self, filters=None, page=1):
+        """Gets list of movies based on filters"""
+        params = self._discover_params(filters)
+        params['page'] = page
         
         # Fetch movies from discovery endpoint
         try:
@@ -117,16 +245,157 @@ class TMDBService:
             # Logged in _make_request, return empty list to calling function
              return [], 0
     
-    def get_movie_details(self, movie_id):
-        """Get information about a specific movie"""
+    def get_movie_details(self, movie_id, max_age=None):
+        """
+        Get information about a specific movie (with credits).
+
+        Served from the detail payload stored on the Movie row while it's fresher than
+        max_age seconds (MOVIE_DETAILS_TTL by default). Stale payloads are revalidated with
+        If-None-Match, so an unchanged movie costs a bodyless 304 instead of a full download.
+        """
+        max_age = self.details_ttl if max_age is None else max_age
+        stored = Movie.objects.filter(tmdb_id=movie_id).values('details', 'details_etag', 'details_fetched_at').first()
+        if stored and stored['details'] and stored['details_fetched_at']:
+            age = (timezone.now() - stored['details_fetched_at']).total_seconds()
+            if age < max_age:
+                return stored['details']
+        if not self.api_key:
+            logger.error("TMDB API key is missing. Cannot make request.")
+            return stored['details'] if stored else None
+
+        endpoint = f"movie/{movie_id}"
         params = {'append_to_response': 'credits'} # get more details in details.html
+        if not stored and self.cache:
+            # A dead id is remembered by the response cache so it isn't asked for again
+            hit, status_code, _ = self.cache.get(endpoint, params)
+            if hit and status_code == 404:
+                return None
+
+        return self.single_flight.do(f"details:{movie_id}", lambda: self._fetch_details(movie_id, endpoint, params, stored))
+
+    def _fetch_details(self, movie_id, endpoint, params, stored):
+        """Downloads or revalidates one movie's details, run once per movie at a time"""
+        leased = False
+        if self.worker_lease:
+            lease_key = f"details:{movie_id}"
+            leased = self.worker_lease.claim(lease_key)
+            if not leased:
+                # Another worker is fetching this movie, wait for it to reach the store
+                started = timezone.now()
+                data = self.worker_lease.wait_for(lambda: Movie.objects.filter(
+                    tmdb_id=movie_id, details_fetched_at__gte=started).values_list('details', flat=True).first())
+                if data is not None:
+                    return data
+
+        etag = stored['details_etag'] if stored and stored['details'] else None
         try:
-            data = self._make_request(f"movie/{movie_id}", params=params)
-            return data
-        except TMDBServiceError:
-            # Logged in _make_request
-            return None
-    
+            response = self._send(endpoint, params, headers={'If-None-Match': etag} if etag else None)
+            if response.status_code == 304:
+                logger.debug(f"Stored details for movie {movie_id} revalidated (304).")
+                Movie.objects.filter(tmdb_id=movie_id).update(details_fetched_at=timezone.now())
+                return stored['details']
+            data = self._decode(response)
+        except TMDBServiceError as e:
+            # Logged in _send
+            if e.status_code == 404 and self.cache:
+                self.cache.set(endpoint, params, None, status_code=404)
+            # Stale details beat no details when TMDB is struggling
+            return stored['details'] if stored and e.status_code != 404 else None
+        finally:
+            if leased:
+                self.worker_lease.release(lease_key)
+
+        self._store_details(data, response.headers.get('ETag'))
+        return data
+
+    def _store_details(self, data, etag=None):
+        """
+        Saves a detail payload next to its Movie row, creating the row from the payload if needed.
+
+        Written in one upsert rather than through get_or_create_movie, which can fetch details
+        itself and would re-enter the single-flight call this runs under.
+        """
+        if not data or not data.get('id'):
+            return
+        movie = Movie(
+            tmdb_id=data['id'],
+            title=(data.get('title') or '')[:255],
+            poster_path=data.get('poster_path'),
+            overview=data.get('overview'),
+            release_date=data.get('release_date') or None,
+            vote_average=data.get('vote_average'),
+            vote_count=data.get('vote_count'),
+            popularity=data.get('popularity'),
+            genres=data.get('genres') or None,
+            details=data,
+            details_etag=etag,
+            details_fetched_at=timezone.now(),
+        )
+        update_fields = ['details', 'details_etag', 'details_fetched_at']
+        if movie.genres:
+            update_fields.append('genres') # an empty list doesn't wipe stored genres
+        try:
+            Movie.objects.bulk_create([movie], update_conflicts=True, unique_fields=['tmdb_id'], update_fields=update_fields)
+        except Exception as e:
+            logger.exception(f"Failed to store details for movie {data.get('id')}: {e}")
+
+    # Columns a discover result can refresh on an existing row, details/etc. are left alone
+    UPSERT_FIELDS = ['title', 'poster_path', 'overview', 'release_date', 'vote_average', 'vote_count', 'popularity']
+
+    def upsert_movies(self, tmdb_results, catalog_synced_at=None):
+        """
+        Inserts or updates a whole list of discover results, in at most two statements.
+
+        Genres are resolved from each result's genre_ids through the genre registry,
+        so no per-movie detail requests are needed. Rows whose genres didn't resolve (e.g.
+        while the registry is still empty) keep the genres already stored on them.
+
+        Args:
+            tmdb_results (list): Discover/popular result dicts.
+            catalog_synced_at (datetime): If given, rows are also marked as part of the local catalog.
+
+        Returns:
+            list: The unsaved Movie instances that were written (tmdb_id is set, pk may not be).
+        """
+        movies = {}
+        for data in tmdb_results or []:
+            if not data or not data.get('id') or not data.get('title'):
+                continue
+            movies[data['id']] = Movie(
+                tmdb_id=data['id'],
+                title=data['title'][:255],
+                poster_path=data.get('poster_path'),
+                overview=data.get('overview'),
+                release_date=data.get('release_date') or None,
+                vote_average=data.get('vote_average'),
+                vote_count=data.get('vote_count'),
+                popularity=data.get('popularity'),
+                genres=data.get('genres') or genre_registry.resolve(data.get('genre_ids')) or None,
+                catalog_synced_at=catalog_synced_at,
+            )
+        if not movies:
+            return []
+
+        update_fields = list(self.UPSERT_FIELDS)
+        if catalog_synced_at:
+            update_fields.append('catalog_synced_at')
+        # Rows without resolved genres are written without touching the stored ones
+        with_genres = [movie for movie in movies.values() if movie.genres]
+        without_genres = [movie for movie in movies.values() if not movie.genres]
+        try:
+            with transaction.atomic():
+                if with_genres:
+                    Movie.objects.bulk_create(with_genres, update_conflicts=True,
+                                              unique_fields=['tmdb_id'], update_fields=update_fields + ['genres'])
+                if without_genres:
+                    Movie.objects.bulk_create(without_genres, update_conflicts=True,
+                                              unique_fields=['tmdb_id'], update_fields=update_fields)
+        except Exception as e:
+            logger.exception(f"Bulk upsert of {len(movies)} movies failed: {e}")
+            return []
+        logger.debug(f"Upserted {len(movies)} movies ({len(without_genres)} keeping their stored genres).")
+        return list(movies.values())
+
     def get_or_create_movie(self, tmdb_movie_data):
         """Create or update a movie in the sqlite django thing from TMDB data"""
         if not tmdb_movie_data or 'id' not in tmdb_movie_data:
@@ -143,11 +412,17 @@ class TMDBService:
                     'release_date': tmdb_movie_data.get('release_date') if tmdb_movie_data.get('release_date') else None,
                     'vote_average': tmdb_movie_data.get('vote_average'),
                     'vote_count': tmdb_movie_data.get('vote_count'),
-                    'genres': tmdb_movie_data.get('genres', None) # this may be deleted, used for funky watchlist genre thing that may not work
+                    # Detail payloads carry genres, discover payloads only genre_ids which the registry can name
+                    'genres': tmdb_movie_data.get('genres') or genre_registry.resolve(tmdb_movie_data.get('genre_ids')) or None
                 }
             )
             if created:
                 logger.info(f"Created new movie in DB: {movie.title} (TMDB ID: {movie.tmdb_id})")
+            if not movie.genres and tmdb_movie_data.get('genre_ids'):
+                resolved_genres = genre_registry.resolve(tmdb_movie_data['genre_ids'])
+                if resolved_genres:
+                    movie.genres = resolved_genres
+                    movie.save(update_fields=['genres'])
             if not movie.genres:
                 logger.info(f"Genres missing for movie '{movie.title}' (TMDB ID: {movie.tmdb_id}). Fetching details...")
                 try:
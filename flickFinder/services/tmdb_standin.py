@@ -0,0 +1,197 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl
+from .response_cache import TMDBResponseCache
+
+logger = logging.getLogger(__name__)
+
+NOT_FOUND = {'success': False, 'status_code': 34, 'status_message': 'The resource you requested could not be found.'}
+UNAVAILABLE = {'success': False, 'status_code': 43, 'status_message': 'Service unavailable, injected by the stand-in.'}
+RATE_LIMITED = {'success': False, 'status_code': 25, 'status_message': 'Request count is over the allowed limit.'}
+
+_MOVIE_ID = re.compile(r'^movie/(\d+)$')
+
+
+def endpoint_template(endpoint):
+    """movie/603 -> movie/{id}, everything else unchanged"""
+    return 'movie/{id}' if _MOVIE_ID.match(endpoint) else endpoint
+
+
+class FixtureStore:
+    """
+    Recorded TMDB responses, one JSON file per request:
+
+        {"endpoint": "discover/movie", "params": {"page": "1", ...}, "status": 200, "body": {...}}
+
+    Lookups match endpoint + params exactly (api_key ignored, same key as the response
+    cache). A miss falls back to another recording of the same endpoint, picked stably
+    from the request, with the page or movie id rewritten to what was asked for. That
+    keeps random page sampling and arbitrary detail ids working off a small recording.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.exact = {}
+        self.by_template = defaultdict(list)
+        if directory and os.path.isdir(directory):
+            for name in sorted(os.listdir(directory)):
+                if name.endswith('.json'):
+                    with open(os.path.join(directory, name), encoding='utf-8') as f:
+                        self.add(json.load(f))
+
+    def __len__(self):
+        return len(self.exact)
+
+    def add(self, fixture):
+        key = TMDBResponseCache.make_key(fixture['endpoint'], fixture.get('params'))
+        self.exact[key] = fixture
+        if fixture.get('status', 200) == 200:
+            self.by_template[endpoint_template(fixture['endpoint'])].append(fixture)
+
+    def lookup(self, endpoint, params):
+        """
+        Returns:
+            tuple: (status, body, how) where how is 'exact', 'fallback' or 'missing'.
+        """
+        key = TMDBResponseCache.make_key(endpoint, params)
+        fixture = self.exact.get(key)
+        if fixture:
+            return fixture.get('status', 200), fixture['body'], 'exact'
+
+        candidates = self.by_template.get(endpoint_template(endpoint))
+        if not candidates:
+            return 404, NOT_FOUND, 'missing'
+        fixture = candidates[int(key[:8], 16) % len(candidates)]
+        body = dict(fixture['body'])
+        movie_id = _MOVIE_ID.match(endpoint)
+        if movie_id:
+            body['id'] = int(movie_id.group(1))
+        elif 'page' in body and params.get('page'):
+            body['page'] = int(params['page'])
+        return 200, body, 'fallback'
+
+    @staticmethod
+    def save(directory, endpoint, params, status, body):
+        """Writes one recording, named so related files sort together"""
+        os.makedirs(directory, exist_ok=True)
+        params = {k: str(v) for k, v in (params or {}).items() if k != 'api_key'}
+        key = TMDBResponseCache.make_key(endpoint, params)
+        path = os.path.join(directory, f"{endpoint.replace('/', '_')}__{key[:12]}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'endpoint': endpoint, 'params': params, 'status': status, 'body': body}, f)
+        return path
+
+
+class TMDBStandinServer(ThreadingHTTPServer):
+    """
+    Local stand-in for the TMDB endpoints TMDBService uses, serving a FixtureStore.
+
+    Point TMDB_BASE_URL at `url` to use it. Every response is delayed by `latency` +/-
+    `jitter` seconds; `error_rate` of requests get a 503 and `rate_limit_rate` a 429 with
+    Retry-After. Movie details carry an ETag and answer If-None-Match with a 304, like TMDB.
+    """
+    daemon_threads = True
+
+    def __init__(self, fixtures, host='127.0.0.1', port=0, latency=0.0, jitter=0.0,
+                 error_rate=0.0, rate_limit_rate=0.0, retry_after=1, seed=None):
+        super().__init__((host, port), _StandinHandler)
+        self.fixtures = fixtures
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.stats = Counter()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}/3"
+
+    def start(self):
+        """Serves on a background thread, for tests and benchmarks"""
+        self._thread = threading.Thread(target=self.serve_forever, name='tmdb-standin', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def roll(self):
+        """Picks the delay and any injected error for one request"""
+        with self._lock:
+            delay = max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+            chance = self.random.random()
+        if chance < self.rate_limit_rate:
+            return delay, 429
+        if chance < self.rate_limit_rate + self.error_rate:
+            return delay, 503
+        return delay, None
+
+    def count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+
+class _StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # keep-alive, like the real API
+
+    def do_GET(self):
+        server = self.server
+        url = urlsplit(self.path)
+        endpoint = url.path.strip('/')
+        if endpoint.startswith('3/'):
+            endpoint = endpoint[2:]
+        params = {k: v for k, v in parse_qsl(url.query) if k != 'api_key'}
+
+        delay, injected = server.roll()
+        if delay:
+            time.sleep(delay)
+        if injected == 429:
+            server.count('injected_429')
+            return self._reply(429, RATE_LIMITED, {'Retry-After': str(server.retry_after)})
+        if injected == 503:
+            server.count('injected_503')
+            return self._reply(503, UNAVAILABLE)
+
+        status, body, how = server.fixtures.lookup(endpoint, params)
+        server.count(how)
+        headers = {}
+        if status == 200 and _MOVIE_ID.match(endpoint):
+            etag = '"' + hashlib.sha1(json.dumps(body, sort_keys=True).encode('utf-8')).hexdigest()[:16] + '"'
+            headers['ETag'] = etag
+            if self.headers.get('If-None-Match') == etag:
+                server.count('not_modified')
+                return self._reply(304, None, headers)
+        self._reply(status, body, headers)
+
+    def _reply(self, status, body, headers=None):
+        raw = json.dumps(body).encode('utf-8') if body is not None else b''
+        self.send_response(status)
+        if body is not None:
+            self.send_header('Content-Type', 'application/json;charset=utf-8')
+        self.send_header('Content-Length', str(len(raw)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def log_message(self, format, *args):
+        logger.debug(f"tmdb stand-in: {format % args}")
@@ -30,7 +30,11 @@
       DECISION: 80,         // px - threshold to trigger action
       FADE_OUT: 200,        // ms - fade-out current card
       FADE_IN : 300,        // ms - fade-in new card
-      DELAY   : 300         // ms - wait after swipe / before swap
+      DELAY   : 300,        // ms - wait after swipe / before swap
+      BATCH   : 3,          // swipes sent per batch request
+      QUEUE   : 4,          // upcoming cards kept locally
+      LOW     : 1,          // send early when this few cards are left
+      WAIT    : 2000        // ms - send a partial batch after this long
     };
   
     // URLs injected index.html
@@ -59,7 +63,14 @@
         dx            : 0,
         transitioning : false,
         swiped        : false,
-        nextMovie     : null
+        nextMovie     : null,
+        pending       : [],     // swipes not sent yet, in order
+        queue         : [],     // upcoming movies from the server
+        inflight      : false,
+        waiting       : false,  // a card was swiped with nothing queued behind it
+        exhausted     : null,   // end-of-line message once the server runs out
+        timer         : null,
+        gen           : 0       // bumped on filter changes, stale batch replies are ignored
     };
     function shouldBlockLink() {
         return st.dragging || st.swiped || st.transitioning;
@@ -190,19 +201,49 @@
         enableUI();
     };
   
-    /* ajax calls */
-    const interact = (id, act) => {
-        if (!URLS.movieInteraction) return console.error('movieInteraction URL missing');
-        $.post(URLS.movieInteraction, {
-            movie_id: id,
-            interaction_type: act,
-            csrfmiddlewaretoken: csrf()
+    /* ajax calls, swipes are batched: cards come from st.queue, swipes go out a few at a time */
+    const showQueued = () => {
+        if (st.queue.length) { st.waiting = false; prepareNext(st.queue.shift()); setTimeout(swapCard,cfg.DELAY); }
+        else if (st.exhausted) { st.waiting = false; endOfLine(st.exhausted); }
+    };
+    const flush = () => {
+        clearTimeout(st.timer);
+        if (st.inflight || !st.pending.length) return;
+        if (!URLS.interactionBatch) return console.error('interactionBatch URL missing');
+        const swipes = st.pending.splice(0), gen = st.gen;
+        st.inflight = true;
+        $.ajax({
+            url: URLS.interactionBatch, type: 'POST', contentType: 'application/json',
+            data: JSON.stringify({swipes, want: st.exhausted ? 0 : Math.max(0, cfg.QUEUE - st.queue.length)})
         }).done(res=>{
-            const map={watchlist:'Added to Watchlist',heart:'Favorited',skip:'Skipped',block:'Blocked'};
-            feedback(map[act]||'Recorded');
-            if(res.status==='success' && res.next_movie){prepareNext(res.next_movie);setTimeout(swapCard,cfg.DELAY);} else {endOfLine(res.message);}  
-        }).fail(()=>{alert('Error, please try again.');window.movieSwipe?.resetCardPosition?.();enableUI();});
+            if (gen !== st.gen) return;
+            const known = new Set([st.id, ...st.queue.map(m=>m.id)]);
+            st.queue.push(...(res.next_movies||[]).filter(m=>!known.has(m.id)));
+            if (res.status==='no_more_movies') st.exhausted = res.message;
+            if (st.waiting) showQueued();
+        }).fail(()=>{
+            st.pending.unshift(...swipes); // keep them for the next try
+            if (st.waiting) {alert('Error, please try again.');st.waiting=false;window.movieSwipe?.resetCardPosition?.();enableUI();}
+        }).always(()=>{
+            st.inflight = false;
+            if (st.pending.length && (st.waiting || st.pending.length >= cfg.BATCH)) flush();
+        });
     };
+    const interact = (id, act) => {
+        const map={watchlist:'Added to Watchlist',heart:'Favorited',skip:'Skipped',block:'Blocked'};
+        feedback(map[act]||'Recorded');
+        st.pending.push({movie_id: id, interaction_type: act});
+        st.waiting = true;
+        showQueued();
+        if (st.waiting || st.pending.length >= cfg.BATCH || st.queue.length <= cfg.LOW) flush();
+        else { clearTimeout(st.timer); st.timer = setTimeout(flush, cfg.WAIT); }
+    };
+    // Don't lose queued swipes when leaving the page
+    window.addEventListener('pagehide', () => {
+        if (!st.pending.length || !URLS.interactionBatch) return;
+        fetch(URLS.interactionBatch, {method:'POST', keepalive:true, headers:{'Content-Type':'application/json','X-CSRFToken':CSRF_TOKEN},
+            body: JSON.stringify({swipes: st.pending.splice(0), want: 0})});
+    });
   
     /* button clicks */
     $doc.on('click','.action-btn',function(){
@@ -217,6 +258,8 @@
     els.saveBtn.on('click',function(){
         if(!URLS.saveFilters){console.error('saveFilters URL missing');return;}
         const $btn=$(this);
+        flush(); // record swipes made under the old filters
+        st.queue=[]; st.exhausted=null; st.gen++;
         disableUI();
         $btn.html('<i class="fas fa-spinner fa-spin"></i>');
     
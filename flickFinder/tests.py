@@ -1,6 +1,20 @@
 from django.test import TestCase,LiveServerTestCase
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import User
+from django.db import connection
+from django.utils import timezone
 from django.contrib.staticfiles.testing import StaticLiveServerTestCase
 import time
+import json
+import os
+import shutil
+import signal
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+import numpy as np
 # Create your tests here.
 # Generated by Selenium IDE
 
@@ -14,6 +28,26 @@ from selenium.webdriver.common.desired_capabilities import DesiredCapabilities
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.firefox.options import Options
 
+from flickFinder.models import (CandidatePool, InteractionEvent, Movie, MovieEmbedding, RecommendationBuffer, TMDBCacheEntry,
+                                UserExclusionSet, UserMovieState, UserTasteVector)
+from flickFinder.services.block_sweeper import release_expired_blocks
+from flickFinder.services.candidate_pool import CandidatePoolStore
+from flickFinder.services.exclusions import ExclusionSet, load_exclusions, record_exclusions
+from flickFinder.services.genre_registry import genre_registry
+from flickFinder.services.http_client import TMDBHttpClient, pool_stats
+from flickFinder.services.id_queue import PackedIdQueue, pack_ids, unpack_ids
+from flickFinder.services.interaction_stats import load_stats, reconcile_stats
+from flickFinder.services.interaction_writer import InteractionLog, PendingInteraction, record_interaction
+from flickFinder.services.item_similarity import ItemSimilarityIndex, build_similarity, save_similarity
+from flickFinder.services import movie_embeddings
+from flickFinder.services.page_sampler import PageSampler
+from flickFinder.services.prefetch import RecommendationPrefetcher
+from flickFinder.services.rate_limiter import TMDBRateLimiter, RateLimiterError, parse_retry_after
+from flickFinder.services.response_cache import DEFAULT_TTL, TMDBResponseCache
+from flickFinder.services import taste
+from flickFinder.services.tmdb_service import TMDBService, TMDBServiceError
+from flickFinder.services.tmdb_standin import FixtureStore, TMDBStandinServer
+
 
 
 
@@ -524,3 +558,873 @@ class TestTestRemove(TestCase):
 
 
 
+
+
+# TMDB rate limiting / retry tests, run against a scripted local HTTP server instead of TMDB
+
+
+class ScriptedTMDBServer:
+    """
+    Local HTTP server that answers each request with the next scripted response.
+
+    Each script entry is (status, body_dict, headers, delay_seconds); the last entry repeats.
+    """
+
+    def __init__(self, script):
+        self.script = list(script)
+        self.hits = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                status, body, headers, delay = server.script[min(server.hits, len(server.script) - 1)]
+                server.hits += 1
+                if delay:
+                    time.sleep(delay)
+                payload = json.dumps(body).encode()
+                try:
+                    self.send_response(status)
+                    for name, value in headers.items():
+                        self.send_header(name, value)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass # client gave up (timeout scenario)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/3"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+OK = (200, {'genres': [{'id': 28, 'name': 'Action'}]}, {}, 0)
+
+
+@override_settings(TMDB_API_KEY='test-key', TMDB_MAX_RETRIES=2, TMDB_RETRY_BACKOFF=0.01,
+                   TMDB_RETRY_BACKOFF_MAX=0.05, TMDB_CIRCUIT_FAILURE_THRESHOLD=3, TMDB_CIRCUIT_COOLDOWN=60)
+class TMDBRetryTests(TestCase):
+    def make_service(self, server):
+        service = TMDBService()
+        service.BASE_URL = server.url
+        service.cache = None # exercise the network path every time
+        service.limiter = TMDBRateLimiter(name='test')
+        return service
+
+    def test_429_with_retry_after_is_retried(self):
+        with ScriptedTMDBServer([(429, {}, {'Retry-After': '1'}, 0), OK]) as server:
+            service = self.make_service(server)
+            started = time.monotonic()
+            data = service._make_request('genre/movie/list')
+        self.assertEqual(data['genres'][0]['name'], 'Action')
+        self.assertEqual(server.hits, 2)
+        self.assertGreaterEqual(time.monotonic() - started, 0.9) # Retry-After was honoured
+
+    def test_5xx_gives_up_after_max_retries(self):
+        with ScriptedTMDBServer([(503, {}, {}, 0)]) as server:
+            service = self.make_service(server)
+            with self.assertRaises(TMDBServiceError) as ctx:
+                service._make_request('genre/movie/list')
+        self.assertEqual(ctx.exception.status_code, 503)
+        self.assertEqual(server.hits, 3) # first try + 2 retries
+
+    def test_timeout_is_retried(self):
+        with ScriptedTMDBServer([(200, {}, {}, 0.5), OK]) as server:
+            service = self.make_service(server)
+            service.read_timeout = 0.1
+            data = service._make_request('genre/movie/list')
+        self.assertIn('genres', data)
+        self.assertEqual(server.hits, 2)
+
+    def test_404_is_not_retried(self):
+        with ScriptedTMDBServer([(404, {'status_message': 'not found'}, {}, 0)]) as server:
+            service = self.make_service(server)
+            self.assertIsNone(service.get_movie_details(12345))
+        self.assertEqual(server.hits, 1)
+
+    def test_details_with_empty_genres_are_stored(self):
+        payload = {'id': 77, 'title': 'No Genres', 'genres': []}
+        with ScriptedTMDBServer([(200, payload, {'ETag': '"v1"'}, 0)]) as server:
+            service = self.make_service(server)
+            # Used to re-enter its own single-flight call and wait on itself forever. A
+            # BaseException so the service's `except Exception` handlers can't swallow it
+            class Hung(BaseException):
+                pass
+            def hung(signum, frame):
+                raise Hung()
+            previous = signal.signal(signal.SIGALRM, hung)
+            signal.alarm(5)
+            try:
+                data = service.get_movie_details(77)
+            except Hung:
+                self.fail("get_movie_details hung")
+            finally:
+                signal.alarm(0)
+                signal.signal(signal.SIGALRM, previous)
+        self.assertEqual(data, payload)
+        movie = Movie.objects.get(tmdb_id=77)
+        self.assertEqual((movie.title, movie.genres, movie.details_etag), ('No Genres', None, '"v1"'))
+        self.assertEqual(server.hits, 1)
+
+    def test_circuit_breaker_fails_fast(self):
+        with ScriptedTMDBServer([(500, {}, {}, 0)]) as server:
+            service = self.make_service(server)
+            with self.assertRaises(TMDBServiceError):
+                service._make_request('genre/movie/list') # 3 failures, circuit opens
+            hits_when_opened = server.hits
+            with self.assertRaises(TMDBServiceError):
+                service._make_request('genre/movie/list')
+        self.assertEqual(hits_when_opened, 3)
+        self.assertEqual(server.hits, hits_when_opened) # second call never reached the server
+
+    def test_success_closes_circuit(self):
+        with ScriptedTMDBServer([(500, {}, {}, 0), (500, {}, {}, 0), OK]) as server:
+            service = self.make_service(server)
+            service._make_request('genre/movie/list')
+        state = service.limiter._state(time.time())
+        self.assertEqual(state.consecutive_failures, 0)
+        self.assertEqual(state.open_until, 0)
+
+
+class TMDBRateLimiterTests(TestCase):
+    def test_bucket_waits_when_empty(self):
+        limiter = TMDBRateLimiter(name='bucket', rate=10, burst=2, max_wait=5)
+        with mock.patch('flickFinder.services.rate_limiter.time.sleep') as sleep:
+            limiter.reserve()
+            limiter.reserve()
+            sleep.assert_not_called()
+            wait = limiter.reserve()
+        self.assertGreater(wait, 0)
+        self.assertLessEqual(wait, 0.1)
+
+    def test_retry_after_window_is_shared(self):
+        TMDBRateLimiter(name='shared').block_for(2)
+        other_worker = TMDBRateLimiter(name='shared')
+        with mock.patch('flickFinder.services.rate_limiter.time.sleep') as sleep:
+            wait = other_worker.reserve()
+        self.assertGreater(wait, 1.5)
+        sleep.assert_called_once()
+
+    def test_long_wait_fails_fast(self):
+        limiter = TMDBRateLimiter(name='slow', max_wait=1)
+        limiter.block_for(30)
+        with self.assertRaises(RateLimiterError):
+            limiter.reserve()
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after('3'), 3.0)
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after('soon'))
+
+
+class TMDBStandinTests(TestCase):
+    def setUp(self):
+        self.fixture_dir = tempfile.mkdtemp()
+        FixtureStore.save(self.fixture_dir, 'discover/movie', {'page': 1, 'sort_by': 'popularity.desc'}, 200,
+                          {'page': 1, 'total_pages': 3, 'results': [{'id': 603, 'title': 'The Matrix'}]})
+        FixtureStore.save(self.fixture_dir, 'movie/603', {'append_to_response': 'credits'}, 200,
+                          {'id': 603, 'title': 'The Matrix', 'credits': {'cast': []}})
+
+    def tearDown(self):
+        shutil.rmtree(self.fixture_dir)
+
+    def test_replays_exact_and_fallback(self):
+        store = FixtureStore(self.fixture_dir)
+        status, body, how = store.lookup('discover/movie', {'page': '1', 'sort_by': 'popularity.desc'})
+        self.assertEqual((status, how), (200, 'exact'))
+        status, body, how = store.lookup('discover/movie', {'page': '2', 'sort_by': 'popularity.desc'})
+        self.assertEqual((status, body['page'], how), (200, 2, 'fallback'))
+        status, body, how = store.lookup('movie/42', {'append_to_response': 'credits'})
+        self.assertEqual((body['id'], how), (42, 'fallback'))
+        self.assertEqual(store.lookup('search/movie', {'query': 'x'})[0], 404)
+
+    @override_settings(TMDB_API_KEY='test-key', TMDB_MAX_RETRIES=3, TMDB_RETRY_BACKOFF=0.01, TMDB_RETRY_BACKOFF_MAX=0.02)
+    def test_service_runs_against_standin(self):
+        with TMDBStandinServer(FixtureStore(self.fixture_dir), error_rate=0.5, seed=1) as server:
+            with override_settings(TMDB_BASE_URL=server.url):
+                service = TMDBService()
+                service.cache = None
+                service.limiter = TMDBRateLimiter(name='standin')
+                data = service._make_request('movie/603', {'append_to_response': 'credits'})
+        self.assertEqual(data['title'], 'The Matrix')
+        self.assertEqual(server.stats['exact'], 1)
+        self.assertEqual(server.stats['injected_503'] + 1, sum(server.stats.values())) # injected errors were retried
+
+    @override_settings(TMDB_API_KEY='test-key')
+    def test_pool_counters_are_shared(self):
+        with TMDBStandinServer(FixtureStore(self.fixture_dir)) as server:
+            with override_settings(TMDB_BASE_URL=server.url):
+                service = TMDBService()
+                service.cache = None
+                service.limiter = TMDBRateLimiter(name='standin')
+                service.http_client = TMDBHttpClient() # counts only this test's requests
+                service.session = service.http_client.session
+                for _ in range(3):
+                    service._make_request('movie/603', {'append_to_response': 'credits'})
+        service.http_client.flush_counters(force=True)
+        service.http_client.flush_counters(force=True) # nothing new to add
+        stats = pool_stats()
+        self.assertEqual((stats['http_requests'], stats['http_connections_opened'], stats['http_reused']), (3, 1, 2))
+        self.assertEqual(stats['http_reuse_rate'], round(2 / 3, 4))
+
+
+class SwipeQueryBudgetTests(TestCase):
+    """Pins how many queries one swipe costs, so the interaction path can't creep back up"""
+
+    # Session + user (2), the write transaction (7: savepoint, event INSERT, state
+    # INSERT ... ON CONFLICT, exclusion row lock and update, stats UPDATE, release), the
+    # queued-movie check (1) and popping the next movie (5: savepoint, lock, head update,
+    # release, details)
+    MAX_QUERIES_PER_SWIPE = 15
+
+    def setUp(self):
+        self.user = User.objects.create_user('swiper', password='pw')
+        for tmdb_id in range(1, 21):
+            Movie.objects.create(tmdb_id=tmdb_id, title=f"Movie {tmdb_id}",
+                                 details={'id': tmdb_id, 'title': f"Movie {tmdb_id}"})
+        # Swiped movies (1-10) were already served, the next ones (11-20) are ready in the buffer
+        RecommendationBuffer.objects.create(user=self.user, ready_data=pack_ids(range(11, 21)))
+        load_exclusions(self.user.id)
+        load_stats(self.user.id)
+        self.client.login(username='swiper', password='pw')
+
+    def swipe(self, movie_id, interaction_type):
+        with mock.patch('flickFinder.views.block_sweeper.start'), CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/interaction/', {'movie_id': movie_id, 'interaction_type': interaction_type})
+        self.assertEqual(response.json()['status'], 'success')
+        return len(queries)
+
+    def test_new_swipe_stays_within_budget(self):
+        self.assertLessEqual(self.swipe(2, 'skip'), self.MAX_QUERIES_PER_SWIPE)
+        self.assertTrue(UserMovieState.objects.filter(user=self.user, movie__tmdb_id=2, skip_at__isnull=False).exists())
+        self.assertEqual(InteractionEvent.objects.filter(user=self.user, movie__tmdb_id=2).count(), 1)
+        stats = load_stats(self.user.id)
+        self.assertEqual((stats.skip_count, stats.total_interactions), (1, 1))
+
+    def test_repeat_swipe_stays_within_budget(self):
+        self.swipe(3, 'block')
+        first = UserMovieState.objects.get(user=self.user, movie__tmdb_id=3)
+        self.assertLessEqual(self.swipe(3, 'block'), self.MAX_QUERIES_PER_SWIPE + 1) # plus the UPDATE of the existing state
+        again = UserMovieState.objects.get(user=self.user, movie__tmdb_id=3)
+        self.assertEqual(first.pk, again.pk)
+        self.assertGreater(again.block_at, first.block_at)
+        self.assertIsNotNone(again.expires_at)
+        self.assertEqual(InteractionEvent.objects.filter(user=self.user, movie__tmdb_id=3).count(), 2) # history is kept
+
+
+class InteractionLogTests(TestCase):
+    """Write-behind log recovery: segments left by a crashed worker are replayed by any flush"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.user = User.objects.create_user('logger', password='pw')
+        self.movies = [Movie.objects.create(tmdb_id=tmdb_id, title=f"Movie {tmdb_id}") for tmdb_id in (1, 2, 3)]
+
+    def log(self):
+        log = InteractionLog(directory=self.directory, interval=60)
+        log.flusher.start = lambda: None # flushed by hand
+        return log
+
+    def swipes(self, *movies):
+        now = timezone.now()
+        return [PendingInteraction(self.user.id, movie.id, movie.tmdb_id, 'skip', now, None) for movie in movies]
+
+    def segments(self):
+        return sorted(name for name in os.listdir(self.directory) if name.startswith('seg-'))
+
+    def test_open_segment_is_not_claimed(self):
+        writer = self.log()
+        writer.append(self.swipes(self.movies[0]))
+        self.assertEqual(self.log().flush(), 0) # still locked by its writer
+        self.assertEqual(len(self.segments()), 1)
+        self.assertFalse([name for name in os.listdir(self.directory) if name.startswith('open-')])
+
+    def test_orphaned_segment_with_torn_last_line_is_replayed(self):
+        crashed = self.log()
+        crashed.append(self.swipes(*self.movies[:2]))
+        path = os.path.join(self.directory, self.segments()[0])
+        crashed._file.close() # the worker dies, its lock goes with it
+        with open(path, 'a') as f:
+            f.write('{"u": 1, "m"') # cut off mid-write
+
+        with self.assertLogs('flickFinder.services.interaction_writer', level='WARNING') as logs:
+            self.assertEqual(self.log().flush(), 2)
+        self.assertTrue(any('torn line' in line for line in logs.output))
+        self.assertEqual(self.segments(), [])
+        self.assertEqual(UserMovieState.objects.filter(user=self.user, skip_at__isnull=False).count(), 2)
+
+    def test_pending_exclusions_dropped_when_another_worker_applies(self):
+        writer = self.log()
+        writer.append(self.swipes(self.movies[2]))
+        writer._rotate()
+        self.assertEqual(self.log().flush(), 1) # another worker got to it first
+        self.assertEqual(writer.pending_exclusions(self.user.id), {3})
+        writer.flush()
+        self.assertEqual(writer.pending_exclusions(self.user.id), set())
+        self.assertEqual(writer._pending, {})
+
+
+class UpsertMoviesTests(TestCase):
+    def test_unresolved_genres_keep_stored_ones(self):
+        drama = [{'id': 18, 'name': 'Drama'}]
+        Movie.objects.create(tmdb_id=603, title='The Matrix', genres=drama)
+        # The registry knows genres, just not the one on this payload
+        with mock.patch.object(type(genre_registry), 'names', new_callable=mock.PropertyMock, return_value={28: 'Action'}):
+            TMDBService().upsert_movies([{'id': 603, 'title': 'The Matrix Reloaded', 'genre_ids': [99]},
+                                         {'id': 604, 'title': 'New', 'genre_ids': [99]}])
+        movie = Movie.objects.get(tmdb_id=603)
+        self.assertEqual((movie.title, movie.genres), ('The Matrix Reloaded', drama))
+        self.assertIsNone(Movie.objects.get(tmdb_id=604).genres)
+
+    def test_resolved_genres_replace_stored_ones(self):
+        Movie.objects.create(tmdb_id=603, title='The Matrix', genres=[{'id': 18, 'name': 'Drama'}])
+        action = [{'id': 28, 'name': 'Action'}]
+        with mock.patch.object(genre_registry, 'resolve', return_value=action):
+            TMDBService().upsert_movies([{'id': 603, 'title': 'The Matrix', 'genre_ids': [28]}])
+        self.assertEqual(Movie.objects.get(tmdb_id=603).genres, action)
+
+
+class TasteTests(TestCase):
+    def setUp(self):
+        # The layout's genre axis comes from the registry, pin it to the base genres
+        names = mock.patch.object(type(genre_registry), 'names', new_callable=mock.PropertyMock, return_value={})
+        self.names = names.start()
+        self.addCleanup(names.stop)
+        self.user = User.objects.create_user(username='taster', password='pw')
+        self.action = Movie.objects.create(tmdb_id=1, title='Action', genres=[{'id': 28, 'name': 'Action'}],
+                                           release_date='1999-03-31', vote_average=8.2)
+        self.comedy = Movie.objects.create(tmdb_id=2, title='Comedy', genres=[{'id': 35, 'name': 'Comedy'}],
+                                           release_date='1999-06-01', vote_average=6.5)
+
+    def state(self, movie, **columns):
+        UserMovieState.objects.create(user=self.user, movie=movie, updated_at=timezone.now(), **columns)
+
+    def test_vector_is_built_from_existing_history(self):
+        self.state(self.action, heart_at=timezone.now(), watchlist_at=timezone.now())
+        self.state(self.comedy, skip_at=timezone.now())
+        vector = taste.get_taste_vector(self.user.id)
+        layout = taste.feature_layout()
+        self.assertAlmostEqual(float(vector[layout.genre_index[28]]), 1.6, places=5) # heart + watchlist
+        self.assertEqual(float(vector[layout.genre_index[35]]), 0.0) # skips don't count
+        self.assertEqual(UserTasteVector.objects.get(user=self.user).layout, layout.signature)
+
+    def test_update_taste_adds_and_removes(self):
+        self.assertIsNone(taste.get_taste_vector(self.user.id)) # builds an empty vector
+        taste.update_taste(self.user.id, self.comedy, ['heart'])
+        index = taste.feature_layout().genre_index[35]
+        self.assertEqual(float(taste.get_taste_vector(self.user.id)[index]), 1.0)
+        taste.update_taste(self.user.id, self.comedy, ['heart'], sign=-1)
+        self.assertIsNone(taste.get_taste_vector(self.user.id))
+
+    def test_update_taste_leaves_users_without_a_vector_to_the_rebuild(self):
+        taste.update_taste(self.user.id, self.action, ['heart'])
+        self.assertFalse(UserTasteVector.objects.filter(user=self.user).exists())
+
+    def test_new_genre_extends_the_layout_and_rebuilds(self):
+        self.state(self.action, heart_at=timezone.now())
+        taste.get_taste_vector(self.user.id)
+        old_signature = taste.feature_layout().signature
+        self.names.return_value = {28: 'Action', 35: 'Comedy', 99999: 'Brand New'}
+        layout = taste.feature_layout()
+        self.assertEqual(layout.genre_ids[-1], 99999)
+        self.assertNotEqual(layout.signature, old_signature)
+        self.assertEqual(taste.movie_features([99999], None, None)[layout.genre_index[99999]], 1.0)
+        self.assertEqual(taste.get_taste_vector(self.user.id).shape, (layout.count,))
+        self.assertEqual(UserTasteVector.objects.get(user=self.user).layout, layout.signature)
+
+    def test_rank_candidates_prefers_matching_movies(self):
+        self.state(self.action, heart_at=timezone.now())
+        candidates = [{'id': 10, 'genre_ids': [35], 'release_date': '1970-01-01', 'vote_average': 4.0},
+                      {'id': 11, 'genre_ids': [28], 'release_date': '1998-01-01', 'vote_average': 8.5}]
+        self.assertEqual(taste.rank_candidates(self.user.id, candidates, exploration=0), [11, 10])
+
+    def test_rank_candidates_without_taste_keeps_every_id(self):
+        candidates = [{'id': i} for i in range(5)]
+        self.assertEqual(sorted(taste.rank_candidates(self.user.id, candidates)), list(range(5)))
+
+
+class InteractionStatsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='counter', password='pw')
+        Movie.objects.create(tmdb_id=1, title='One')
+        Movie.objects.create(tmdb_id=2, title='Two')
+        load_stats(self.user.id) # build the row so writes adjust it
+
+    def test_total_counts_every_interaction_in_effect(self):
+        now = timezone.now()
+        with mock.patch('flickFinder.services.interaction_writer.update_taste'):
+            record_interaction(self.user.id, 1, 'heart', now)
+            record_interaction(self.user.id, 1, 'watchlist', now)
+            record_interaction(self.user.id, 2, 'skip', now)
+        stats = load_stats(self.user.id)
+        self.assertEqual((stats.heart_count, stats.watchlist_count, stats.skip_count, stats.total_interactions), (1, 1, 1, 3))
+        with mock.patch('flickFinder.services.interaction_writer.update_taste'):
+            record_interaction(self.user.id, 1, 'unwatch', now) # clears heart and watchlist, leaves a skip
+        stats = load_stats(self.user.id)
+        self.assertEqual((stats.heart_count, stats.watchlist_count, stats.skip_count, stats.total_interactions), (0, 0, 2, 2))
+        self.assertEqual(reconcile_stats([self.user.id]), 0) # the rebuild agrees with the running counts
+
+
+class CandidatePoolTests(TestCase):
+    def setUp(self):
+        self.service = mock.Mock(details_ttl=60 * 60 * 24)
+        self.service.filter_signature.side_effect = lambda filters: 'popular' if filters is None else f"genres={filters.genre_ids}"
+        page = lambda page: ([{'id': page * 10}, {'id': page * 10 + 1}], 3) # 3 pages of 2 movies
+        self.service.get_popular_movies.side_effect = page
+        self.service.discover_movies.side_effect = lambda filters, page=1: ([{'id': page * 100}], 3)
+        self.service.upsert_movies.side_effect = lambda results: [
+            Movie.objects.get_or_create(tmdb_id=movie['id'], defaults={'title': str(movie['id'])}) for movie in results]
+        self.store = CandidatePoolStore(self.service, self.fetch_pages, pages=2, refresh_interval=60 * 30, idle_ttl=60 * 60, hydrate=10)
+        for name in ('start', 'schedule_refresh'): # no background threads in tests
+            patcher = mock.patch.object(self.store, name)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def fetch_pages(fetch_page, pages, potential_movies):
+        total_pages = 0
+        for page in pages:
+            results, total_pages = fetch_page(page)
+            potential_movies.update((movie['id'], movie) for movie in results)
+        return total_pages
+
+    def test_first_lookup_creates_the_pool_and_schedules_a_build(self):
+        filters = mock.Mock(genre_ids=['28'], min_release_year=None, max_release_year=None, min_rating=None)
+        self.assertIsNone(self.store.candidates('genres=28', filters))
+        pool = CandidatePool.objects.get()
+        self.assertEqual((pool.signature, pool.filters['genre_ids']), ('genres=28', ['28']))
+        self.store.schedule_refresh.assert_called_once_with(pool.signature_hash)
+
+    def test_refresh_builds_the_pool_and_lookups_read_it(self):
+        self.store.pages = 3 # every page, so the sample is deterministic
+        self.store.warm()
+        self.store.refresh(self.store.popular_key)
+        pool = CandidatePool.objects.get()
+        self.assertEqual((pool.total_pages, pool.lease_until), (3, None))
+        self.assertIsNotNone(pool.refreshed_at)
+        self.assertEqual(sorted(self.store.candidates('popular')), [10, 11, 20, 21, 30, 31])
+        self.assertEqual(self.service.get_movie_details.call_count, 6) # the popular pool is fully hydrated
+        self.store.schedule_refresh.assert_not_called() # fresh
+
+    def test_refresh_skips_a_leased_pool(self):
+        self.store.warm()
+        CandidatePool.objects.update(lease_until=timezone.now() + timezone.timedelta(minutes=5))
+        self.store.refresh(self.store.popular_key)
+        self.assertIsNone(CandidatePool.objects.get().refreshed_at)
+        self.service.get_popular_movies.assert_not_called()
+
+    def test_stale_pool_is_still_served_and_rescheduled(self):
+        self.store.warm()
+        self.store.refresh(self.store.popular_key)
+        CandidatePool.objects.update(refreshed_at=timezone.now() - timezone.timedelta(hours=1))
+        self.assertTrue(self.store.candidates('popular'))
+        self.store.schedule_refresh.assert_called_once_with(self.store.popular_key)
+
+    def test_refresh_due_drops_idle_pools_but_keeps_popular(self):
+        old = timezone.now() - timezone.timedelta(hours=2)
+        self.store.warm()
+        CandidatePool.objects.create(signature_hash='idle', signature='genres=99', filters={'genre_ids': ['99']}, last_used_at=old)
+        CandidatePool.objects.update(last_used_at=old)
+        self.store.refresh_due()
+        pool = CandidatePool.objects.get()
+        self.assertEqual(pool.signature_hash, self.store.popular_key)
+        self.assertIsNotNone(pool.refreshed_at) # stale (never built), so refreshed
+
+    def test_hydrate_revalidates_details_that_go_stale_before_the_next_refresh(self):
+        now = timezone.now()
+        Movie.objects.create(tmdb_id=1, title='Missing')
+        Movie.objects.create(tmdb_id=2, title='Fresh', details={'id': 2}, details_fetched_at=now)
+        Movie.objects.create(tmdb_id=3, title='Stale soon', details={'id': 3}, details_fetched_at=now - timezone.timedelta(hours=23, minutes=45))
+        self.store._hydrate([1, 2, 3], None)
+        fetched = [call.args[0] for call in self.service.get_movie_details.call_args_list]
+        self.assertEqual(fetched, [1, 3]) # missing first
+        self.assertEqual(self.service.get_movie_details.call_args.kwargs['max_age'], 60 * 60 * 23.5)
+
+
+class TMDBResponseCacheTests(TestCase):
+    def setUp(self):
+        self.cache = TMDBResponseCache(max_entries=3, ttls={'discover': 60}, negative_ttl=30)
+
+    def expiry_seconds(self, endpoint, params):
+        entry = TMDBCacheEntry.objects.get(key=self.cache.make_key(endpoint, params))
+        return round((entry.expires_at - entry.last_accessed).total_seconds())
+
+    def test_key_ignores_api_key_and_param_order(self):
+        key = self.cache.make_key('discover/movie', {'page': 1, 'sort_by': 'popularity.desc'})
+        self.assertEqual(key, self.cache.make_key('/discover/movie/', {'sort_by': 'popularity.desc', 'page': '1', 'api_key': 'x'}))
+        self.assertNotEqual(key, self.cache.make_key('discover/movie', {'page': 2, 'sort_by': 'popularity.desc'}))
+
+    def test_ttl_per_endpoint_class(self):
+        self.cache.set('discover/movie', {'page': 1}, {'results': []})
+        self.cache.set('movie/603', None, {'id': 603})
+        self.cache.set('person/1', None, {'id': 1})
+        self.assertEqual(self.expiry_seconds('discover/movie', {'page': 1}), 60) # overridden
+        self.assertEqual(self.expiry_seconds('movie/603', None), 60 * 60 * 24 * 7)
+        self.assertEqual(self.expiry_seconds('person/1', None), DEFAULT_TTL)
+
+    def test_404_is_cached_without_payload(self):
+        self.cache.set('movie/1', None, {'status_message': 'gone'}, status_code=404)
+        self.assertEqual(self.cache.get('movie/1'), (True, 404, None))
+        self.assertEqual(self.expiry_seconds('movie/1', None), 30)
+
+    def test_expired_entries_miss(self):
+        self.cache.set('search/movie', {'query': 'x'}, {'results': []})
+        TMDBCacheEntry.objects.update(expires_at=timezone.now() - timezone.timedelta(seconds=1))
+        self.assertEqual(self.cache.get('search/movie', {'query': 'x'}), (False, None, None))
+
+    def test_prune_evicts_least_recently_used(self):
+        now = timezone.now()
+        for i in range(5):
+            self.cache.set(f"movie/{i}", None, {'id': i})
+            TMDBCacheEntry.objects.filter(endpoint=f"movie/{i}").update(last_accessed=now - timezone.timedelta(minutes=10 - i))
+        TMDBCacheEntry.objects.filter(endpoint='movie/0').update(last_accessed=now) # recently read
+        self.assertEqual(self.cache.prune(), 2)
+        self.assertEqual(sorted(TMDBCacheEntry.objects.values_list('endpoint', flat=True)), ['movie/0', 'movie/3', 'movie/4'])
+
+    def test_counters(self):
+        self.cache.set('movie/1', None, {'id': 1})
+        self.cache.get('movie/1')
+        self.cache.get('movie/1')
+        self.cache.get('movie/2')
+        self.cache.get('movie/2', record=False) # polling doesn't count
+        TMDBCacheEntry.objects.update(expires_at=timezone.now() - timezone.timedelta(seconds=1))
+        self.cache.prune()
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['evictions'], stats['entries']), (2, 1, 1, 0))
+        self.assertEqual(stats['hit_rate'], round(2 / 3, 4))
+
+
+class PackedIdQueueTests(TestCase):
+    def queue(self, ids=(), head=0):
+        buffer = RecommendationBuffer(ready_data=pack_ids(ids), ready_head=head)
+        return buffer, PackedIdQueue(buffer, 'ready')
+
+    def test_pack_unpack_round_trip(self):
+        ids = [0, 1, 603, 2 ** 32 - 1]
+        data = pack_ids(ids)
+        self.assertEqual(len(data), 4 * len(ids))
+        self.assertEqual(unpack_ids(data), ids)
+        self.assertEqual(unpack_ids(data, 1, 3), [1, 603])
+        self.assertEqual(unpack_ids(b''), [])
+
+    def test_pops_in_order(self):
+        buffer, queue = self.queue([5, 6, 7, 8])
+        self.assertEqual(queue.pop_front(), 5)
+        self.assertEqual(queue.take(2), [6, 7])
+        self.assertEqual((list(queue), len(queue), buffer.ready_head), ([8], 1, 3))
+        self.assertEqual(queue.dirty, ['ready_head']) # the blob itself wasn't touched
+
+    def test_empty_queue(self):
+        buffer, queue = self.queue()
+        self.assertFalse(queue)
+        self.assertIsNone(queue.pop_front())
+        self.assertEqual(queue.take(3), [])
+        self.assertEqual(queue.dirty, [])
+
+    def test_extend_appends_and_compacts(self):
+        buffer, queue = self.queue([1, 2, 3], head=2)
+        queue.extend([4, 5])
+        self.assertEqual((list(queue), buffer.ready_head), ([3, 4, 5], 0))
+        self.assertEqual(bytes(buffer.ready_data), pack_ids([3, 4, 5]))
+        self.assertIn(5, queue)
+        self.assertTrue(queue.remove(4))
+        self.assertEqual(list(queue), [3, 5])
+
+    def test_survives_a_save(self):
+        user = User.objects.create_user(username='queued', password='pw')
+        buffer = RecommendationBuffer.objects.create(user=user)
+        queue = PackedIdQueue(buffer, 'ready')
+        queue.extend([10, 11, 12])
+        queue.pop_front()
+        buffer.save(update_fields=queue.dirty)
+        self.assertEqual(list(PackedIdQueue(RecommendationBuffer.objects.get(user=user), 'ready')), [11, 12])
+
+
+class RecommendationPrefetcherTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='prefetched', password='pw')
+        for tmdb_id in range(1, 7):
+            Movie.objects.create(tmdb_id=tmdb_id, title=f"Movie {tmdb_id}", details={'id': tmdb_id})
+        self.fetch_batch = mock.Mock(return_value=([1, 2, 3, 4, 5, 6], 'popular'))
+        self.prefetcher = RecommendationPrefetcher(mock.Mock(), self.fetch_batch, size=3, low_water=1, workers=1)
+
+    def fill(self, ready=(), candidates=()):
+        RecommendationBuffer.objects.update_or_create(user=self.user, defaults={
+            'ready_data': pack_ids(ready), 'ready_head': 0, 'candidate_data': pack_ids(candidates), 'candidate_head': 0})
+
+    def test_pop_serves_in_order_and_skips_missing_details(self):
+        Movie.objects.filter(tmdb_id=2).update(details=None)
+        self.fill(ready=[1, 2, 3])
+        self.assertEqual(self.prefetcher.pop(self.user.id), ({'id': 1}, 2))
+        self.assertEqual(self.prefetcher.pop(self.user.id), ({'id': 3}, 0)) # 2 had nothing stored
+        self.assertEqual(self.prefetcher.pop(self.user.id), (None, 0))
+
+    def test_top_up_claims_candidates_and_refills(self):
+        self.fill(candidates=[4, 5])
+        with mock.patch.object(self.prefetcher, '_hydrate', return_value=True):
+            self.assertEqual(self.prefetcher.top_up(self.user), 3)
+        buffer = RecommendationBuffer.objects.get(user=self.user)
+        self.assertEqual(list(PackedIdQueue(buffer, 'ready')), [4, 5, 1]) # batch fetched once the candidates ran out
+        self.assertEqual(list(PackedIdQueue(buffer, 'candidate')), [2, 3, 6])
+        self.assertEqual(buffer.source, 'popular')
+        self.fetch_batch.assert_called_once()
+
+    def test_top_up_drops_work_after_a_clear(self):
+        self.fill(candidates=[4, 5, 6])
+        def hydrate_while_filters_change(movie_id):
+            self.prefetcher.clear(self.user.id)
+            return True
+        with mock.patch.object(self.prefetcher, '_hydrate', side_effect=hydrate_while_filters_change):
+            self.assertEqual(self.prefetcher.top_up(self.user), 0)
+        buffer = RecommendationBuffer.objects.get(user=self.user)
+        self.assertEqual((list(PackedIdQueue(buffer, 'ready')), list(PackedIdQueue(buffer, 'candidate'))), ([], []))
+        self.assertEqual(buffer.generation, 3) # once per hydrated candidate
+
+
+class ExclusionSetTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='excluder', password='pw')
+        self.movies = {tmdb_id: Movie.objects.create(tmdb_id=tmdb_id, title=f"Movie {tmdb_id}") for tmdb_id in (10, 20, 30, 40)}
+
+    def test_membership_and_filter(self):
+        now = time.time()
+        exclusions = ExclusionSet(np.array([10, 30], dtype='<u4'), np.array([20, 40], dtype='<u4'),
+                                  np.array([now + 60, now - 60], dtype='<u4'), now=now)
+        self.assertIn(10, exclusions)
+        self.assertIn(20, exclusions) # block still active
+        self.assertNotIn(40, exclusions) # block over
+        self.assertNotIn(50, exclusions)
+        self.assertEqual(exclusions.filter([50, 40, 30, 20, 10]), [50, 40])
+        self.assertEqual(exclusions.union([50]).filter([50, 40]), [40])
+        self.assertEqual(len(exclusions), 3)
+
+    def test_missing_row_is_rebuilt_from_states(self):
+        now = timezone.now()
+        UserMovieState.objects.create(user=self.user, movie=self.movies[10], heart_at=now, updated_at=now)
+        UserMovieState.objects.create(user=self.user, movie=self.movies[20], block_at=now, updated_at=now,
+                                      expires_at=now + timezone.timedelta(days=1))
+        UserMovieState.objects.create(user=self.user, movie=self.movies[30], block_at=now, updated_at=now) # released
+        exclusions = load_exclusions(self.user.id)
+        self.assertTrue(UserExclusionSet.objects.filter(user=self.user).exists())
+        self.assertEqual(exclusions.filter([10, 20, 30, 40]), [30, 40])
+
+    def test_record_exclusions_persists(self):
+        load_exclusions(self.user.id) # builds an empty row
+        record_exclusions(self.user.id, [(40, 'skip', None), (30, 'block', timezone.now() + timezone.timedelta(hours=1))])
+        self.assertEqual(load_exclusions(self.user.id).filter([10, 30, 40]), [10])
+
+    def test_record_exclusions_skips_users_without_a_row(self):
+        record_exclusions(self.user.id, [(40, 'skip', None)])
+        self.assertFalse(UserExclusionSet.objects.filter(user=self.user).exists())
+
+
+class PageSamplerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='sampler', password='pw')
+        self.sampler = PageSampler(seen_decay=0.5, min_weight=0.001, seed=7)
+
+    def test_weights(self):
+        stats = {'2': [1, 0.8], '3': [2, 0.8], '4': [1, 0.0]}
+        weights = self.sampler.weights([1, 2, 3, 4], stats)
+        self.assertEqual(weights.tolist(), [1.0, 0.4, 0.2, 0.001]) # unseen, decayed per fetch, exhausted
+
+    def test_exhausted_pages_are_avoided(self):
+        self.sampler.record(self.user.id, 'sig', {1: (20, 0), 2: (20, 0), 3: (20, 0), 4: (0, 0)})
+        self.assertEqual(sorted(self.sampler.sample(self.user.id, 'sig', 6, 3)), [4, 5, 6]) # 4 was empty, not recorded
+        self.assertEqual(self.sampler.sample(self.user.id, 'sig', 6, 3), self.sampler.sample(self.user.id, 'sig', 6, 3))
+
+    def test_skip_and_count(self):
+        self.assertEqual(sorted(self.sampler.sample(self.user.id, 'sig', 4, 10, skip=[1])), [2, 3, 4])
+        self.assertEqual(self.sampler.sample(self.user.id, 'sig', 3, 0), [])
+        self.assertEqual(self.sampler.sample(self.user.id, 'sig', 1, 2, skip=[1]), [])
+
+    def test_record_counts_fetches(self):
+        self.sampler.record(self.user.id, 'sig', {5: (20, 10)})
+        self.sampler.record(self.user.id, 'sig', {5: (20, 5)})
+        self.assertEqual(self.sampler._stats(self.user.id, 'sig'), {'5': [2, 0.25]})
+        self.assertEqual(self.sampler._stats(self.user.id, 'other'), {})
+
+
+class BlockSweeperTests(TestCase):
+    def test_releases_expired_blocks_only(self):
+        user = User.objects.create_user(username='blocker', password='pw')
+        now = timezone.now()
+        for tmdb_id, hours in ((1, 1), (2, 3)):
+            UserMovieState.objects.create(user=user, movie=Movie.objects.create(tmdb_id=tmdb_id, title=f"Movie {tmdb_id}"),
+                                          block_at=now, expires_at=now + timezone.timedelta(hours=hours), updated_at=now)
+        load_exclusions(user.id) # both blocks active in the exclusion row
+
+        self.assertEqual(release_expired_blocks(now=now + timezone.timedelta(hours=2)), 1)
+        released = UserMovieState.objects.get(user=user, movie__tmdb_id=1)
+        kept = UserMovieState.objects.get(user=user, movie__tmdb_id=2)
+        self.assertEqual((released.expires_at, released.block_at), (None, now)) # the block stays in the history
+        self.assertEqual(kept.expires_at, now + timezone.timedelta(hours=3))
+        row = UserExclusionSet.objects.get(user=user)
+        self.assertEqual(np.frombuffer(bytes(row.blocked_data), dtype='<u4').tolist(), [2])
+        self.assertEqual(release_expired_blocks(now=now + timezone.timedelta(hours=2)), 0)
+
+
+class ItemSimilarityTests(TestCase):
+    def setUp(self):
+        # Users 1-2 like 100 and 200, user 3 bridges 200 and 300, users 4-5 like 300 and 400,
+        # only user 1 ever touched 500
+        pairs = [(1, 100), (1, 200), (2, 100), (2, 200), (3, 200), (3, 300),
+                 (4, 300), (4, 400), (5, 300), (5, 400), (1, 500)]
+        self.user_ids = np.array([user for user, _ in pairs], dtype=np.int64)
+        self.movie_ids = np.array([movie for _, movie in pairs], dtype=np.int64)
+        self.weights = np.ones(len(pairs), dtype=np.float32)
+        self.index_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.index_dir)
+
+    def test_build_keeps_top_neighbours(self):
+        items, neighbours, scores = build_similarity(self.user_ids, self.movie_ids, self.weights, top_k=2)
+        self.assertEqual(items.tolist(), [100, 200, 300, 400]) # 500 has a single user
+        self.assertEqual(neighbours.tolist(), [[200, 0], [100, 300], [400, 200], [300, 0]])
+        np.testing.assert_allclose(scores[1], [2 / np.sqrt(6), 1 / 3], rtol=1e-6)
+        self.assertEqual(scores[0, 1], 0) # unused slot
+
+    def test_saved_index_is_mapped_and_recommends(self):
+        save_similarity(*build_similarity(self.user_ids, self.movie_ids, self.weights, top_k=2), directory=self.index_dir)
+        index = ItemSimilarityIndex(directory=self.index_dir)
+        self.assertTrue(all(isinstance(array, np.memmap) for array in index._load()))
+        self.assertEqual([movie for movie, _ in index.neighbours(200)], [100, 300])
+        self.assertEqual(index.recommend([100]), [200])
+        self.assertEqual(index.recommend([100, 200]), [300]) # seeds are never recommended
+        self.assertEqual(index.recommend([300, 999]), [400, 200]) # unindexed seeds are ignored
+        exclusions = ExclusionSet(np.array([400], dtype='<u4'), np.zeros(0, dtype='<u4'), np.zeros(0, dtype='<u4'))
+        self.assertEqual(index.recommend([300], exclusions=exclusions), [200])
+        self.assertEqual(ItemSimilarityIndex(directory=os.path.join(self.index_dir, 'missing')).recommend([100]), [])
+
+    def test_rebuild_is_picked_up(self):
+        save_similarity(*build_similarity(self.user_ids, self.movie_ids, self.weights), directory=self.index_dir)
+        index = ItemSimilarityIndex(directory=self.index_dir)
+        self.assertEqual(index.recommend([400]), [300])
+        time.sleep(0.002) # versions are named by millisecond
+        extra = np.array([6, 6], dtype=np.int64), np.array([400, 500], dtype=np.int64), np.ones(2, dtype=np.float32)
+        save_similarity(*build_similarity(*(np.concatenate(pair) for pair in zip(
+            (self.user_ids, self.movie_ids, self.weights), extra))), directory=self.index_dir)
+        self.assertEqual(index.recommend([400]), [300]) # still within the reload check interval
+        index._checked_at = 0.0
+        self.assertEqual(index.recommend([400]), [300, 500])
+
+
+class MovieEmbeddingTests(TestCase):
+    GROUPS = [(28, 'A soldier leads a daring raid behind enemy lines'),
+              (35, 'Two roommates plan a wedding that keeps going wrong'),
+              (27, 'A haunted house terrorizes a family after midnight'),
+              (878, 'A starship crew explores a distant alien planet')]
+
+    def setUp(self):
+        names = mock.patch.object(type(genre_registry), 'names', new_callable=mock.PropertyMock, return_value={})
+        names.start()
+        self.addCleanup(names.stop)
+        for g, (genre_id, overview) in enumerate(self.GROUPS):
+            for n in range(4):
+                self.movie(100 * (g + 1) + n, genre_id, overview, 1970 + 10 * n)
+        self.index = movie_embeddings.MovieEmbeddingIndex(similar_count=3, probes=1)
+        self.index.rebuild()
+        self.built = {row[0]: row[1:] for row in MovieEmbedding.objects.values_list('movie__tmdb_id', 'vector', 'cluster')}
+
+    def movie(self, tmdb_id, genre_id, overview, year):
+        return Movie.objects.create(tmdb_id=tmdb_id, title=f"Movie {tmdb_id}", genres=[{'id': genre_id, 'name': str(genre_id)}],
+                                    release_date=f'{year}-01-01', vote_average=7.0, overview=overview)
+
+    def test_new_movies_are_embedded_per_cluster(self):
+        # One exact twin of an existing movie per group
+        for g, (genre_id, overview) in enumerate(self.GROUPS):
+            self.movie(1000 + g, genre_id, overview, 1970)
+        with mock.patch.object(movie_embeddings, '_top_similar', wraps=movie_embeddings._top_similar) as top_similar:
+            self.assertEqual(self.index.add_new(limit=3), 3)
+            self.assertEqual(self.index.update(), 1)
+
+        clusters = dict(MovieEmbedding.objects.values_list('movie__tmdb_id', 'cluster'))
+        for call in top_similar.call_args_list:
+            query_ids = call.args[1].tolist()
+            self.assertEqual(len({clusters[movie_id] for movie_id in query_ids}), 1) # one cluster per product
+        self.assertEqual(sorted(movie_id for call in top_similar.call_args_list for movie_id in call.args[1].tolist()),
+                         [1000, 1001, 1002, 1003])
+        self.assertEqual(top_similar.call_count, len({clusters[movie_id] for movie_id in (1000, 1001, 1002)}) + 1)
+        for g in range(len(self.GROUPS)):
+            self.assertEqual(clusters[1000 + g], self.built[100 * (g + 1)][1]) # lands in its twin's cluster
+            self.assertEqual(self.index.similar(1000 + g, limit=1)[0].tmdb_id, 100 * (g + 1))
+            self.assertEqual(self.index.similar(100 * (g + 1), limit=1)[0].tmdb_id, 1000 + g) # pushed into the twin's list
+
+    def test_existing_embeddings_are_unchanged(self):
+        self.movie(2000, 35, 'A wedding planner falls for the groom', 2001)
+        self.assertEqual(self.index.update(), 1)
+        for tmdb_id, vector, cluster in MovieEmbedding.objects.exclude(movie__tmdb_id=2000).values_list(
+                'movie__tmdb_id', 'vector', 'cluster'):
+            self.assertEqual((bytes(vector), cluster), (bytes(self.built[tmdb_id][0]), self.built[tmdb_id][1]))
+        self.assertEqual(self.index.add_new(), 0)
+
+
+class InteractionBatchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('batcher', password='pw')
+        for tmdb_id in range(1, 6):
+            Movie.objects.create(tmdb_id=tmdb_id, title=f"Movie {tmdb_id}", details={'id': tmdb_id})
+        self.client.login(username='batcher', password='pw')
+
+    def post(self, swipes, want=0):
+        body = swipes if isinstance(swipes, (str, bytes)) else json.dumps({'swipes': swipes, 'want': want})
+        return self.client.post('/interaction/batch/', body, content_type='application/json')
+
+    def test_invalid_batches_are_rejected_whole(self):
+        bad = [
+            '{"swipes": ',
+            [{'movie_id': 1, 'interaction_type': 'skip'}, {'movie_id': 2, 'interaction_type': 'like'}],
+            [{'movie_id': 1, 'interaction_type': 'skip'}, {'interaction_type': 'skip'}],
+            [{'movie_id': 'abc', 'interaction_type': 'skip'}],
+            [{'movie_id': 0, 'interaction_type': 'skip'}],
+            ['skip'],
+            [{'movie_id': tmdb_id, 'interaction_type': 'skip'} for tmdb_id in (1, 2, 3)],
+        ]
+        with override_settings(INTERACTION_BATCH_MAX_SWIPES=2):
+            for swipes in bad:
+                response = self.post(swipes)
+                self.assertEqual((response.status_code, response.json()['status']), (400, 'error'), swipes)
+        self.assertEqual(self.post([{'movie_id': 3, 'interaction_type': 'block'}, {'movie_id': 1}]).json()['message'],
+                         'Invalid swipe at position 1.')
+        self.assertFalse(InteractionEvent.objects.exists()) # nothing from a rejected batch is written
+
+    def test_swipes_are_applied_in_order(self):
+        response = self.post([{'movie_id': 1, 'interaction_type': 'watchlist'},
+                              {'movie_id': 2, 'interaction_type': 'heart'},
+                              {'movie_id': 1, 'interaction_type': 'unwatch'},
+                              {'movie_id': 3, 'interaction_type': 'skip'},
+                              {'movie_id': 2, 'interaction_type': 'heart'}]) # a repeat only keeps its last position
+        self.assertEqual(response.json(), {'status': 'success', 'recorded': 5, 'next_movies': []})
+        events = InteractionEvent.objects.filter(user=self.user).order_by('timestamp')
+        self.assertEqual([(e.movie.tmdb_id, e.interaction_type) for e in events],
+                         [(1, 'watchlist'), (1, 'unwatch'), (3, 'skip'), (2, 'heart')])
+        state = UserMovieState.objects.get(user=self.user, movie__tmdb_id=1)
+        self.assertIsNone(state.watchlist_at) # the unwatch came after the watchlist
+        self.assertIsNotNone(state.skip_at)
+
+    def test_write_behind_unwatchlist_follows_pending_swipes(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        log = InteractionLog(directory=directory, interval=60)
+        log.flusher.start = lambda: None # flushed by hand
+        with override_settings(INTERACTION_WRITE_BEHIND=True), mock.patch('flickFinder.views.interaction_writer', log):
+            self.post([{'movie_id': 4, 'interaction_type': 'watchlist'}])
+            response = self.client.post('/watchlist/delete/', {'movie_id': 4})
+            self.assertEqual(response.json()['status'], 'success')
+            self.assertFalse(InteractionEvent.objects.exists()) # both wait for the flush
+            self.assertEqual(log.flush(), 2)
+        state = UserMovieState.objects.get(user=self.user, movie__tmdb_id=4)
+        self.assertEqual((state.watchlist_at, state.skip_at is not None), (None, True))
@@ -11,6 +11,9 @@ urlpatterns = [
     # API endpoint, handles user interactions via POST requests
     path('interaction/', views.movie_interaction, name='movie_interaction'),
 
+    # API endpoint, handles several swipes at once via POST request (JSON body)
+    path('interaction/batch/', views.movie_interaction_batch, name='movie_interaction_batch'),
+
     # API endpoint, handles removing a movie from the watchlist via POST request
     path('watchlist/delete/', views.unwatchlist, name='unwatchlist'),
 
@@ -4,112 +4,137 @@ from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse, Http404
 from django.views.decorators.http import require_POST
 from django.utils import timezone
-from django.db.models import Count, Q
+from django.db.models import F, Q
+from django.db.models.functions import Coalesce, Greatest
 from django.contrib import messages
+from django.conf import settings
+import json
 import logging
 import random
+import time
 from collections import Counter
 
 from .forms import SignUpForm, FilterForm
-from .models import UserMovieInteraction, UserFilter, Movie
-from .services.tmdb_service import TMDBService, TMDBServiceError
+from .models import InteractionEvent, UserMovieState, UserFilter, Movie
+from .services.tmdb_service import TMDBServiceError
+from .services.local_catalog import discover_service
+from .services.prefetch import RecommendationPrefetcher
+from .services.taste import rank_candidates
+from .services.exclusions import ExclusionSet, EMPTY, load_exclusions
+from .services.page_sampler import page_sampler
+from .services.block_sweeper import block_sweeper
+from .services.candidate_pool import candidate_pools, pool_movies
+from .services.page_fetch import fetch_pages
+from .services.item_similarity import item_similarity, matches_filters
+from .services.movie_embeddings import movie_embeddings
+from .services.interaction_stats import STAT_FIELDS, load_stats
+from .services.interaction_writer import PendingInteraction, interaction_writer, record_interaction, write_interactions
 
 logger = logging.getLogger(__name__)
 BATCH_FETCH_PAGES = 5
 MAX_TMDB_PAGE = 500
+TOTAL_PAGES_TTL = 60 * 30 # seconds, matches the discover response cache
+POOL_BATCH_SIZE = BATCH_FETCH_PAGES * 20 # candidates drawn from a shared pool per refill, same as a fetched batch
+MAX_BATCH_NEXT_MOVIES = 10 # most next movies one swipe batch can ask for
 
-# Initialize TMDB service
-tmdb_service = TMDBService()
+# Initialize TMDB service, discover/popular can come from the local catalog (see sync_tmdb_catalog)
+tmdb_service = discover_service()
+
+# filter signature -> (total_pages, expiry), skips the page 1 probe on later refills
+_total_pages_memo = {}
+
+def _get_remembered_total_pages(signature):
+    """Returns the remembered total_pages for a filter signature, or None if unknown/expired"""
+    remembered = _total_pages_memo.get(signature)
+    if remembered and remembered[1] > time.monotonic():
+        return remembered[0]
+    return None
+
+def _remember_total_pages(signature, total_pages):
+    """Stores total_pages for a filter signature, ignoring zeros since those may be API failures"""
+    if total_pages:
+        _total_pages_memo[signature] = (total_pages, time.monotonic() + TOTAL_PAGES_TTL)
 
 def _get_excluded_ids(user):
     """
-    Retrieves a set of TMDB movie IDs that should be excluded for a given user.
+    Retrieves the TMDB movie IDs that should be excluded for a given user.
 
-    Excludes movies the user has interacted with first, then separately
-    the movies actively blocked (within the last 3 days).
+    Covers every movie the user has interacted with, except blocks the sweeper has released.
+    Read from the user's UserExclusionSet, which is kept up to date on each interaction
+    write, so this is one row lookup rather than a scan of the interaction history.
+    In write-behind mode, swipes this process hasn't flushed yet are added on top.
 
     Args:
         user (User): The user to retrieve excluded IDs for. From request.user
 
     Returns:
-        set: A set of TMDB movie IDs to exclude. Returns an empty set on error.
+        ExclusionSet: Supports `in` and a vectorized filter(). Empty on error.
     """
     try:
-        excluded_interactions = UserMovieInteraction.objects.filter(user=user).exclude(interaction_type='block')
-        excluded_tmdb_ids = set(excluded_interactions.values_list('movie__tmdb_id', flat=True))
-        three_days_ago = timezone.now() - timezone.timedelta(days=3)
-        actively_blocked_ids = set(UserMovieInteraction.objects.filter(
-            user=user,
-            interaction_type='block',
-            timestamp__gte=three_days_ago
-        ).values_list('movie__tmdb_id', flat=True))
-        logger.debug(f"User {user.id} actively blocked IDs: {len(actively_blocked_ids)}")
-        excluded_tmdb_ids.update(actively_blocked_ids)
-        logger.debug(f"User {user.id} total excluded IDs count: {len(excluded_tmdb_ids)}")
-        return excluded_tmdb_ids
+        exclusions = load_exclusions(user.id)
+        if interaction_writer.enabled:
+            exclusions = exclusions.union(interaction_writer.pending_exclusions(user.id)) # swipes not flushed yet
+        logger.debug(f"User {user.id} total excluded IDs count: {len(exclusions)}")
+        return exclusions
     except Exception as e:
         logger.exception(f"Error retrieving excluded interactions for user {user.id}, {e}")
-        return set() # Return empty set on error
+        return ExclusionSet(EMPTY, EMPTY, EMPTY) # Return empty set on error
 
-def _get_next_movie_for_user(request, tmdb_service, apply_filters=True): # Pass request for session, death death death
+def _similar_to_recent(user, excluded_tmdb_ids, user_filters=None):
     """
-    Gets the next movie recommendation for the logged-in* user.
+    Movies similar to the user's recent hearts and watchlists, from the item-item index.
 
-    Attempts to serve from a per-user session cache first. If the cache is
-    empty or exhausted, fetches a new batch of potential movies from TMDB
-    from filters primarily, but goes to popular if none available, filters out excluded movies,
-    caches the results, and returns the first movie from the new batch.
-
-    Args:
-        request (HttpRequest): The incoming HTTP request object (used for user and session).
-        tmdb_service (TMDBService): An instance of the TMDB service.
+    Neighbours aren't from a filtered query, so they're checked against the user's filters
+    here. Only movies with a stored Movie row come back (every indexed movie has one).
 
     Returns:
-        dict: A dictionary containing TMDB movie data for the next recommendation,
-              or None if no suitable movie could be found or an error occurred.
+        list: TMDB ids, most similar first. Empty until the index has been built.
     """
-    user = request.user # Get user from request
-    session_key = f'recommendation_cache_{user.id}' # Unique session key per user
-    logger.debug(f"--- Finding next movie for user {user.id} (Session Cache Method) ---")
-
-    # cache first
-    cached_ids = request.session.get(session_key, [])
-    source_of_cache = request.session.get(f'{session_key}_source', 'unknown')
-    logger.debug(f"User {user.id}: Found {len(cached_ids)} movie IDs in session cache. (Source: {source_of_cache}).")
-
-    while cached_ids:
-        movie_id = cached_ids.pop(0) # Get the next ID from the front
-        logger.debug(f"Trying cached ID: {movie_id}")
+    seed_ids = list(UserMovieState.objects
+                    .filter(Q(heart_at__isnull=False) | Q(watchlist_at__isnull=False), user=user)
+                    .order_by(Greatest(Coalesce('heart_at', 'watchlist_at'), Coalesce('watchlist_at', 'heart_at')).desc())
+                    .values_list('movie__tmdb_id', flat=True)[:getattr(settings, 'ITEM_SIMILARITY_SEEDS', 20)])
+    if not seed_ids:
+        return []
+    limit = getattr(settings, 'ITEM_SIMILARITY_CANDIDATES', 20)
+    # Ask for extra, some won't pass the filters
+    neighbour_ids = item_similarity.recommend(seed_ids, excluded_tmdb_ids, limit=limit * 3 if user_filters else limit)
+    if not neighbour_ids:
+        return []
+    movies = {movie['id']: movie for movie in pool_movies(neighbour_ids)}
+    return [tmdb_id for tmdb_id in neighbour_ids
+            if tmdb_id in movies and matches_filters(movies[tmdb_id], user_filters)][:limit]
+
+def _blend_neighbours(ranked_ids, neighbour_ids):
+    """Interleaves neighbours with a ranked batch (neighbour first), dropping duplicates"""
+    blended = []
+    seen = set()
+    for i in range(max(len(ranked_ids), len(neighbour_ids))):
+        for source in (neighbour_ids, ranked_ids):
+            if i < len(source) and source[i] not in seen:
+                seen.add(source[i])
+                blended.append(source[i])
+    return blended
+
+def _fetch_candidate_batch(user, tmdb_service, apply_filters=True):
+    """
+    Fetches a new batch of candidate movies for a user.
 
-        # Fetch details for cached ID
-        try:
-            movie_data = tmdb_service.get_movie_details(movie_id)
-            if movie_data:
-                # Ensure it's saved locally (important for watchlist, gets genres etc.)
-                movie_obj = tmdb_service.get_or_create_movie(movie_data)
-                if movie_obj:
-                    logger.info(f"Serving movie '{movie_obj.title}' (ID: {movie_id}) from cache.")
-                    request.session[session_key] = cached_ids # Update cache in session
-                    request.session.modified = True
-                    return movie_data
-                else:
-                     logger.warning(f"Failed to get/create movie object for cached ID {movie_id}. Skipping.")
-                     # Don't add back to cache if it failed get/create
-            else:
-                # Movie ID might be invalid on TMDB now?
-                logger.warning(f"TMDB details fetch returned None for cached ID {movie_id}. Skipping.")
-                # Don't add back to cache
-        except TMDBServiceError as e:
-            logger.error(f"TMDB Service Error fetching details for cached ID {movie_id}: {e}. Skipping.")
-        except Exception as e:
-            logger.exception(f"Unexpected error processing cached ID {movie_id}. Skipping.")
+    Fetches from TMDB with the user's filters primarily, but goes to popular if none are set,
+    filters out excluded movies, stores the batch's Movie rows and ranks it against the
+    user's taste vector. Neighbours of the user's recent likes from the item-item index are
+    blended in when the index exists.
+    Runs on the prefetch threads, so it doesn't touch the request or session.
 
-        # Update cache in session if loop continues
-        request.session[session_key] = cached_ids
-        request.session.modified = True
+    Args:
+        user (User): The user to fetch candidates for.
+        tmdb_service (TMDBService): An instance of the TMDB service.
+        apply_filters (bool): Whether to use the user's saved filters.
 
-    # Cache is empty or exhausted - Fetch a new batch
-    logger.info(f"Session cache empty or exhausted for user {user.id}. Fetching new batch...")
+    Returns:
+        tuple: (list of TMDB ids, best match first, source name 'filtered' or 'popular')
+    """
+    logger.info(f"Fetching new candidate batch for user {user.id}...")
     excluded_tmdb_ids = _get_excluded_ids(user) # Get current list of blocked
 
     # get filters for new batch
@@ -128,101 +153,166 @@ def _get_next_movie_for_user(request, tmdb_service, apply_filters=True): # Pass
              logger.exception(f"Error retrieving UserFilter for user {user.id}. Fetching without filters.")
              fetch_with_filters = False
 
+    # Users with the same filters share a pool, sampling it costs no TMDB calls
+    cache_source_name = "filtered" if fetch_with_filters else "popular"
+    pool_filters = user_filters if fetch_with_filters else None
+    try:
+        neighbour_ids = _similar_to_recent(user, excluded_tmdb_ids, pool_filters)
+        if neighbour_ids:
+            logger.info(f"Blending {len(neighbour_ids)} similar movies into the batch for user {user.id}.")
+    except Exception as e:
+        logger.exception(f"Error looking up similar movies for user {user.id}: {e}")
+        neighbour_ids = []
+    try:
+        pooled_ids = candidate_pools.candidates(tmdb_service.filter_signature(pool_filters), pool_filters)
+        if pooled_ids:
+            available_ids = excluded_tmdb_ids.filter(pooled_ids)
+            if len(available_ids) >= getattr(settings, 'CANDIDATE_POOL_MIN_AVAILABLE', 20):
+                sampled_ids = random.sample(available_ids, min(POOL_BATCH_SIZE, len(available_ids)))
+                logger.info(f"Drew {len(sampled_ids)} candidates from the shared pool for user {user.id}.")
+                ranked_ids = rank_candidates(user.id, pool_movies(sampled_ids))
+                return _blend_neighbours(ranked_ids, neighbour_ids), cache_source_name
+            logger.info(f"User {user.id} has exhausted the shared pool, fetching a private batch.")
+    except Exception as e:
+        logger.exception(f"Error drawing from the candidate pool for user {user.id}: {e}")
+
     # fetch batch
     potential_movies = {} # Use dict to automatically handle duplicates by ID
+    page_ids = {} # page -> ids, to record how well each page yielded
     cache_source_name = "unknown" # starts unknown to debug if unknown is passed
 
     if fetch_with_filters:
         cache_source_name = "filtered"
         logger.info(f"Starting filtered batch fetch for user {user.id}...")
-        # Initial call to get total_pages for this filter set, may be unoptimized
-        try:
-            _, initial_total_pages = tmdb_service.discover_movies(user_filters, page=1)
-            logger.info(f"Filter query initial total_pages = {initial_total_pages}")
-        except Exception as e:
-            logger.exception("Error during initial filtered call to get total_pages.")
-            initial_total_pages = 0 # Assume failure means no results
+        signature = tmdb_service.filter_signature(user_filters)
+        initial_total_pages = _get_remembered_total_pages(signature)
+        probed_pages = set()
+        if initial_total_pages is None:
+            # Probe page 1 for total_pages, its results are kept as part of the batch
+            try:
+                initial_total_pages = fetch_pages(lambda page: tmdb_service.discover_movies(user_filters, page=page),
+                                                   [1], potential_movies, page_ids)
+                probed_pages.add(1)
+                _remember_total_pages(signature, initial_total_pages)
+                logger.info(f"Filter query initial total_pages = {initial_total_pages}")
+            except Exception as e:
+                logger.exception("Error during initial filtered call to get total_pages.")
+                initial_total_pages = 0 # Assume failure means no results
+        else:
+            logger.debug(f"Using remembered total_pages = {initial_total_pages} for filter signature")
 
         if initial_total_pages == 0:
             logger.warning(f"No results found for user {user.id}'s filters (total_pages=0). No movies to cache or serve.")
-            request.session[session_key] = [] # Ensure cache is empty
-            request.session[f'{session_key}_source'] = cache_source_name
-            request.session.modified = True
-            return None
+            return neighbour_ids, cache_source_name
 
         # Determine pages to sample within the available range
         search_max_page = min(initial_total_pages, MAX_TMDB_PAGE)
         # May likely need to adjust this to search_max_page - 1, as last page is likely incomplete
         # Trying to iterate over last page may lead to errors, but it could also be fine, so I'm leaving it
-        num_pages_to_sample = min(BATCH_FETCH_PAGES, search_max_page)
-        if num_pages_to_sample > 0: # This should never happen, as we already checked for 0 results
-             # Sample randomly within the available pages for these filters
-             pages_to_fetch = random.sample(range(1, search_max_page + 1), num_pages_to_sample)
+        # Steered towards pages this user hasn't exhausted yet
+        pages_to_fetch = page_sampler.sample(user.id, signature, search_max_page,
+                                             BATCH_FETCH_PAGES - len(probed_pages), skip=probed_pages)
+        if pages_to_fetch:
              logger.debug(f"Fetching filtered batch from pages: {pages_to_fetch} (out of {search_max_page} available)")
-
-             for page_num in pages_to_fetch:
-                 try:
-                     movies_page, _ = tmdb_service.discover_movies(user_filters, page=page_num)
-                     if movies_page:
-                         logger.debug(f"Fetched {len(movies_page)} movies from filtered page {page_num}")
-                         for movie_data in movies_page:
-                             if movie_data and movie_data.get('id'): potential_movies[movie_data['id']] = movie_data
-                 except Exception as e: logger.exception(f"Error fetching filtered page {page_num}")
-        else:
+             latest_total_pages = fetch_pages(lambda page: tmdb_service.discover_movies(user_filters, page=page),
+                                               pages_to_fetch, potential_movies, page_ids)
+             _remember_total_pages(signature, latest_total_pages)
+        elif not probed_pages:
             logger.warning(f"Cannot sample pages for filtered results (num_pages_to_sample=0).")
     # Simple popular fetch
     else: # fetch_with_filters is False
         cache_source_name = "popular"
         logger.info(f"Starting popular batch fetch for user {user.id}...")
-        # Likely will want to change this to a range of 1-500, but I'm leaving it for now
-        pages_to_fetch = random.sample(range(1, MAX_TMDB_PAGE + 1), BATCH_FETCH_PAGES)
+        # The local catalog may hold fewer than 500 pages, so remember what the backend reports
+        signature = tmdb_service.filter_signature(None)
+        search_max_page = _get_remembered_total_pages(signature) or MAX_TMDB_PAGE
+        pages_to_fetch = page_sampler.sample(user.id, signature, search_max_page, BATCH_FETCH_PAGES)
         logger.debug(f"Fetching popular batch from pages: {list(pages_to_fetch)}")
-        for page_num in pages_to_fetch:
-            try:
-                movies_page, _ = tmdb_service.get_popular_movies(page=page_num)
-                if movies_page:
-                    logger.debug(f"Fetched {len(movies_page)} movies from popular page {page_num}")
-                    for movie_data in movies_page:
-                        if movie_data and movie_data.get('id'): potential_movies[movie_data['id']] = movie_data
-            except Exception as e: logger.exception(f"Error fetching popular page {page_num}")
+        latest_total_pages = fetch_pages(lambda page: tmdb_service.get_popular_movies(page=page),
+                                          pages_to_fetch, potential_movies, page_ids)
+        _remember_total_pages(signature, latest_total_pages)
     # start filtering and cache
     logger.info(f"Batch fetch complete. Total unique potential movies fetched: {len(potential_movies)}")
-    valid_movie_ids = [tmdb_id for tmdb_id in potential_movies if tmdb_id not in excluded_tmdb_ids]
+    valid_movie_ids = excluded_tmdb_ids.filter(list(potential_movies))
     logger.info(f"Found {len(valid_movie_ids)} valid (non-excluded) movies in the batch.")
+    try:
+        valid_set = set(valid_movie_ids)
+        page_sampler.record(user.id, signature, {page: (len(ids), sum(1 for i in ids if i in valid_set))
+                                                 for page, ids in page_ids.items()})
+    except Exception as e:
+        logger.exception(f"Failed to record page yields for user {user.id}: {e}")
 
     if valid_movie_ids:
-        random.shuffle(valid_movie_ids)
-        request.session[session_key] = valid_movie_ids
-        request.session[f'{session_key}_source'] = cache_source_name # Store source type
-        request.session.modified = True
-        logger.debug(f"Cached {len(valid_movie_ids)} shuffled IDs (Source: {cache_source_name}).")
-
-        # Serve first item from new cache
-        newly_cached_id = valid_movie_ids.pop(0) # Get first ID
-        logger.debug(f"Attempting to serve first item from new cache: {newly_cached_id}")
-        try:
-            movie_data = tmdb_service.get_movie_details(newly_cached_id)
-            if movie_data:
-                movie_obj = tmdb_service.get_or_create_movie(movie_data)
-                if movie_obj:
-                     logger.info(f"Serving movie '{movie_obj.title}' (ID: {newly_cached_id}) immediately after batch fetch.")
-                     request.session[session_key] = valid_movie_ids # Update remaining cache
-                     request.session.modified = True
-                     return movie_data
-                else: logger.warning(f"Failed get/create for newly cached ID {newly_cached_id}.")
-            else: logger.warning(f"TMDB details None for newly cached ID {newly_cached_id}.")
-        except Exception as e: 
-            logger.exception(f"Unexpected error processing newly cached ID {newly_cached_id}")
-            request.session[session_key] = valid_movie_ids
-            request.session.modified = True
-            return None # expanded to indicate failure on full exception
-
-    # Batch fetch yielded no valid movies OR serving first failed
-    logger.warning(f"Failed to find or serve a suitable movie after batch fetch (Source: {cache_source_name}) for user {user.id}.")
-    request.session[session_key] = [] # Ensure cache is empty
-    request.session[f'{session_key}_source'] = cache_source_name
-    request.session.modified = True
-    return None # No movie found
+        # Write the whole batch in one statement so serving it later needs no per-movie inserts
+        valid_movies = [potential_movies[tmdb_id] for tmdb_id in valid_movie_ids]
+        tmdb_service.upsert_movies(valid_movies)
+        valid_movie_ids = rank_candidates(user.id, valid_movies)
+        logger.debug(f"Fetched {len(valid_movie_ids)} ranked IDs (Source: {cache_source_name}).")
+    else:
+        logger.warning(f"Batch fetch yielded no valid movies (Source: {cache_source_name}) for user {user.id}.")
+    return _blend_neighbours(valid_movie_ids, neighbour_ids), cache_source_name
+
+# Per-user buffer of ready-to-serve movies, topped up on background threads
+prefetcher = RecommendationPrefetcher(tmdb_service, _fetch_candidate_batch)
+
+def _get_next_movie_for_user(request, tmdb_service, apply_filters=True):
+    """
+    Gets the next movie recommendation for the logged-in* user.
+
+    Served from the user's prefetch buffer, which holds movies whose details are already
+    stored, so normally no TMDB call happens here. When the buffer runs low a background
+    top-up is queued. Only a cold buffer (first visit, new filters) is filled on this thread.
+
+    Args:
+        request (HttpRequest): The incoming HTTP request object (used for user).
+        tmdb_service (TMDBService): An instance of the TMDB service.
+
+    Returns:
+        dict: A dictionary containing TMDB movie data for the next recommendation,
+              or None if no suitable movie could be found or an error occurred.
+    """
+    next_movies = _get_next_movies_for_user(request, tmdb_service, 1, apply_filters)
+    return next_movies[0] if next_movies else None
+
+def _get_next_movies_for_user(request, tmdb_service, count, apply_filters=True):
+    """
+    Gets up to count next recommendations at once, see _get_next_movie_for_user.
+
+    Only the first one may fill a cold buffer on this thread, the rest are whatever is
+    ready in the buffer, so fewer than count can come back.
+
+    Returns:
+        list: TMDB movie data dicts, empty if nothing suitable was found or on error.
+    """
+    user = request.user
+    block_sweeper.start() # releases expired blocks in the background, once per process
+    # Queues used to live in the session, drop leftovers so old sessions shrink (only writes if present)
+    request.session.pop(f'recommendation_cache_{user.id}', None)
+    request.session.pop(f'recommendation_cache_{user.id}_source', None)
+    next_movies = []
+    try:
+        movie_data, ready_count = prefetcher.pop(user.id)
+        if movie_data is None:
+            logger.info(f"Prefetch buffer empty for user {user.id}, filling it on the request thread.")
+            prefetcher.top_up(user, apply_filters, target=1)
+            movie_data, ready_count = prefetcher.pop(user.id)
+        while movie_data:
+            next_movies.append(movie_data)
+            if len(next_movies) >= count or not ready_count:
+                break
+            movie_data, ready_count = prefetcher.pop(user.id)
+        if prefetcher.needs_top_up(ready_count):
+            prefetcher.schedule_top_up(user, apply_filters)
+    except Exception as e:
+        logger.exception(f"Error getting next movie for user {user.id}: {e}")
+        return next_movies
+
+    if next_movies:
+        logger.info(f"Serving {len(next_movies)} movie(s) starting with '{next_movies[0].get('title')}' "
+                    f"(ID: {next_movies[0].get('id')}), {ready_count} more ready.")
+    else:
+        logger.warning(f"Failed to find a suitable movie for user {user.id}.")
+    return next_movies
 
     # reminder: I may want to add a popular fetch as a backup or prompt user with popular button, but that's js in index
 
@@ -276,6 +366,7 @@ def movie_detail(request, movie_id):
     Fetches detailed movie information from TMDB using the provided `movie_id`.
     Ensures the movie exists in the local database (creating/updating if necessary).
     Retrieves the latest user interaction with this movie if the user is logged in.
+    Similar titles come from the stored embedding index, no TMDB call is made for them.
 
     Args:
         request (HttpRequest): The incoming HTTP request.
@@ -317,18 +408,25 @@ def movie_detail(request, movie_id):
     user_interaction = None
     if request.user.is_authenticated:
         try:
-            user_interaction = UserMovieInteraction.objects.filter(
+            user_interaction = UserMovieState.objects.filter(
                 user=request.user, movie=movie
-            ).order_by('-timestamp').first() # most recent
+            ).first() # interaction_type is the most recent one still in effect
             if not user_interaction:
                 logger.debug(f"No previous interaction found for user {request.user.id} and movie {movie_id}.")
         except Exception as e:
             logger.exception(f"Error retrieving interaction for user {request.user.id} and movie {movie_id}: {e}")
 
+    similar_movies = []
+    try:
+        similar_movies = movie_embeddings.similar(movie_id)
+    except Exception as e:
+        logger.exception(f"Error retrieving similar movies for movie {movie_id}: {e}")
+
     context = {
         'movie_data': movie_data, # Raw data from TMDB
         'movie_obj': movie, # Local movie model instance
-        'user_interaction': user_interaction, # Latest interaction object or None
+        'user_interaction': user_interaction, # UserMovieState or None
+        'similar_movies': similar_movies, # Movie instances, most similar first
     }
     return render(request, 'flickFinder/movie_detail.html', context)
 
@@ -340,6 +438,8 @@ def movie_interaction(request):
 
     Validates input, retrieves/creates the movie locally, records the interaction,
     and returns the next movie recommendation in the JSON response.
+    In write-behind mode (INTERACTION_WRITE_BEHIND) the interaction is logged and
+    written to the database by the next flush instead.
 
     Args:
         request (HttpRequest): The incoming AJAX POST request.
@@ -358,40 +458,88 @@ def movie_interaction(request):
         return JsonResponse({'status': 'error', 'message': 'Invalid Movie ID.'}, status=400)
     movie_id = int(movie_id_str)
 
-    if interaction_type not in dict(UserMovieInteraction.INTERACTION_CHOICES):
+    if interaction_type not in dict(InteractionEvent.INTERACTION_CHOICES):
         logger.warning(f"Invalid interaction type received: '{interaction_type}' from User {request.user.id}")
         return JsonResponse({'status': 'error', 'message': 'Invalid interaction type'}, status=400)
     
-    # Get movie from TMDB and store in db
-    movie = Movie.objects.filter(tmdb_id=movie_id).first()
-    if not movie:
-        logger.info(f"Movie with TMDB ID {movie_id} not found locally. Fetching details from TMDB.")
-        try:
-            movie_data = tmdb_service.get_movie_details(movie_id)
-            if not movie_data:
-                logger.error(f"Could not retrieve movie details from TMDB for ID {movie_id} during interaction.")
-                return JsonResponse({'status': 'error', 'message': 'Could not retrieve movie details.'}, status=503) # Service unavailable?
-            movie = tmdb_service.get_or_create_movie(movie_data)
-            if not movie:
-                return JsonResponse({'status': 'error', 'message': 'Could not save movie locally.'}, status=500)
-        except TMDBServiceError as e:
-            logger.error(f"TMDB Service Error during interaction for movie {movie_id}: {e}")
-            return JsonResponse({'status': 'error', 'message': 'Error communicating with movie service.'}, status=503)
-        except Exception as e:
-            logger.exception(f"Unexpected error getting/creating movie {movie_id} during interaction: {e}")
-            return JsonResponse({'status': 'error', 'message': 'An unexpected error occurred processing the movie.'}, status=500)
-    
-    # Record the interaction
-    interaction, created = UserMovieInteraction.objects.update_or_create(
-            user=request.user,
-            movie=movie,
-            interaction_type=interaction_type,
-            defaults={'timestamp': timezone.now()}
-    )
+    # Record the interaction, blocks carry their expiry so the sweeper can release them
+    now = timezone.now()
+    expires_at = now + InteractionEvent.BLOCK_DURATION if interaction_type == 'block' else None
+    if interaction_writer.enabled:
+        movie = _get_or_fetch_movie(movie_id)
+        if isinstance(movie, JsonResponse):
+            return movie
+        _log_interactions(request.user, [(movie, interaction_type)], now)
+        return _next_movie_response(request)
+
+    # Two statements for a stored movie (event + state), the movie is only fetched when it's unknown
+    try:
+        created = record_interaction(request.user.id, movie_id, interaction_type, now, expires_at)
+        if created is None:
+            movie = _get_or_fetch_movie(movie_id)
+            if isinstance(movie, JsonResponse):
+                return movie
+            created = record_interaction(request.user.id, movie_id, interaction_type, now, expires_at)
+    except Exception as e:
+        logger.exception(f"Failed to record interaction for user {request.user.id}, movie {movie_id}: {e}")
+        return JsonResponse({'status': 'error', 'message': 'Could not record interaction.'}, status=500)
     logger.info(f"Recorded interaction: User {request.user.id}, Movie {movie_id}, Type {interaction_type}, Created: {created}")
+    try:
+        prefetcher.discard(request.user.id, movie_id) # in case it was queued, e.g. blocked from its detail page
+    except Exception as e:
+        logger.exception(f"Failed to drop movie {movie_id} from the buffer of user {request.user.id}: {e}")
 
-    
-    # Get next movie recommendation using the helper
+    return _next_movie_response(request)
+
+def _get_or_fetch_movie(movie_id):
+    """
+    The stored Movie for a TMDB id, fetched from TMDB and upserted (ON CONFLICT on tmdb_id)
+    when it isn't stored yet.
+
+    Returns:
+        Movie or JsonResponse: The movie, or the error response to send.
+    """
+    movie = Movie.objects.filter(tmdb_id=movie_id).first()
+    if movie:
+        return movie
+    logger.info(f"Movie with TMDB ID {movie_id} not found locally. Fetching details from TMDB.")
+    try:
+        movie_data = tmdb_service.get_movie_details(movie_id)
+        if not movie_data:
+            logger.error(f"Could not retrieve movie details from TMDB for ID {movie_id} during interaction.")
+            return JsonResponse({'status': 'error', 'message': 'Could not retrieve movie details.'}, status=503) # Service unavailable?
+        tmdb_service.upsert_movies([movie_data])
+        movie = Movie.objects.filter(tmdb_id=movie_id).first()
+        if not movie:
+            return JsonResponse({'status': 'error', 'message': 'Could not save movie locally.'}, status=500)
+        return movie
+    except TMDBServiceError as e:
+        logger.error(f"TMDB Service Error during interaction for movie {movie_id}: {e}")
+        return JsonResponse({'status': 'error', 'message': 'Error communicating with movie service.'}, status=503)
+    except Exception as e:
+        logger.exception(f"Unexpected error getting/creating movie {movie_id} during interaction: {e}")
+        return JsonResponse({'status': 'error', 'message': 'An unexpected error occurred processing the movie.'}, status=500)
+
+def _log_interactions(user, movie_interactions, now):
+    """
+    Write-behind mode: logs swipes for the next flush instead of writing them here.
+
+    Args:
+        movie_interactions (list): (Movie, interaction type) pairs in swipe order.
+    """
+    interaction_writer.append([PendingInteraction(
+        user.id, movie.id, movie.tmdb_id, interaction_type,
+        now + timezone.timedelta(microseconds=i), # later swipes get later timestamps
+        now + InteractionEvent.BLOCK_DURATION if interaction_type == 'block' else None,
+    ) for i, (movie, interaction_type) in enumerate(movie_interactions)])
+    logger.info(f"Logged {len(movie_interactions)} interaction(s) for User {user.id} to be written behind.")
+    try:
+        prefetcher.discard(user.id, *(movie.tmdb_id for movie, _ in movie_interactions)) # in case any were queued
+    except Exception as e:
+        logger.exception(f"Failed to drop swiped movies from the buffer of user {user.id}: {e}")
+
+def _next_movie_response(request):
+    """JSON response for movie_interaction with the user's next movie"""
     next_movie_data = _get_next_movie_for_user(request, tmdb_service)
 
     if next_movie_data:
@@ -406,6 +554,88 @@ def movie_interaction(request):
             'message': 'No more movies match your criteria. Try adjusting filters!'
         })
 
+@login_required
+@require_POST
+def movie_interaction_batch(request):
+    """
+    Handles AJAX POST requests carrying several swipes at once.
+
+    The swipe page queues swipes and upcoming cards locally and sends them a few at a
+    time, so fast swipers cost one request per several cards. All swipes are written in
+    one transaction with a single bulk upsert, then as many next movies as the client
+    asks for are returned.
+
+    Args:
+        request (HttpRequest): The incoming AJAX POST request. Expects a JSON body:
+            {"swipes": [{"movie_id": 123, "interaction_type": "skip"}, ...], "want": 3}
+            Swipes are in the order they happened.
+
+    Returns:
+        JsonResponse: Contains status ('success', 'error', 'no_more_movies'), the number of
+                      swipes 'recorded' and 'next_movies' (a list, possibly empty), or an error 'message'.
+    """
+    try:
+        payload = json.loads(request.body or b'{}')
+        swipes = payload.get('swipes') or []
+        want = int(payload.get('want', 1))
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({'status': 'error', 'message': 'Invalid request body.'}, status=400)
+    if not isinstance(swipes, list) or len(swipes) > getattr(settings, 'INTERACTION_BATCH_MAX_SWIPES', 50):
+        return JsonResponse({'status': 'error', 'message': 'Invalid swipe list.'}, status=400)
+    want = max(0, min(want, MAX_BATCH_NEXT_MOVIES))
+
+    # Validate everything before writing anything, a batch is all or nothing
+    valid_types = dict(InteractionEvent.INTERACTION_CHOICES)
+    latest = {} # (movie, type) -> position, a repeated swipe only needs its last timestamp
+    for position, swipe in enumerate(swipes):
+        movie_id = swipe.get('movie_id') if isinstance(swipe, dict) else None
+        interaction_type = swipe.get('interaction_type') if isinstance(swipe, dict) else None
+        if not str(movie_id).isdigit() or int(movie_id) <= 0 or interaction_type not in valid_types:
+            logger.warning(f"Invalid swipe {swipe!r} in batch from User {request.user.id}")
+            return JsonResponse({'status': 'error', 'message': f'Invalid swipe at position {position}.'}, status=400)
+        latest[(int(movie_id), interaction_type)] = position
+    ordered = sorted(latest, key=latest.get)
+
+    # Swiped cards were served from stored movies, so this is normally one query and no TMDB calls
+    movie_ids = {movie_id for movie_id, _ in ordered}
+    movies = Movie.objects.in_bulk(movie_ids, field_name='tmdb_id')
+    for movie_id in movie_ids - set(movies):
+        movie = _get_or_fetch_movie(movie_id)
+        if isinstance(movie, JsonResponse):
+            return movie
+        movies[movie_id] = movie
+
+    user = request.user
+    now = timezone.now()
+    if ordered and interaction_writer.enabled:
+        _log_interactions(user, [(movies[movie_id], interaction_type) for movie_id, interaction_type in ordered], now)
+    elif ordered:
+        try:
+            created = write_interactions([PendingInteraction(
+                user.id, movies[movie_id].id, movie_id, interaction_type,
+                now + timezone.timedelta(microseconds=i), # later swipes get later timestamps
+                now + InteractionEvent.BLOCK_DURATION if interaction_type == 'block' else None,
+            ) for i, (movie_id, interaction_type) in enumerate(ordered)])
+        except Exception as e:
+            logger.exception(f"Failed to record swipe batch for user {user.id}: {e}")
+            return JsonResponse({'status': 'error', 'message': 'Could not record swipes.'}, status=500)
+        logger.info(f"Recorded {len(ordered)} swipes for User {user.id} ({created} new).")
+        try:
+            prefetcher.discard(user.id, *movie_ids) # in case any were queued
+        except Exception as e:
+            logger.exception(f"Failed to drop swiped movies from the buffer of user {user.id}: {e}")
+
+    next_movies = _get_next_movies_for_user(request, tmdb_service, want) if want else []
+    if want and not next_movies:
+        logger.info(f"No more suitable movies found for User {user.id} after swipe batch.")
+        return JsonResponse({
+            'status': 'no_more_movies',
+            'recorded': len(swipes),
+            'next_movies': [],
+            'message': 'No more movies match your criteria. Try adjusting filters!'
+        })
+    return JsonResponse({'status': 'success', 'recorded': len(swipes), 'next_movies': next_movies})
+
 @login_required
 @require_POST
 def save_filters(request):
@@ -437,20 +667,11 @@ def save_filters(request):
         if form.is_valid():
             logger.debug(f"Filter form is valid for User {request.user.id}. Saving filters...")
             form.save()
-            session_key = f'recommendation_cache_{request.user.id}'
-            if session_key in request.session:
-                try:
-                    del request.session[session_key]
-                    # Also remove the source key
-                    cache_source_key = f'{session_key}_source'
-                    if cache_source_key in request.session:
-                         del request.session[cache_source_key]
-                    request.session.modified = True
-                    logger.info(f"Cleared recommendation cache for user {request.user.id} due to filter change.")
-                except KeyError:
-                     logger.warning(f"Tried to delete session key '{session_key}' but wasn't found for user {request.user.id}.")
-                except Exception as e:
-                    logger.exception(f"Error clearing session cache for user {request.user.id}: {e}")
+            try:
+                prefetcher.clear(request.user.id)
+                logger.info(f"Cleared recommendation buffer for user {request.user.id} due to filter change.")
+            except Exception as e:
+                logger.exception(f"Error clearing recommendation buffer for user {request.user.id}: {e}")
 
             logger.info(f"Saved filters for user {request.user.id}: {form.cleaned_data}")
             new_first_movie = _get_next_movie_for_user(request, tmdb_service)
@@ -575,23 +796,17 @@ def watchlist(request):
     """
     logger.debug(f"Watchlist page request received for User {request.user.id}")
 
-    watchlist_items = UserMovieInteraction.objects.filter(
+    watchlist_items = UserMovieState.objects.filter(
         user=request.user,
-        interaction_type='watchlist'
-    ).select_related('movie').order_by('-timestamp')
+        watchlist_at__isnull=False
+    ).select_related('movie').annotate(timestamp=F('watchlist_at')).order_by('-watchlist_at')
 
     
     # Get user interaction statistics
     user_stats = {} # initialize empty dict
-    stats_queryset = UserMovieInteraction.objects.filter(user=request.user)
     try:
-        user_stats = stats_queryset.aggregate(
-            watchlist_count=Count('id', filter=Q(interaction_type='watchlist')),
-            heart_count=Count('id', filter=Q(interaction_type='heart')),
-            skip_count=Count('id', filter=Q(interaction_type='skip')),
-            block_count=Count('id', filter=Q(interaction_type='block')),
-            total_interactions=Count('id')
-        )
+        stats = load_stats(request.user.id) # kept up to date on every interaction write
+        user_stats = {field: getattr(stats, field) for field in STAT_FIELDS}
         user_stats['join_date'] = request.user.date_joined
         user_stats['last_login'] = request.user.last_login
         logger.debug(f"Calculated user stats for User {request.user.id}: {user_stats}")
@@ -602,10 +817,10 @@ def watchlist(request):
     # Get genre preferences based on hearted and watchlisted movies
     genre_preferences = []
     try:
-        positive_interaction_movie_ids = UserMovieInteraction.objects.filter(
-            user=request.user,
-            interaction_type__in=['heart', 'watchlist']
-        ).values_list('movie_id', flat=True).distinct() # Get unique movies
+        positive_interaction_movie_ids = UserMovieState.objects.filter(
+            Q(heart_at__isnull=False) | Q(watchlist_at__isnull=False),
+            user=request.user
+        ).values_list('movie_id', flat=True) # one state per movie
     
         movies_with_genres = Movie.objects.filter(
             id__in=positive_interaction_movie_ids,
@@ -661,27 +876,21 @@ def likelist(request):
     """
     logger.debug(f"Watchlist page request received for User {request.user.id}")
 
-    watchlist_items = UserMovieInteraction.objects.filter(
+    watchlist_items = UserMovieState.objects.filter(
         user=request.user,
-        interaction_type='watchlist'
-    ).select_related('movie').order_by('-timestamp')
+        watchlist_at__isnull=False
+    ).select_related('movie').annotate(timestamp=F('watchlist_at')).order_by('-watchlist_at')
 
-    likelist_items = UserMovieInteraction.objects.filter(
+    likelist_items = UserMovieState.objects.filter(
         user=request.user,
-        interaction_type='heart'
-    ).select_related('movie').order_by('-timestamp')
+        heart_at__isnull=False
+    ).select_related('movie').annotate(timestamp=F('heart_at')).order_by('-heart_at')
     
     # Get user interaction statistics
     user_stats = {} # initialize empty dict
-    stats_queryset = UserMovieInteraction.objects.filter(user=request.user)
     try:
-        user_stats = stats_queryset.aggregate(
-            watchlist_count=Count('id', filter=Q(interaction_type='watchlist')),
-            heart_count=Count('id', filter=Q(interaction_type='heart')),
-            skip_count=Count('id', filter=Q(interaction_type='skip')),
-            block_count=Count('id', filter=Q(interaction_type='block')),
-            total_interactions=Count('id')
-        )
+        stats = load_stats(request.user.id) # kept up to date on every interaction write
+        user_stats = {field: getattr(stats, field) for field in STAT_FIELDS}
         user_stats['join_date'] = request.user.date_joined
         user_stats['last_login'] = request.user.last_login
         logger.debug(f"Calculated user stats for User {request.user.id}: {user_stats}")
@@ -692,10 +901,10 @@ def likelist(request):
     # Get genre preferences based on hearted and watchlisted movies
     genre_preferences = []
     try:
-        positive_interaction_movie_ids = UserMovieInteraction.objects.filter(
-            user=request.user,
-            interaction_type__in=['heart', 'watchlist']
-        ).values_list('movie_id', flat=True).distinct() # Get unique movies
+        positive_interaction_movie_ids = UserMovieState.objects.filter(
+            Q(heart_at__isnull=False) | Q(watchlist_at__isnull=False),
+            user=request.user
+        ).values_list('movie_id', flat=True) # one state per movie
     
         movies_with_genres = Movie.objects.filter(
             id__in=positive_interaction_movie_ids,
@@ -740,9 +949,11 @@ def unwatchlist(request):
     """
     Handles AJAX POST request to remove a movie from the user's watchlist.
 
-    Instead of deleting the interaction, it changes the interaction_type
-    from 'watchlist' to 'skip' to maintain interaction history but effectively
-    remove it from the displayed watchlist.
+    Nothing is deleted: an 'unwatch' event is appended to the interaction log, which
+    takes the movie off the watchlist and favorites in the user's state and keeps it
+    out of recommendations as a skip. In write-behind mode (INTERACTION_WRITE_BEHIND) it's
+    logged behind the user's earlier swipes like any other interaction, so it can't be
+    applied before them.
 
     Maybe this can be expanded for the unfunctional movie details page atm
 
@@ -761,34 +972,17 @@ def unwatchlist(request):
     try:
         movie = get_object_or_404(Movie, tmdb_id=movie_id) # Ensure movie exists
 
-    
-        UserMovieInteraction.objects.filter(
-            Q(interaction_type='watchlist') | Q(interaction_type='heart'),
-            user=request.user,
-            movie=movie,    
-        ).delete()
-
-         # This may be redundant, but fixes uniqueness conflict which crashed the page
-        UserMovieInteraction.objects.update_or_create(
-            user=request.user,
-            movie=movie,
-            interaction_type='skip',
-            defaults={'timestamp': timezone.now()}
-        )
-
-
-
+        # Taste and exclusions are updated along with the state, in the same transaction
+        if interaction_writer.enabled:
+            _log_interactions(request.user, [(movie, 'unwatch')], timezone.now())
+        else:
+            write_interactions([PendingInteraction(request.user.id, movie.id, movie_id, 'unwatch', timezone.now(), None)])
 
-        logger.info(f"Changed interaction type from 'watchlist' to 'skip' for movie {movie_id} ('{movie.title}') for user {request.user.id}")
+        logger.info(f"Removed movie {movie_id} ('{movie.title}') from the lists of user {request.user.id}, now a skip")
         return JsonResponse({'status': 'success', 'message': 'Removed from watchlist successfully.'})
     except Movie.DoesNotExist:
         logger.error(f"Attempted to unwatchlist movie with TMDB ID {movie_id}, but Movie object does not exist locally. User: {request.user.id}")
         return JsonResponse({'status': 'error', 'message': 'Movie not found in database.'}, status=404)
-    except UserMovieInteraction.DoesNotExist:
-        # Was not found on user watchlist
-        logger.warning(f"Attempted to remove movie {movie_id} from watchlist for user {request.user.id}, but no 'watchlist' interaction was found.")
-        # Return success for UI consistency, as the item is effectively not on the watchlist, so ig it works
-        return JsonResponse({'status': 'success', 'message': 'Movie was not on your watchlist.'})
     except Exception as e:
         logger.exception(f"Error during unwatchlist process for movie {movie_id}, user {request.user.id}: {e}")
         return JsonResponse({'status': 'error', 'message': 'An unexpected error occurred.'}, status=500)
@@ -801,7 +995,6 @@ def search_movies(request):
         return redirect('home')
     
     try:
-        tmdb_service = TMDBService()
         search_results = tmdb_service.search_movies(query)
         
         if not search_results: